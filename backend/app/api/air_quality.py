@@ -1,19 +1,58 @@
 import os
+import json
 from dotenv import load_dotenv
 import httpx
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import requests
-import random
 import datetime
-import time
+import asyncio
+
+from ..core.aqi import sub_index, compute_aqi_scalar, to_cpcb_units
+from ..core.compression import compression_stats
+from ..core.http_cache import CachePolicy, NO_STORE, cache_control, http_cache_stats, make_etag, seconds_until_next_hour
+from ..core.metrics import FALLBACK_RESPONSES, register_cache
+from ..core.serialization import FastJSONRoute
+from ..services.openaq_client import get_openaq_client, OPENAQ_BASE_URL
+from ..services.station_cache import station_cache, MISSING
+from ..services.snapshot import reading_snapshot, snapshot_key
+from ..services.history import record_reading, daily_history, history_stats, location_key, POLLUTANT_FIELDS
+from ..services.history_export import stream_history_export, export_stats, EXPORT_MEDIA_TYPES, HISTORY_EXPORT_MAX_DAYS, HISTORY_EXPORT_MAX_LOCATIONS
+from ..services.spatial_index import GridIndex
+from ..services.search_index import SearchIndex
+from ..services.ingestion import ingestion_stats, is_ingested, INGEST_INTERVAL_SECONDS, SNAPSHOT_MAX_AGE
+from ..services.forecasting import forecast_engine, forecast_stats
+from ..services.synthetic import synthetic_reading, synthetic_daily_history
+from ..services.tiles import TileRenderer, TILE_MAX_ZOOM
+from ..services.interpolation import SnapshotInterpolator
+from ..services.resilience import location_guard, measurement_guard, forecast_guard, resilience_stats
+from ..services.quota import QuotaExceededError, openaq_quota
+from ..services.measurement_stream import measurement_parse_stats, measurement_query, read_latest_measurements
+from ..services.snapshot_feed import SnapshotFeed
+from ..services.live import LiveHub, SubscriptionClosed, LIVE_HEARTBEAT_INTERVAL, LIVE_MAX_LOCATIONS
+from ..services.singleflight import (
+    location_flights, measurement_flights, forecast_flights, coalescing_stats
+)
 
 load_dotenv()
 OPENAQ_API_KEY = os.getenv("OPENAQ_API_KEY")
-HEADERS = {"X-API-Key": OPENAQ_API_KEY}
+HEADERS = {"X-API-Key": OPENAQ_API_KEY} if OPENAQ_API_KEY else {}
+
+# HTTP cache freshness: city lists never change while the process runs, readings follow ingestion
+CITY_CACHE_MAX_AGE = int(os.getenv("CITY_CACHE_MAX_AGE", "86400"))
+READING_CACHE_MAX_AGE = int(os.getenv("READING_CACHE_MAX_AGE", str(int(INGEST_INTERVAL_SECONDS))))
+TILE_CACHE_MAX_AGE = int(os.getenv("TILE_CACHE_MAX_AGE", "300"))
+
+# Batch endpoint limits
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "200"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "10"))
+
+# Longest range /historical answers; longer requests are clamped rather than rejected
+HISTORY_MAX_DAYS = int(os.getenv("HISTORY_MAX_DAYS", "365"))
 
-router = APIRouter(prefix="/air-quality", tags=["Air Quality"])
+router = APIRouter(prefix="/air-quality", tags=["Air Quality"], route_class=FastJSONRoute)
 
 class AirQualityResponse(BaseModel):
     aqi: int
@@ -23,6 +62,7 @@ class AirQualityResponse(BaseModel):
     no2: float
     co: float
     so2: float
+    dominant_pollutant: Optional[str] = None
     timestamp: str
 
 class ForecastResponse(BaseModel):
@@ -52,6 +92,35 @@ class IndianCitiesResponse(BaseModel):
     cities: List[IndianCity]
     total_count: int
 
+class NearbyCity(IndianCity):
+    distance_km: float
+
+class NearbyCitiesResponse(BaseModel):
+    cities: List[NearbyCity]
+    total_count: int
+
+class Coordinate(BaseModel):
+    lat: float
+    lng: float
+
+class BatchAirQualityRequest(BaseModel):
+    locations: List[Coordinate] = []
+    cities: List[str] = []  # INDIAN_CITIES names, matched case-insensitively
+
+class BatchAirQualityItem(BaseModel):
+    name: Optional[str] = None
+    state: Optional[str] = None
+    lat: Optional[float] = None
+    lng: Optional[float] = None
+    source: Optional[str] = None  # "openaq", "interpolated" or "mock"
+    data: Optional[AirQualityResponse] = None
+    error: Optional[str] = None
+
+class BatchAirQualityResponse(BaseModel):
+    results: List[BatchAirQualityItem]
+    total_count: int
+    station_count: int
+
 # Comprehensive list of Indian districts and major towns
 INDIAN_CITIES = [
     # Delhi NCR
@@ -260,225 +329,627 @@ INDIAN_CITIES = [
     {"name": "Yanam", "state": "Puducherry", "lat": 16.7333, "lng": 82.2167, "type": "district"},
 ]
 
+CITIES_BY_NAME = {}
+for _city in INDIAN_CITIES:
+    CITIES_BY_NAME.setdefault(_city["name"].lower(), []).append(_city)
+CITIES_BY_COORDS = {snapshot_key(c["lat"], c["lng"]): c for c in INDIAN_CITIES}
+
+# Built once so nearest-city lookups do not scan the whole list
+CITY_INDEX = GridIndex([c["lat"] for c in INDIAN_CITIES], [c["lng"] for c in INDIAN_CITIES])
+CITY_SEARCH = SearchIndex(INDIAN_CITIES, bucket_key="state")
+# State (None for all) -> serialized /indian-cities body; only real states are cached, so the size is fixed
+_cities_response_cache = {}
+# AQI heatmap tiles drawn from the city snapshot
+TILE_RENDERER = TileRenderer(reading_snapshot, INDIAN_CITIES)
+# Estimates for points with no nearby station, from the same snapshot
+SNAPSHOT_INTERPOLATOR = SnapshotInterpolator(reading_snapshot)
+# Versioned full/delta bodies of the city snapshot for /snapshot
+SNAPSHOT_FEED = SnapshotFeed(reading_snapshot)
+# Content version of the city list, identical across workers and restarts
+CITIES_VERSION = make_etag(json.dumps(INDIAN_CITIES, sort_keys=True))
+# Freshness of each endpoint for HTTPCacheMiddleware; /current sets its own per source
+CACHE_POLICIES = {
+    "/air-quality/indian-cities": CachePolicy(CITY_CACHE_MAX_AGE, version=lambda: CITIES_VERSION),
+    "/air-quality/cities/": CachePolicy(CITY_CACHE_MAX_AGE, version=lambda: CITIES_VERSION),
+    "/air-quality/current": CachePolicy(READING_CACHE_MAX_AGE),
+    "/air-quality/forecast": CachePolicy(seconds_until_next_hour),
+    "/air-quality/historical": CachePolicy(seconds_until_next_hour),
+    "/air-quality/historical/export": NO_STORE,
+    "/air-quality/tiles/": CachePolicy(TILE_CACHE_MAX_AGE, version=lambda: TILE_RENDERER.current_version()),
+    "/air-quality/snapshot": CachePolicy(0, version=lambda: (reading_snapshot.epoch, reading_snapshot.version)),
+    "/air-quality/stats": NO_STORE,
+}
+
+def _revalidation_counts(stats: dict):
+    """(answered 304, answered in full) among the GET responses the HTTP cache handled"""
+    return stats["not_modified"], stats["responses"] - stats["not_modified"]
+
+# Hit ratios exported on /metrics, read from the caches' own counters
+register_cache("station", lambda: (station_cache.hits + station_cache.negative_hits, station_cache.misses))
+register_cache("snapshot", lambda: (reading_snapshot.hits, reading_snapshot.misses))
+register_cache("tiles", lambda: (TILE_RENDERER.hits, TILE_RENDERER.misses))
+register_cache("snapshot_feed", lambda: (SNAPSHOT_FEED.hits, SNAPSHOT_FEED.misses))
+register_cache("http_304", lambda: _revalidation_counts(http_cache_stats()))
+for _flights in (location_flights, measurement_flights, forecast_flights):
+    register_cache(f"coalescing_{_flights.name}", lambda flights=_flights: (flights.shared, flights.leaders))
+
+# Push updates for /live and /ws; ingested cities come from snapshot changes
+LIVE_HUB = LiveHub(reading_snapshot, lambda lat, lng: live_or_estimated_reading(lat, lng, "live"), lambda key: is_ingested(*key))
+
 def compute_aqi_pm25(pm25):
     # Indian CPCB breakpoints for PM2.5
-    breakpoints = [
-        (0, 30, 0, 50),
-        (31, 60, 51, 100),
-        (61, 90, 101, 200),
-        (91, 120, 201, 300),
-        (121, 250, 301, 400),
-        (251, 500, 401, 500),
-    ]
-    for bp_low, bp_high, i_low, i_high in breakpoints:
-        if bp_low <= pm25 <= bp_high:
-            return round(((i_high - i_low)/(bp_high - bp_low)) * (pm25 - bp_low) + i_low)
-    return 500
+    return int(sub_index("pm25", pm25))
 
 def compute_aqi_pm10(pm10):
     # Indian CPCB breakpoints for PM10
-    breakpoints = [
-        (0, 50, 0, 50),
-        (51, 100, 51, 100),
-        (101, 250, 101, 200),
-        (251, 350, 201, 300),
-        (351, 430, 301, 400),
-        (431, 600, 401, 500),
-    ]
-    for bp_low, bp_high, i_low, i_high in breakpoints:
-        if bp_low <= pm10 <= bp_high:
-            return round(((i_high - i_low)/(bp_high - bp_low)) * (pm10 - bp_low) + i_low)
-    return 500
-
-async def get_location_id(lat, lng):
-    url = f"https://api.openaq.org/v2/locations?coordinates={lat},{lng}&radius=10000&limit=1&order_by=distance"
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(url, headers=HEADERS, timeout=10)
+    return int(sub_index("pm10", pm10))
+
+async def _lookup_location_id(lat, lng, client: httpx.AsyncClient):
+    url = f"{OPENAQ_BASE_URL}/v2/locations?coordinates={lat},{lng}&radius=10000&limit=1&order_by=distance"
+    resp = await client.get(url, headers=HEADERS)
+    resp.raise_for_status()
+    results = resp.json().get('results', [])
+    location_id = results[0].get('id') if results else None
+    # Only a successful empty answer is cached as "no station within 10 km"
+    station_cache.set(lat, lng, location_id)
+    return location_id
+
+async def get_location_id(lat, lng, client: Optional[httpx.AsyncClient] = None):
+    # Stations almost never move, so lookups are cached per geohash bucket
+    cached = station_cache.get(lat, lng)
+    if cached is not MISSING:
+        return cached
+    client = client or get_openaq_client()
+    bucket = station_cache.key_for(lat, lng)
+    return await location_flights.do(
+        bucket, lambda: location_guard.call(lambda: _lookup_location_id(lat, lng, client))
+    )
+
+async def fetch_station_air_quality(location_id, client: Optional[httpx.AsyncClient] = None):
+    """Fetch and summarise the latest measurements for one OpenAQ station"""
+    client = client or get_openaq_client()
+    url = f"{OPENAQ_BASE_URL}/v3/measurements"
+    # The body is parsed as it arrives until every pollutant is seen; the rest is drained unparsed
+    async with client.stream("GET", url, params=measurement_query(location_id), headers=HEADERS) as resp:
         resp.raise_for_status()
-        results = resp.json().get('results', [])
-        if results:
-            return results[0].get('id')
+        summary = await read_latest_measurements(resp.aiter_bytes())
+    measurements = summary.values
+    if measurements:
+        pm25 = measurements.get('pm25', None)
+        pm10 = measurements.get('pm10', None)
+        o3 = measurements.get('o3', None)
+        no2 = measurements.get('no2', None)
+        co = measurements.get('co', None)
+        so2 = measurements.get('so2', None)
+        if pm25 is not None or pm10 is not None:
+            aqi, dominant = compute_aqi_scalar(**{
+                param: to_cpcb_units(param, value, summary.units.get(param))
+                for param, value in measurements.items()
+            })
+            return {
+                'aqi': aqi,
+                'pm25': pm25 or 0,
+                'pm10': pm10 or 0,
+                'o3': o3 or 0,
+                'no2': no2 or 0,
+                'co': co or 0,
+                'so2': so2 or 0,
+                'dominant_pollutant': dominant,
+                'timestamp': summary.timestamp
+            }
+    return None
+
+async def fetch_station_forecast(location_id, client: Optional[httpx.AsyncClient] = None):
+    """Fetch the 24-hour forecast for one OpenAQ station"""
+    client = client or get_openaq_client()
+    url = f"{OPENAQ_BASE_URL}/v3/forecast?location_id={location_id}"
+    resp = await client.get(url, headers=HEADERS)
+    resp.raise_for_status()
+    forecast_results = resp.json().get('results', [])
+    if forecast_results:
+        # Parse forecast for 24 hours of pm25
+        forecast = []
+        for entry in forecast_results:
+            if entry.get('parameter') == 'pm25' and entry.get('value') is not None:
+                forecast.append(entry['value'])
+                if len(forecast) == 24:
+                    break
+        # Fallback: if less than 24, pad with last value
+        if forecast:
+            while len(forecast) < 24:
+                forecast.append(forecast[-1])
+            return {
+                'forecast': sub_index("pm25", forecast).astype(int).tolist(),
+                'timestamp': forecast_results[0].get('date', {}).get('utc', '')
+            }
     return None
 
-async def get_real_air_quality_data(lat, lng):
+async def get_station_air_quality(location_id, client: Optional[httpx.AsyncClient] = None):
+    # Concurrent requests for the same station share one upstream call
+    return await measurement_flights.do(
+        location_id, lambda: measurement_guard.call(lambda: fetch_station_air_quality(location_id, client))
+    )
+
+async def get_station_forecast(location_id, client: Optional[httpx.AsyncClient] = None):
+    return await forecast_flights.do(
+        location_id, lambda: forecast_guard.call(lambda: fetch_station_forecast(location_id, client))
+    )
+
+def _record_history(lat, lng, reading):
+    city = CITIES_BY_COORDS.get(snapshot_key(lat, lng))
+    record_reading(lat, lng, reading, name=city["name"] if city else None)
+
+async def fetch_latest_air_quality(lat, lng, client: Optional[httpx.AsyncClient] = None):
+    """Latest reading from the nearest station; None if there is none, errors propagate"""
+    location_id = await get_location_id(lat, lng, client=client)
+    if not location_id:
+        return None
+    reading = await get_station_air_quality(location_id, client=client)
+    if reading:
+        _record_history(lat, lng, reading)
+    return reading
+
+async def get_real_air_quality_data(lat, lng, client: Optional[httpx.AsyncClient] = None):
     try:
-        location_id = await get_location_id(lat, lng)
+        location_id = await get_location_id(lat, lng, client=client)
         if not location_id:
             raise Exception("No OpenAQ location found for these coordinates.")
-        url = f"https://api.openaq.org/v3/measurements?location_id={location_id}&limit=100&order_by=datetime&sort=desc"
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, headers=HEADERS, timeout=10)
-            resp.raise_for_status()
-            meas_results = resp.json().get('results', [])
-            if meas_results:
-                measurements = {}
-                for m in meas_results:
-                    param = m.get('parameter')
-                    value = m.get('value')
-                    if param and value is not None and param not in measurements:
-                        measurements[param] = value
-                pm25 = measurements.get('pm25', None)
-                pm10 = measurements.get('pm10', None)
-                o3 = measurements.get('o3', None)
-                no2 = measurements.get('no2', None)
-                co = measurements.get('co', None)
-                so2 = measurements.get('so2', None)
-                if pm25 is not None or pm10 is not None:
-                    aqi_pm25 = compute_aqi_pm25(pm25) if pm25 else 0
-                    aqi_pm10 = compute_aqi_pm10(pm10) if pm10 else 0
-                    aqi = max(aqi_pm25, aqi_pm10) if aqi_pm25 and aqi_pm10 else (aqi_pm25 or aqi_pm10)
-                    return {
-                        'aqi': aqi,
-                        'pm25': pm25 or 0,
-                        'pm10': pm10 or 0,
-                        'o3': o3 or 0,
-                        'no2': no2 or 0,
-                        'co': co or 0,
-                        'so2': so2 or 0,
-                        'timestamp': meas_results[0].get('date', {}).get('utc', '')
-                    }
+        reading = await get_station_air_quality(location_id, client=client)
+        if reading:
+            _record_history(lat, lng, reading)
+        return reading
+    except QuotaExceededError as e:
+        # Out of budget: answer from an estimate now rather than queue for a token
+        print(f"⏳ {e}")
     except Exception as e:
         print(f"OpenAQ API error: {e}")
     return None
 
-async def get_real_forecast_data(lat, lng):
+async def get_real_forecast_data(lat, lng, client: Optional[httpx.AsyncClient] = None):
     try:
-        location_id = await get_location_id(lat, lng)
+        location_id = await get_location_id(lat, lng, client=client)
         if not location_id:
             raise Exception("No OpenAQ location found for these coordinates.")
-        url = f"https://api.openaq.org/v3/forecast?location_id={location_id}"
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, headers=HEADERS, timeout=10)
-            resp.raise_for_status()
-            forecast_results = resp.json().get('results', [])
-            if forecast_results:
-                # Parse forecast for 24 hours (pm25 or aqi)
-                forecast = []
-                for entry in forecast_results:
-                    if entry.get('parameter') == 'pm25':
-                        forecast.append(entry.get('value'))
-                        if len(forecast) == 24:
-                            break
-                # Fallback: if less than 24, pad with last value
-                if forecast:
-                    while len(forecast) < 24:
-                        forecast.append(forecast[-1])
-                    return {'forecast': forecast, 'timestamp': forecast_results[0].get('date', {}).get('utc', '')}
+        return await get_station_forecast(location_id, client=client)
+    except QuotaExceededError as e:
+        print(f"⏳ {e}")
     except Exception as e:
         print(f"OpenAQ API error: {e}")
     return None
 
 def generate_realistic_mock_data(lat, lng):
     """Generate realistic mock data based on location and time"""
-    # Seed random generator with location and time for consistent results
-    seed = int(lat * 1000) + int(lng * 1000) + int(time.time() // 3600)  # Hourly variation
-    random.seed(seed)
-    
-    # Base values that vary by location
-    base_pm25 = 15 + (lat * 10) % 30  # Varies by latitude
-    base_pm10 = 25 + (lng * 8) % 40   # Varies by longitude
-    
-    # Add some realistic variation
-    pm25 = max(5, base_pm25 + random.uniform(-10, 20))
-    pm10 = max(10, base_pm10 + random.uniform(-15, 25))
-    
-    # Compute AQI
-    aqi_pm25 = compute_aqi_pm25(pm25)
-    aqi_pm10 = compute_aqi_pm10(pm10)
-    aqi = max(aqi_pm25, aqi_pm10)
-    
-    return {
-        'aqi': aqi,
-        'pm25': round(pm25, 1),
-        'pm10': round(pm10, 1),
-        'o3': round(random.uniform(20, 60), 1),
-        'no2': round(random.uniform(10, 40), 1),
-        'co': round(random.uniform(0.5, 2.5), 2),
-        'so2': round(random.uniform(5, 20), 1),
-        'timestamp': datetime.datetime.utcnow().isoformat()
-    }
+    # Keyed by (lat, lng, hour): stable within the hour, no shared RNG state
+    return synthetic_reading(lat, lng)
+
+def _cities_response(cities):
+    return IndianCitiesResponse(
+        cities=[IndianCity(**city) for city in cities],
+        total_count=len(cities)
+    )
 
 @router.get("/indian-cities", response_model=IndianCitiesResponse)
 def get_indian_cities(
     state: Optional[str] = Query(None, description="Filter by state"),
-    search: Optional[str] = Query(None, description="Search by city name")
+    search: Optional[str] = Query(None, description="Search by city name"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of cities to return")
 ):
     """Get all Indian cities with their coordinates"""
-    cities = INDIAN_CITIES.copy()
-    
-    # Filter by state if provided
-    if state:
-        cities = [city for city in cities if city["state"].lower() == state.lower()]
-    
-    # Filter by search term if provided
-    if search:
-        cities = [city for city in cities if search.lower() in city["name"].lower()]
-    
-    return IndianCitiesResponse(
-        cities=[IndianCity(**city) for city in cities],
-        total_count=len(cities)
-    )
+    if not search:
+        # Full listings never change, so their JSON is serialized once; limits and unknown states are built per request
+        key = state.lower() if state else None
+        cacheable = limit is None and (key is None or CITY_SEARCH.bucket(key))
+        body = _cities_response_cache.get(key) if cacheable else None
+        if body is None:
+            cities = CITY_SEARCH.search(bucket=state, limit=limit)
+            body = _cities_response(cities).model_dump_json().encode()
+            if cacheable:
+                _cities_response_cache[key] = body
+        return Response(content=body, media_type="application/json")
+
+    # Ranked: exact, prefix, word prefix, then substring matches
+    cities = CITY_SEARCH.search(search, bucket=state, limit=limit)
+    return _cities_response(cities)
+
+def _nearby_response(indices, distances):
+    cities = [
+        NearbyCity(**INDIAN_CITIES[i], distance_km=round(float(d), 2))
+        for i, d in zip(indices.tolist(), distances.tolist())
+    ]
+    return NearbyCitiesResponse(cities=cities, total_count=len(cities))
+
+@router.get("/cities/nearest", response_model=NearbyCitiesResponse)
+def get_nearest_cities(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude"),
+    limit: int = Query(5, ge=1, le=50, description="Number of cities to return")
+):
+    """Get the Indian cities closest to a point, nearest first"""
+    indices, distances = CITY_INDEX.nearest(lat, lng, limit)
+    return _nearby_response(indices, distances)
+
+@router.get("/cities/within", response_model=NearbyCitiesResponse)
+def get_cities_within_radius(
+    lat: float = Query(..., ge=-90, le=90, description="Latitude"),
+    lng: float = Query(..., ge=-180, le=180, description="Longitude"),
+    radius_km: float = Query(50, gt=0, le=2000, description="Search radius in km"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of cities to return")
+):
+    """Get the Indian cities within a radius of a point, nearest first"""
+    indices, distances = CITY_INDEX.within(lat, lng, radius_km, limit=limit)
+    return _nearby_response(indices, distances)
+
+async def live_or_estimated_reading(lat, lng, endpoint: str):
+    """Live reading from the nearest station, else an interpolated estimate; None if neither"""
+    reading = await get_real_air_quality_data(lat, lng)
+    if not reading:
+        # No station within 10 km: estimate from the surrounding city readings
+        estimate = SNAPSHOT_INTERPOLATOR.estimate_reading(lat, lng)
+        if estimate:
+            reading = {**estimate, "source": "interpolated"}
+            FALLBACK_RESPONSES.labels(endpoint, "interpolated").inc()
+    return reading
+
+async def resolve_air_quality(lat, lng, response: Optional[Response] = None):
+    """Live reading from the nearest station, else an interpolated estimate, else mock data.
+
+    When a response is given its Cache-Control is set to the freshness of the source used.
+    """
+    max_age = READING_CACHE_MAX_AGE
+    reading = await live_or_estimated_reading(lat, lng, "current")
+    if not reading:
+        # fallback to mock, which changes on the hour
+        reading = generate_realistic_mock_data(lat, lng)
+        max_age = seconds_until_next_hour()
+        FALLBACK_RESPONSES.labels("current", "mock").inc()
+    if response is not None:
+        response.headers["Cache-Control"] = cache_control(max_age)
+    return reading
 
 @router.get("/current")
-async def get_current_air_quality(lat: float = Query(...), lng: float = Query(...)):
-    real_data = await get_real_air_quality_data(lat, lng)
-    if real_data:
-        return real_data
-    # fallback to mock
-    mock_data = generate_realistic_mock_data(lat, lng)
-    return mock_data
+async def get_current_air_quality(response: Response, lat: float = Query(...), lng: float = Query(...)):
+    # Cities refreshed by the background scheduler are served from memory
+    snapshot_data = reading_snapshot.get(lat, lng, max_age=SNAPSHOT_MAX_AGE)
+    if snapshot_data:
+        response.headers["Cache-Control"] = cache_control(READING_CACHE_MAX_AGE)
+        return snapshot_data
+    return await resolve_air_quality(lat, lng, response)
+
+async def _gather_bounded(coros, limit):
+    """Run coroutines with at most `limit` in flight, returning results or exceptions"""
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coros), return_exceptions=True)
 
-@router.get("/forecast")
+@router.post("/current/batch", response_model=BatchAirQualityResponse)
+async def get_current_air_quality_batch(request: BatchAirQualityRequest):
+    """Get current air quality for many coordinates or Indian cities in one request"""
+    items = []
+    for loc in request.locations:
+        items.append(BatchAirQualityItem(lat=loc.lat, lng=loc.lng))
+    for name in request.cities:
+        matches = CITIES_BY_NAME.get(name.strip().lower())
+        if not matches:
+            items.append(BatchAirQualityItem(name=name, error="Unknown city"))
+            continue
+        for city in matches:
+            items.append(BatchAirQualityItem(name=city["name"], state=city["state"], lat=city["lat"], lng=city["lng"]))
+
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {BATCH_MAX_ITEMS} locations can be requested at once"
+        )
+
+    pending = []
+    for item in items:
+        if item.error is not None:
+            continue
+        snapshot_data = reading_snapshot.get(item.lat, item.lng, max_age=SNAPSHOT_MAX_AGE)
+        if snapshot_data:
+            item.source = "openaq"
+            item.data = AirQualityResponse(**snapshot_data)
+        else:
+            pending.append(item)
+
+    # Resolve every location to its station, then fetch each distinct station once
+    station_ids = await _gather_bounded(
+        [get_location_id(item.lat, item.lng) for item in pending], BATCH_CONCURRENCY
+    )
+    unique_ids = list({sid for sid in station_ids if sid and not isinstance(sid, BaseException)})
+    readings = await _gather_bounded(
+        [get_station_air_quality(sid) for sid in unique_ids], BATCH_CONCURRENCY
+    )
+    readings_by_station = {
+        sid: reading for sid, reading in zip(unique_ids, readings)
+        if reading and not isinstance(reading, BaseException)
+    }
+    failures = [r for r in list(station_ids) + list(readings) if isinstance(r, BaseException)]
+    if failures:
+        print(f"OpenAQ API error: {len(failures)} batch lookups failed, first: {failures[0]}")
+
+    unresolved = []
+    for item, sid in zip(pending, station_ids):
+        reading = None if isinstance(sid, BaseException) else readings_by_station.get(sid)
+        if reading:
+            item.source = "openaq"
+            item.data = AirQualityResponse(**reading)
+            _record_history(item.lat, item.lng, reading)
+        else:
+            unresolved.append(item)
+
+    # Estimate every location without a station in one vectorized call
+    estimates = SNAPSHOT_INTERPOLATOR.estimate_readings(
+        [item.lat for item in unresolved], [item.lng for item in unresolved]
+    ) if unresolved else []
+    for item, estimate in zip(unresolved, estimates):
+        if estimate:
+            item.source = "interpolated"
+            item.data = AirQualityResponse(**estimate)
+        else:
+            item.source = "mock"
+            item.data = AirQualityResponse(**generate_realistic_mock_data(item.lat, item.lng))
+        FALLBACK_RESPONSES.labels("current/batch", item.source).inc()
+
+    return BatchAirQualityResponse(
+        results=items,
+        total_count=len(items),
+        station_count=len(readings_by_station)
+    )
+
+@router.get("/forecast", response_model=ForecastResponse)
 async def get_forecast_air_quality(lat: float = Query(...), lng: float = Query(...)):
     real_data = await get_real_forecast_data(lat, lng)
     if real_data:
-        return real_data
-    # fallback to mock
-    current_data = generate_realistic_mock_data(lat, lng)
-    base_aqi = current_data['aqi']
-    forecast = []
-    for hour in range(24):
-        variation = random.uniform(-20, 30)
-        hour_aqi = max(0, min(500, base_aqi + variation))
-        forecast.append(int(hour_aqi))
-    return {'forecast': forecast, 'timestamp': current_data['timestamp']}
+        # OpenAQ gives no interval; the response may be shared by coalesced requests, so copy it
+        return {**real_data, "confidence": forecast_engine.confidence(lat, lng, len(real_data["forecast"]))}
+    # Model fitted on recorded readings (refit for all cities after each ingestion cycle)
+    forecast = forecast_engine.get(lat, lng)
+    if forecast is None:
+        try:
+            forecast = await forecast_engine.forecast_from_history(lat, lng)
+        except Exception as e:
+            print(f"Forecast from history failed: {e}")
+    if forecast:
+        FALLBACK_RESPONSES.labels("forecast", "model").inc()
+        return forecast
+    # Nothing recorded here yet: fit the model to a synthetic week
+    FALLBACK_RESPONSES.labels("forecast", "mock").inc()
+    return forecast_engine.forecast_synthetic(lat, lng)
+
+def generate_mock_history(lat, lng, days):
+    """Synthetic daily history for locations with no stored readings"""
+    history = synthetic_daily_history(lat, lng, days)
+    return [
+        HistoricalDataPoint(date=date, aqi=aqi, pm25=pm25, pm10=pm10, o3=o3, no2=no2)
+        for date, aqi, pm25, pm10, o3, no2 in zip(*(history[k].tolist() for k in ("date", "aqi", "pm25", "pm10", "o3", "no2")))
+    ]
 
 @router.get("/historical", response_model=HistoricalResponse)
-def get_historical_air_quality(
+async def get_historical_air_quality(
+    response: Response,
     lat: float = Query(..., description="Latitude"),
     lng: float = Query(..., description="Longitude"),
-    days: int = Query(7, description="Number of days of history")
+    days: int = Query(7, description="Number of days of history; use /historical/export for longer ranges")
 ):
     """Get historical air quality data"""
-    
-    data = []
-    for i in range(days):
-        date = (datetime.datetime.utcnow() - datetime.timedelta(days=days-1-i)).strftime('%Y-%m-%d')
-        
-        # Generate realistic historical data
-        base_aqi = 50 + (lat * 10 + lng * 5) % 100  # Varies by location
-        daily_variation = random.uniform(-30, 40)
-        aqi = max(0, min(500, base_aqi + daily_variation))
-        
-        data.append(HistoricalDataPoint(
-            date=date,
-            aqi=int(aqi),
-            pm25=round(random.uniform(10, 50), 1),
-            pm10=round(random.uniform(15, 80), 1),
-            o3=round(random.uniform(20, 60), 1),
-            no2=round(random.uniform(10, 40), 1),
-        ))
-    
-    return HistoricalResponse(data=data) 
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
- 
\ No newline at end of file
+    if days > HISTORY_MAX_DAYS:
+        # Tell the client how many days it actually got
+        response.headers["X-History-Days"] = str(HISTORY_MAX_DAYS)
+        days = HISTORY_MAX_DAYS
+    if days < 1:
+        return HistoricalResponse(data=[])
+    try:
+        rows = await daily_history(lat, lng, days)
+    except Exception as e:
+        print(f"History query failed: {e}")
+        rows = []
+    
+    if not rows:
+        # Nothing recorded for this location yet
+        FALLBACK_RESPONSES.labels("historical", "mock").inc()
+        return HistoricalResponse(data=generate_mock_history(lat, lng, days))
+    
+    return HistoricalResponse(data=[
+        HistoricalDataPoint(
+            date=row["day"],
+            aqi=int(round(row["aqi"] or 0)),
+            pm25=round(row["pm25"] or 0, 1),
+            pm10=round(row["pm10"] or 0, 1),
+            o3=round(row["o3"] or 0, 1),
+            no2=round(row["no2"] or 0, 1),
+        )
+        for row in rows
+    ])
+
+@router.get("/historical/export")
+async def export_historical_air_quality(
+    locations: List[str] = Query([], description='"lat,lng" pairs to export'),
+    cities: List[str] = Query([], description="Indian city names to export"),
+    days: int = Query(30, ge=1, le=HISTORY_EXPORT_MAX_DAYS, description="Number of days of history"),
+    fields: List[str] = Query([], description="Pollutant columns, repeated or comma-separated; all by default"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+):
+    """Stream raw recorded readings for several locations as NDJSON or CSV, oldest first per location"""
+    columns = [field.strip().lower() for value in fields for field in value.split(",") if field.strip()] or list(POLLUTANT_FIELDS)
+    unknown = [field for field in columns if field not in POLLUTANT_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(POLLUTANT_FIELDS)}"
+        )
+    points = _parse_points(locations, cities, HISTORY_EXPORT_MAX_LOCATIONS)
+    if not points:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No locations to export")
+    # History is keyed by rounded coordinates; cities are labelled by name
+    names = {
+        location_key(city["lat"], city["lng"]): city["name"]
+        for name in cities for city in CITIES_BY_NAME[str(name).strip().lower()]
+    }
+    labels = {}
+    for lat, lng in points:
+        key = location_key(lat, lng)
+        labels.setdefault(key, names.get(key, key))
+    return StreamingResponse(
+        stream_history_export(labels, days, list(dict.fromkeys(columns)), format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="air-quality-history.{format}"'},
+    )
+
+@router.get("/tiles/{z}/{x}/{y}")
+async def get_aqi_tile(z: int, x: int, y: int):
+    """256px PNG heatmap tile of AQI interpolated from the latest city readings"""
+    if not 0 <= z <= TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tile out of range")
+    # Rendering is CPU-bound; keep it off the event loop, but read the snapshot here where it is updated
+    tile = await asyncio.to_thread(TILE_RENDERER.render, z, x, y, TILE_RENDERER.capture())
+    return Response(content=tile, media_type="image/png")
+
+@router.get("/snapshot")
+async def get_snapshot_feed(
+    since: Optional[int] = Query(None, ge=0, description="Snapshot version the client already has"),
+    epoch: Optional[str] = Query(None, description="Epoch returned with that version"),
+):
+    """Latest reading of every ingested city as columns, or only the cities changed since `since`"""
+    # Runs on the event loop so the snapshot cannot change mid-encoding
+    return Response(content=SNAPSHOT_FEED.body(since, epoch), media_type="application/json")
+
+def _parse_points(locations, cities, max_locations=LIVE_MAX_LOCATIONS):
+    """(lat, lng) pairs for "lat,lng" strings or coordinate dicts plus INDIAN_CITIES names"""
+    points = []
+    for loc in locations:
+        try:
+            if isinstance(loc, str):
+                lat, lng = (float(part) for part in loc.split(","))
+            else:
+                lat, lng = float(loc["lat"]), float(loc["lng"])
+        except (ValueError, TypeError, KeyError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid location: {loc!r}")
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Location out of range: {loc!r}")
+        points.append((lat, lng))
+    for name in cities:
+        matches = CITIES_BY_NAME.get(str(name).strip().lower())
+        if not matches:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown city: {name}")
+        points.extend((city["lat"], city["lng"]) for city in matches)
+    if len(points) > max_locations:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {max_locations} locations are allowed per request"
+        )
+    return points
+
+@router.get("/live")
+async def stream_live_air_quality(
+    locations: List[str] = Query([], description='"lat,lng" pairs to watch'),
+    cities: List[str] = Query([], description="Indian city names to watch"),
+):
+    """Server-Sent Events stream of readings for the given locations, pushed only when they change"""
+    points = _parse_points(locations, cities)
+    if not points:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No locations to watch")
+    subscription = LIVE_HUB.subscribe(points)
+
+    async def events():
+        try:
+            # Ask EventSource to reconnect after a drop rather than its 3 s default
+            yield b"retry: 5000\n\n"
+            while True:
+                update = await subscription.get(LIVE_HEARTBEAT_INTERVAL)
+                yield update.sse if update is not None else b": ping\n\n"
+        except SubscriptionClosed:
+            return
+        finally:
+            LIVE_HUB.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _send_live_updates(websocket: WebSocket, subscription):
+    """Push updates until the subscription or the socket fails, then close the socket so the receive loop ends too"""
+    try:
+        while True:
+            update = await subscription.get(LIVE_HEARTBEAT_INTERVAL)
+            await websocket.send_text(update.payload if update is not None else '{"type": "ping"}')
+    except SubscriptionClosed as e:
+        # 1013: try again later
+        code, reason = 1013, str(e)
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        print(f"Live WebSocket send failed: {e}")
+        # 1011: unexpected server condition
+        code, reason = 1011, ""
+    try:
+        await websocket.close(code=code, reason=reason)
+    except Exception:
+        # Already closed by the client or the server
+        pass
+
+@router.websocket("/ws")
+async def live_air_quality_socket(websocket: WebSocket):
+    """Live readings over a WebSocket.
+
+    Clients send {"action": "subscribe" | "unsubscribe", "locations": [{"lat", "lng"}], "cities": [...]}
+    and receive the same reading messages as /live.
+    """
+    await websocket.accept()
+    subscription = LIVE_HUB.subscribe()
+    sender = asyncio.create_task(_send_live_updates(websocket, subscription))
+    try:
+        while True:
+            text = await websocket.receive_text()
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("Expected a JSON object")
+                points = _parse_points(message.get("locations", []), message.get("cities", []))
+                if message.get("action", "subscribe") == "unsubscribe":
+                    LIVE_HUB.remove(subscription, points)
+                elif len(subscription.keys) + len(points) > LIVE_MAX_LOCATIONS:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"At most {LIVE_MAX_LOCATIONS} locations can be watched per connection"
+                    )
+                else:
+                    LIVE_HUB.add(subscription, points)
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "detail": e.detail})
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": f"Invalid message: {e}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # The sender handles its own errors, so cancelling it leaves nothing unretrieved
+        sender.cancel()
+        LIVE_HUB.unsubscribe(subscription)
+
+@router.get("/stats")
+def get_upstream_stats():
+    """Report cache, request-coalescing and circuit-breaker statistics for the OpenAQ calls"""
+    return {
+        "station_cache": station_cache.stats(),
+        "coalescing": coalescing_stats(),
+        "upstream": resilience_stats(),
+        "quota": openaq_quota.stats(),
+        "measurement_parsing": measurement_parse_stats(),
+        "ingestion": ingestion_stats(),
+        "snapshot": reading_snapshot.stats(),
+        "history": history_stats(),
+        "history_export": export_stats(),
+        "forecast": forecast_stats(),
+        "tiles": TILE_RENDERER.stats(),
+        "interpolation": SNAPSHOT_INTERPOLATOR.stats(),
+        "live": LIVE_HUB.stats(),
+        "snapshot_feed": SNAPSHOT_FEED.stats(),
+        "http_cache": http_cache_stats(),
+        "compression": compression_stats(),
+    }
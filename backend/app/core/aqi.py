@@ -0,0 +1,107 @@
+"""Vectorized Indian CPCB AQI engine.
+
+Breakpoint tables are NumPy arrays, so sub-indices for whole columns of
+readings are found with one searchsorted call per pollutant instead of a
+Python scan per value.
+"""
+from typing import Mapping, Optional, Tuple
+
+import numpy as np
+
+# Index band shared by every pollutant: Good .. Severe
+INDEX_BANDS = ((0, 50), (51, 100), (101, 200), (201, 300), (301, 400), (401, 500))
+
+# Concentration bands per pollutant (µg/m³, CO in mg/m³). The top band is
+# open-ended in the CPCB table and is capped here so it can be interpolated.
+CONCENTRATION_BANDS = {
+    "pm25": ((0, 30), (31, 60), (61, 90), (91, 120), (121, 250), (251, 500)),
+    "pm10": ((0, 50), (51, 100), (101, 250), (251, 350), (351, 430), (431, 600)),
+    "no2": ((0, 40), (41, 80), (81, 180), (181, 280), (281, 400), (401, 800)),
+    "so2": ((0, 40), (41, 80), (81, 380), (381, 800), (801, 1600), (1601, 2000)),
+    "co": ((0, 1.0), (1.1, 2.0), (2.1, 10), (10.1, 17), (17.1, 34), (34.1, 50)),
+    "o3": ((0, 50), (51, 100), (101, 168), (169, 208), (209, 748), (749, 1000)),
+    "nh3": ((0, 200), (201, 400), (401, 800), (801, 1200), (1201, 1800), (1801, 2400)),
+    "pb": ((0, 0.5), (0.6, 1.0), (1.1, 2.0), (2.1, 3.0), (3.1, 3.5), (3.6, 5.0)),
+}
+
+POLLUTANTS = tuple(CONCENTRATION_BANDS)
+MAX_INDEX = 500
+
+# Molecular weights used to turn ppb/ppm gas readings into µg/m³ at 25 °C
+MOLECULAR_WEIGHTS = {"no2": 46.01, "so2": 64.07, "co": 28.01, "o3": 48.00, "nh3": 17.03}
+MOLAR_VOLUME = 24.45
+
+class _Table:
+    __slots__ = ("bp_lo", "bp_hi", "i_lo", "slope")
+
+    def __init__(self, bands):
+        self.bp_lo = np.array([lo for lo, _ in bands], dtype=np.float64)
+        self.bp_hi = np.array([hi for _, hi in bands], dtype=np.float64)
+        self.i_lo = np.array([lo for lo, _ in INDEX_BANDS], dtype=np.float64)
+        i_hi = np.array([hi for _, hi in INDEX_BANDS], dtype=np.float64)
+        self.slope = (i_hi - self.i_lo) / (self.bp_hi - self.bp_lo)
+
+TABLES = {name: _Table(bands) for name, bands in CONCENTRATION_BANDS.items()}
+
+def sub_index(pollutant: str, values) -> np.ndarray:
+    """CPCB sub-index for an array of concentrations; NaN in, NaN out"""
+    table = TABLES[pollutant]
+    values = np.asarray(values, dtype=np.float64)
+    # First band whose upper bound is >= the value. Values that fall in the
+    # gap between two published bands (e.g. PM2.5 30.5) land in the upper band
+    # and are clamped to its lower bound instead of dropping through to 500.
+    band = np.searchsorted(table.bp_hi, values, side="left")
+    above = band >= len(table.bp_hi)
+    band = np.minimum(band, len(table.bp_hi) - 1)
+    lo = table.bp_lo[band]
+    conc = np.maximum(values, lo)
+    index = np.rint(table.slope[band] * (conc - lo) + table.i_lo[band])
+    index = np.where(above, MAX_INDEX, index)
+    return np.where(np.isnan(values), np.nan, index)
+
+def compute_aqi(readings: Mapping[str, object]) -> Tuple[np.ndarray, np.ndarray]:
+    """Overall AQI and dominant pollutant for columns of readings.
+
+    `readings` maps pollutant names to equal-length arrays (or scalars);
+    missing values should be NaN. Returns the AQI as a float array (NaN where
+    no pollutant was available) and an object array of dominant pollutant
+    names (None where no pollutant was available).
+    """
+    names = [name for name in POLLUTANTS if name in readings]
+    if not names:
+        raise ValueError("No supported pollutant in readings")
+    indices = np.stack([sub_index(name, readings[name]) for name in names])
+    has_value = ~np.all(np.isnan(indices), axis=0)
+    filled = np.where(np.isnan(indices), -1.0, indices)
+    dominant_idx = np.argmax(filled, axis=0)
+    aqi = np.where(has_value, np.take_along_axis(filled, dominant_idx[None], axis=0)[0], np.nan)
+    labels = np.array(names + [None], dtype=object)
+    dominant = labels[np.where(has_value, dominant_idx, len(names))]
+    return aqi, dominant
+
+def compute_aqi_scalar(**readings) -> Tuple[int, Optional[str]]:
+    """AQI and dominant pollutant for one set of readings; None or 0 counts as missing"""
+    columns = {
+        name: [float(value) if value else np.nan]
+        for name, value in readings.items()
+        if name in TABLES
+    }
+    if not columns:
+        return 0, None
+    aqi, dominant = compute_aqi(columns)
+    if np.isnan(aqi[0]):
+        return 0, None
+    return int(aqi[0]), dominant[0]
+
+def to_cpcb_units(pollutant: str, value: float, unit: Optional[str]) -> float:
+    """Convert an OpenAQ reading to the units the CPCB tables use"""
+    if value is None or not unit:
+        return value
+    unit = unit.lower().replace("µ", "u").replace("μ", "u")
+    weight = MOLECULAR_WEIGHTS.get(pollutant)
+    if unit in ("ppm", "ppb") and weight:
+        ugm3 = value * weight / MOLAR_VOLUME * (1000 if unit == "ppm" else 1)
+        return ugm3 / 1000 if pollutant == "co" else ugm3
+    if pollutant == "co" and unit in ("ug/m3", "ug/m³"):
+        return value / 1000
+    return value
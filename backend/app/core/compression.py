@@ -0,0 +1,172 @@
+"""Response compression negotiated from Accept-Encoding.
+
+Brotli is preferred when the optional brotli package is installed, then
+gzip. Only text-like bodies of at least COMPRESSION_MIN_SIZE bytes are
+compressed. Streamed bodies are compressed chunk by chunk, each chunk
+flushed so a slow export still arrives as it is produced. Server-Sent
+Events and images pass through untouched. A strong ETag is made weak on
+an encoded body, since the bytes are no longer the identity representation
+the ETag was computed from.
+"""
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression settings
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "application/xml", "image/svg+xml", "text/")
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+def brotli_available() -> bool:
+    return brotli is not None
+
+def negotiate_encoding(accept_encoding: str, allow_brotli: bool = True) -> Optional[str]:
+    """Pick "br", "gzip" or None from an Accept-Encoding header, honouring q-values"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = [("br", weights.get("br", wildcard))] if allow_brotli and brotli is not None else []
+    candidates.append(("gzip", weights.get("gzip", weights.get("x-gzip", wildcard))))
+    coding, q = max(candidates, key=lambda candidate: candidate[1])
+    return coding if q > 0 else None
+
+def is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    if content_type.startswith(UNCOMPRESSED_TYPES):
+        return False
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+class _Encoder:
+    """Incremental gzip or brotli encoder"""
+
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def encode(self, data: bytes, final: bool) -> bytes:
+        if self.coding == "br":
+            return self._brotli.process(data) + (self._brotli.finish() if final else self._brotli.flush())
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+_compression_totals = {"responses": 0, "compressed": 0, "gzip": 0, "br": 0, "streamed": 0, "too_small": 0, "bytes_in": 0, "bytes_out": 0}
+
+def _add_vary(headers: MutableHeaders):
+    vary = headers.get("vary")
+    if vary is None:
+        headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        headers["Vary"] = f"{vary}, Accept-Encoding"
+
+def _weaken_etag(headers: MutableHeaders):
+    etag = headers.get("etag")
+    if etag and not etag.startswith("W/"):
+        headers["ETag"] = f"W/{etag}"
+
+class CompressionMiddleware:
+    """Compress HTTP response bodies with the best encoding the client accepts"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, gzip_level: int = COMPRESSION_GZIP_LEVEL,
+                 brotli_quality: int = COMPRESSION_BROTLI_QUALITY, allow_brotli: bool = True):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.allow_brotli = allow_brotli
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        coding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.allow_brotli)
+        start = None
+        encoder = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if encoder is not None:
+                body = message.get("body", b"")
+                final = not message.get("more_body", False)
+                encoded = encoder.encode(body, final)
+                _compression_totals["bytes_in"] += len(body)
+                _compression_totals["bytes_out"] += len(encoded)
+                if encoded or final:
+                    await send({"type": "http.response.body", "body": encoded, "more_body": not final})
+                return
+
+            # First body message: decide how this response is sent
+            _compression_totals["responses"] += 1
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            streamed = message.get("more_body", False)
+            status = start["status"]
+            if status == 304 and coding is not None:
+                _add_vary(headers)
+                _weaken_etag(headers)
+            compressible = status not in (204, 304) and "content-encoding" not in headers and is_compressible(headers.get("content-type", ""))
+            if compressible:
+                _add_vary(headers)
+            if not compressible or coding is None or (not streamed and len(body) < self.minimum_size):
+                if compressible and coding is not None:
+                    _compression_totals["too_small"] += 1
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+
+            encoder = _Encoder(coding, self.gzip_level, self.brotli_quality)
+            _compression_totals["compressed"] += 1
+            _compression_totals[coding] += 1
+            headers["Content-Encoding"] = coding
+            _weaken_etag(headers)
+            encoded = encoder.encode(body, not streamed)
+            _compression_totals["bytes_in"] += len(body)
+            _compression_totals["bytes_out"] += len(encoded)
+            if streamed:
+                _compression_totals["streamed"] += 1
+                del headers["content-length"]
+            else:
+                headers["Content-Length"] = str(len(encoded))
+            await send(start)
+            await send({"type": "http.response.body", "body": encoded, "more_body": streamed})
+
+        await self.app(scope, receive, send_compressed)
+
+def compression_stats() -> dict:
+    bytes_in = _compression_totals["bytes_in"]
+    return {
+        **_compression_totals,
+        "brotli_available": brotli_available(),
+        "ratio": round(_compression_totals["bytes_out"] / bytes_in, 4) if bytes_in else 0.0,
+    }
@@ -0,0 +1,181 @@
+"""HTTP caching middleware: ETag, Cache-Control and 304 Not Modified.
+
+Written as plain ASGI rather than BaseHTTPMiddleware so streamed responses
+pass straight through and a revalidation answered from a data version
+never reaches the route at all.
+"""
+import hashlib
+import os
+import time
+from typing import Callable, Dict, Optional, Union
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Only bodies up to this size are buffered to compute a content ETag
+HTTP_CACHE_MAX_BODY = int(os.getenv("HTTP_CACHE_MAX_BODY", str(4 * 1024 * 1024)))
+
+MaxAge = Union[int, Callable[[], int], None]
+
+def seconds_until_next_hour() -> int:
+    """Freshness of data that changes on the hour, such as mock readings"""
+    return max(1, 3600 - int(time.time()) % 3600)
+
+def cache_control(max_age: Optional[int], public: bool = True) -> str:
+    """Cache-Control value: max-age=0 means cache but revalidate, None means never store"""
+    if max_age is None:
+        return "no-store"
+    scope = "public" if public else "private"
+    if max_age <= 0:
+        return f"{scope}, no-cache"
+    return f"{scope}, max-age={max_age}"
+
+def make_etag(*parts) -> str:
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match list against an ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == bare:
+            return True
+    return False
+
+class CachePolicy:
+    """How long one endpoint's responses stay fresh, and optionally the data version behind them.
+
+    With a version function the ETag is derived from (version, path,
+    query), so a matching If-None-Match is answered with 304 before the
+    route runs. Without one the ETag is a hash of the response body.
+    """
+
+    def __init__(self, max_age: MaxAge = 0, public: bool = True, version: Optional[Callable[[], object]] = None):
+        self.max_age = max_age
+        self.public = public
+        self.version = version
+
+    def header(self) -> str:
+        max_age = self.max_age() if callable(self.max_age) else self.max_age
+        return cache_control(max_age, self.public)
+
+# Per-user routes: browsers may keep a copy but must revalidate it
+PRIVATE_REVALIDATE = CachePolicy(0, public=False)
+NO_STORE = CachePolicy(None)
+
+_cache_totals = {"responses": 0, "not_modified": 0, "not_modified_before_route": 0, "etags_computed": 0}
+
+class HTTPCacheMiddleware:
+    """Add ETag and Cache-Control to GET responses and answer matching If-None-Match with 304.
+
+    Policies are looked up by exact path, then by the longest prefix ending
+    in "/". A Cache-Control or ETag header set by the route wins over the
+    policy. Streamed bodies are passed through with only a Cache-Control
+    default, and non-200 responses untouched.
+    """
+
+    def __init__(self, app, policies: Optional[Dict[str, CachePolicy]] = None, default: Optional[CachePolicy] = PRIVATE_REVALIDATE, max_body: int = HTTP_CACHE_MAX_BODY):
+        self.app = app
+        self.policies = dict(policies or {})
+        self.prefixes = sorted((path for path in self.policies if path.endswith("/")), key=len, reverse=True)
+        self.default = default
+        self.max_body = max_body
+
+    def policy_for(self, path: str) -> Optional[CachePolicy]:
+        policy = self.policies.get(path)
+        if policy is not None:
+            return policy
+        for prefix in self.prefixes:
+            if path.startswith(prefix):
+                return self.policies[prefix]
+        return self.default
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        policy = self.policy_for(scope["path"])
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+        _cache_totals["responses"] += 1
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        cache_header = policy.header()
+
+        etag = None
+        if policy.version is not None and policy.max_age is not None:
+            etag = make_etag(policy.version(), scope["path"], scope.get("query_string", b""))
+            if if_none_match and etag_matches(if_none_match, etag):
+                _cache_totals["not_modified"] += 1
+                _cache_totals["not_modified_before_route"] += 1
+                await self._send_not_modified(send, etag, cache_header, {})
+                return
+
+        start = None
+        body = []
+        passthrough = False
+
+        async def send_with_cache(message):
+            nonlocal start, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            headers = MutableHeaders(scope=start)
+            # Errors keep whatever the route said; a policy's max-age only describes successes
+            if start["status"] == 200 and "cache-control" not in headers:
+                headers["Cache-Control"] = cache_header
+            streamed = message.get("more_body", False) and not body
+            too_big = sum(map(len, body)) + len(message.get("body", b"")) > self.max_body
+            if start["status"] != 200 or policy.max_age is None or streamed or too_big:
+                # Nothing to validate against: forward what was held back and stop buffering
+                passthrough = True
+                await send(start)
+                for chunk in body:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send(message)
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            content = b"".join(body)
+            response_etag = headers.get("etag") or etag
+            if response_etag is None:
+                _cache_totals["etags_computed"] += 1
+                response_etag = make_etag(content)
+            headers["ETag"] = response_etag
+            if if_none_match and etag_matches(if_none_match, response_etag):
+                _cache_totals["not_modified"] += 1
+                await self._send_not_modified(send, response_etag, headers["cache-control"], headers)
+                return
+            await send(start)
+            await send({"type": "http.response.body", "body": content, "more_body": False})
+
+        await self.app(scope, receive, send_with_cache)
+
+    @staticmethod
+    async def _send_not_modified(send, etag: str, cache_header: str, headers):
+        response_headers = MutableHeaders()
+        response_headers["ETag"] = etag
+        response_headers["Cache-Control"] = cache_header
+        vary = headers.get("vary") if headers else None
+        if vary:
+            response_headers["Vary"] = vary
+        await send({"type": "http.response.start", "status": 304, "headers": response_headers.raw})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+def http_cache_stats() -> dict:
+    responses = _cache_totals["responses"]
+    return {
+        **_cache_totals,
+        "not_modified_ratio": round(_cache_totals["not_modified"] / responses, 4) if responses else 0.0,
+    }
@@ -0,0 +1,252 @@
+"""Prometheus metrics in the text exposition format, served at /metrics.
+
+Counters, gauges and histograms are plain Python numbers updated without
+a lock: on the event loop nothing can interleave with an increment, and
+from worker threads the GIL keeps a lost update rare enough to accept for
+monitoring. A histogram observation is one bisect and two additions, and
+buckets are only made cumulative when /metrics is scraped. Caches keep
+counting hits and misses on their own objects; their ratios are read at
+scrape time through register_cache, so the hot paths pay nothing extra.
+"""
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# /metrics endpoint and request middleware; recording in services is always on
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Upper bounds in seconds of the latency histogram buckets
+METRICS_LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv("METRICS_LATENCY_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10").split(",")
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Largest number of request paths whose route template is remembered for pre-routing answers
+ROUTE_CACHE_SIZE = 1024
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        # One slot per bucket plus the overflow; made cumulative when rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+class Metric:
+    """A named metric family with one child per combination of label values"""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        if not self.labelnames:
+            # Unlabelled metrics are exported from the start, even at zero
+            self.labels()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values) -> object:
+        """The child for these label values; hold on to it in hot paths to skip the lookup"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            # setdefault is atomic, so racing threads end up sharing one child
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> List[str]:
+        # dict.copy() is atomic, so a child added by another thread mid-scrape is harmless
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in sorted(self._children.copy().items())
+        ]
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = METRICS_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for values, child in sorted(self._children.copy().items()):
+            counts = list(child.counts)
+            total = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                total += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {total}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {total}")
+        return lines
+
+REGISTRY: List[Metric] = []
+# cache name -> function returning (hits, misses)
+_caches: Dict[str, Callable[[], Tuple[int, int]]] = {}
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request, by route template", ("method", "route", "status")
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being answered")
+OPENAQ_REQUEST_SECONDS = Histogram(
+    "openaq_request_duration_seconds", "Latency of OpenAQ calls after the quota wait, by endpoint and outcome", ("endpoint", "outcome")
+)
+OPENAQ_REQUESTS = Counter("openaq_requests_total", "OpenAQ calls by endpoint and outcome", ("endpoint", "outcome"))
+FALLBACK_RESPONSES = Counter(
+    "fallback_responses_total", "Answers served without live OpenAQ data, by endpoint and source", ("endpoint", "source")
+)
+DB_OPERATION_SECONDS = Histogram(
+    "db_operation_duration_seconds", "Database operation time, by backend and operation", ("backend", "operation")
+)
+DB_OPERATION_ERRORS = Counter("db_operation_errors_total", "Failed database operations", ("backend", "operation"))
+
+def register_cache(name: str, read: Callable[[], Tuple[int, int]]):
+    """Export a cache's (hits, misses), read from the cache itself at scrape time"""
+    _caches[name] = read
+
+def _cache_samples() -> List[str]:
+    lines = {"hits": [], "misses": [], "ratio": []}
+    for name, read in sorted(_caches.items()):
+        hits, misses = read()
+        label = _format_labels(("cache",), (name,))
+        lines["hits"].append(f"cache_hits_total{label} {hits}")
+        lines["misses"].append(f"cache_misses_total{label} {misses}")
+        lines["ratio"].append(f"cache_hit_ratio{label} {_format_value(hits / (hits + misses) if hits + misses else 0.0)}")
+    return [
+        "# HELP cache_hits_total Lookups answered from an in-process cache",
+        "# TYPE cache_hits_total counter",
+        *lines["hits"],
+        "# HELP cache_misses_total Lookups an in-process cache could not answer",
+        "# TYPE cache_misses_total counter",
+        *lines["misses"],
+        "# HELP cache_hit_ratio Share of cache lookups that were hits",
+        "# TYPE cache_hit_ratio gauge",
+        *lines["ratio"],
+    ]
+
+def render() -> bytes:
+    """Every metric in the Prometheus text format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    if _caches:
+        lines.extend(_cache_samples())
+    return ("\n".join(lines) + "\n").encode()
+
+class MetricsMiddleware:
+    """Time every HTTP request and count the ones in flight.
+
+    Requests are labelled with the route template they matched. Requests
+    answered before routing, such as 304s from the cache middleware, use
+    the template last seen for the same path; anything else is labelled
+    "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[str, str] = {}
+
+    def _route_for(self, scope) -> str:
+        path = scope["path"]
+        route = scope.get("route")
+        if route is None:
+            return self._routes.get(path, "unmatched")
+        template = getattr(route, "path", "unmatched")
+        if path not in self._routes and len(self._routes) < ROUTE_CACHE_SIZE:
+            self._routes[path] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_SECONDS.labels(scope["method"], self._route_for(scope), str(status)).observe(time.perf_counter() - start)
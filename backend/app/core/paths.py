@@ -0,0 +1,19 @@
+"""Where the backend keeps its local state files.
+
+Station cache snapshots, the shared OpenAQ quota and the history segments
+default to files under DATA_DIR (backend/data, ignored by git) instead of
+whatever directory the server was started from.
+"""
+import os
+
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "data"))
+
+def data_path(name: str) -> str:
+    """Default location of a state file; its directory is created by whoever writes it"""
+    return os.path.join(DATA_DIR, name)
+
+def ensure_parent(path: str):
+    """Create the directory a state file goes in"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,135 @@
+"""Fast JSON rendering shared by every router.
+
+Routes with a response_model are already serialized by pydantic-core, so
+they are left alone. Routes that return plain dicts would otherwise go
+through jsonable_encoder, which walks the whole payload in Python before
+it is dumped; FastJSONRoute renders those results with orjson directly.
+ObjectId, datetime, numpy values and nested models are handled by the
+encoder itself. Without orjson installed the standard json module is used
+with the same fallbacks.
+"""
+import functools
+import inspect
+import json
+from decimal import Decimal
+
+from bson import ObjectId
+from fastapi.datastructures import DefaultPlaceholder
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """Types neither orjson nor json know about, as jsonable_encoder would render them"""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json", by_alias=True)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, bytes):
+        return obj.decode()
+    # numpy scalars when falling back to json; orjson serializes them itself
+    if hasattr(obj, "item") and hasattr(obj, "dtype"):
+        return obj.tolist()
+    return jsonable_encoder(obj)
+
+def _json_default(obj):
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return _default(obj)
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(content) -> bytes:
+        return orjson.dumps(content, default=_default, option=_OPTIONS)
+else:
+    def dumps(content) -> bytes:
+        return json.dumps(content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+def orjson_available() -> bool:
+    return orjson is not None
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (or compact json) and the shared fallbacks"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def _response_param(signature: inspect.Signature):
+    for parameter in signature.parameters.values():
+        if inspect.isclass(parameter.annotation) and issubclass(parameter.annotation, Response):
+            return parameter.name
+    return None
+
+def render_with_fast_json(endpoint, status_code=None):
+    """Wrap an endpoint so plain results come back as a FastJSONResponse.
+
+    Headers and a status code set on the injected Response are copied over,
+    which FastAPI itself only does for results it serializes. Endpoints
+    without such a parameter get a hidden one.
+    """
+    signature = inspect.signature(endpoint)
+    name = _response_param(signature)
+    hidden = name is None
+    if hidden:
+        name = "_fast_json_response"
+        parameter = inspect.Parameter(name, inspect.Parameter.KEYWORD_ONLY, annotation=Response)
+        parameters = list(signature.parameters.values())
+        # Keep **kwargs last so the signature stays valid
+        at = next((i for i, p in enumerate(parameters) if p.kind == inspect.Parameter.VAR_KEYWORD), len(parameters))
+        signature = signature.replace(parameters=parameters[:at] + [parameter] + parameters[at:])
+
+    def render(result, sub_response: Response):
+        if isinstance(result, Response):
+            return result
+        rendered = FastJSONResponse(result, status_code=sub_response.status_code or status_code or 200)
+        rendered.raw_headers.extend(sub_response.raw_headers)
+        return rendered
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            sub_response = kwargs.pop(name) if hidden else kwargs[name]
+            return render(await endpoint(*args, **kwargs), sub_response)
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            sub_response = kwargs.pop(name) if hidden else kwargs[name]
+            return render(endpoint(*args, **kwargs), sub_response)
+
+    wrapper.__signature__ = signature
+    return wrapper
+
+def _renders_plain_json(endpoint, kwargs) -> bool:
+    if inspect.isasyncgenfunction(endpoint) or inspect.isgeneratorfunction(endpoint):
+        return False
+    response_model = kwargs.get("response_model")
+    if response_model is not None and not isinstance(response_model, DefaultPlaceholder):
+        return False
+    if not isinstance(kwargs.get("response_class", DefaultPlaceholder(None)), DefaultPlaceholder):
+        return False
+    # A return annotation becomes the response model unless it is a Response
+    annotation = inspect.signature(endpoint).return_annotation
+    return annotation is inspect.Signature.empty or annotation is None or (
+        inspect.isclass(annotation) and issubclass(annotation, Response)
+    )
+
+class FastJSONRoute(APIRoute):
+    """APIRoute that skips jsonable_encoder for routes without a response model"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if _renders_plain_json(endpoint, kwargs):
+            endpoint = render_with_fast_json(endpoint, kwargs.get("status_code"))
+        super().__init__(path, endpoint, **kwargs)
@@ -1,12 +1,16 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import MongoClient, monitoring
 import os
+import time
+import functools
 from typing import Optional
 import certifi
 import sqlite3
 import json
 from datetime import datetime
 
+from .core.metrics import DB_OPERATION_SECONDS, DB_OPERATION_ERRORS
+
 # MongoDB connection settings
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "air_pollution_tracker")
@@ -20,6 +24,38 @@ async_client: Optional[AsyncIOMotorClient] = None
 # Local SQLite database
 LOCAL_DB_PATH = "local_database.db"
 
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Time every command the Motor client sends, by command name"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        DB_OPERATION_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        DB_OPERATION_SECONDS.labels("mongo", event.command_name).observe(event.duration_micros / 1e6)
+        DB_OPERATION_ERRORS.labels("mongo", event.command_name).inc()
+
+def timed_sqlite(operation):
+    """Record a SQLite helper's run time and failures under the given operation name"""
+    def decorator(fn):
+        histogram = DB_OPERATION_SECONDS.labels("sqlite", operation)
+        errors = DB_OPERATION_ERRORS.labels("sqlite", operation)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
 def get_local_db():
     """Get local SQLite database connection"""
     conn = sqlite3.connect(LOCAL_DB_PATH)
@@ -61,6 +97,9 @@ def init_local_database():
         CREATE TABLE IF NOT EXISTS air_quality_history (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             location_name TEXT NOT NULL,
+            location_key TEXT,
+            latitude REAL,
+            longitude REAL,
             aqi INTEGER,
             pm25 REAL,
             pm10 REAL,
@@ -72,6 +111,18 @@ def init_local_database():
         )
     ''')
     
+    # Add history columns missing from databases created before they existed
+    history_columns = {row["name"] for row in cursor.execute("PRAGMA table_info(air_quality_history)")}
+    for column, column_type in (("location_key", "TEXT"), ("latitude", "REAL"), ("longitude", "REAL")):
+        if column not in history_columns:
+            cursor.execute(f"ALTER TABLE air_quality_history ADD COLUMN {column} {column_type}")
+    
+    # One reading per location and timestamp; also serves history range queries
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_history_location_time
+        ON air_quality_history (location_key, timestamp)
+    ''')
+    
     # Create notifications table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS notifications (
@@ -121,7 +172,8 @@ async def connect_to_mongo():
             tlsCAFile=certifi.where(),
             serverSelectionTimeoutMS=5000,
             connectTimeoutMS=10000,
-            socketTimeoutMS=10000
+            socketTimeoutMS=10000,
+            event_listeners=[MongoCommandMetrics()]
         )
         print(f"✅ Connected to MongoDB: {MONGODB_URL}")
     except Exception as e:
@@ -177,6 +229,7 @@ def get_user_settings_collection():
     return get_database()["user_settings"]
 
 # SQLite-specific helper functions
+@timed_sqlite("find_one")
 def sqlite_find_one(table, query, db_conn=None):
     """SQLite equivalent of MongoDB find_one"""
     if db_conn is None:
@@ -196,6 +249,7 @@ def sqlite_find_one(table, query, db_conn=None):
         return dict(result)
     return None
 
+@timed_sqlite("insert_one")
 def sqlite_insert_one(table, data, db_conn=None):
     """SQLite equivalent of MongoDB insert_one"""
     if db_conn is None:
@@ -217,6 +271,7 @@ def sqlite_insert_one(table, data, db_conn=None):
     db_conn.commit()
     return cursor.lastrowid
 
+@timed_sqlite("replace_one")
 def sqlite_replace_one(table, query, data, db_conn=None):
     """SQLite equivalent of MongoDB replace_one"""
     if db_conn is None:
@@ -242,6 +297,7 @@ def sqlite_replace_one(table, query, data, db_conn=None):
     db_conn.commit()
     return cursor.rowcount > 0
 
+@timed_sqlite("update_one")
 def sqlite_update_one(table, query, update_data, db_conn=None):
     """SQLite equivalent of MongoDB update_one"""
     if db_conn is None:
@@ -263,6 +319,7 @@ def sqlite_update_one(table, query, update_data, db_conn=None):
     db_conn.commit()
     return cursor.rowcount > 0
 
+@timed_sqlite("delete_one")
 def sqlite_delete_one(table, query, db_conn=None):
     """SQLite equivalent of MongoDB delete_one"""
     if db_conn is None:
@@ -280,6 +337,7 @@ def sqlite_delete_one(table, query, db_conn=None):
     db_conn.commit()
     return cursor.rowcount > 0
 
+@timed_sqlite("find_many")
 def sqlite_find_many(table, query, limit=None, skip=0, order_by=None, db_conn=None):
     """SQLite equivalent of MongoDB find_many"""
     if db_conn is None:
@@ -307,6 +365,7 @@ def sqlite_find_many(table, query, limit=None, skip=0, order_by=None, db_conn=No
     results = cursor.fetchall()
     return [dict(result) for result in results]
 
+@timed_sqlite("delete_many")
 def sqlite_delete_many(table, query, db_conn=None):
     """SQLite equivalent of MongoDB delete_many"""
     if db_conn is None:
@@ -324,6 +383,7 @@ def sqlite_delete_many(table, query, db_conn=None):
     db_conn.commit()
     return cursor.rowcount
 
+@timed_sqlite("update_many")
 def sqlite_update_many(table, query, update_data, db_conn=None):
     """SQLite equivalent of MongoDB update_many"""
     if db_conn is None:
@@ -2,20 +2,41 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.database import connect_to_mongo, close_mongo_connection, get_database
-from app.api.air_quality import router as air_quality_router
+from app.services.openaq_client import init_openaq_client, close_openaq_client
+from app.services.station_cache import load_station_cache, save_station_cache
+from app.services.ingestion import start_ingestion, stop_ingestion
+from app.services.history import start_history, stop_history
+from app.services.forecasting import start_forecasting, stop_forecasting
+from app.api.air_quality import router as air_quality_router, INDIAN_CITIES, CACHE_POLICIES, LIVE_HUB, fetch_latest_air_quality
+from app.core.http_cache import HTTPCacheMiddleware, NO_STORE
+from app.core.compression import CompressionMiddleware
+from app.core.serialization import FastJSONRoute
+from app.core.metrics import METRICS_ENABLED, MetricsMiddleware, CONTENT_TYPE as METRICS_CONTENT_TYPE, render as render_metrics
 from app.routes import users, locations, notifications
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    await init_openaq_client()
+    load_station_cache()
+    await start_history()
+    # Pre-warm the city snapshot before the app starts serving
+    await start_ingestion(INDIAN_CITIES, fetch_latest_air_quality)
+    start_forecasting(INDIAN_CITIES)
     yield
     # Shutdown
+    await LIVE_HUB.close()
+    await stop_forecasting()
+    await stop_ingestion()
+    await stop_history()
+    save_station_cache()
+    await close_openaq_client()
     await close_mongo_connection()
 
 app = FastAPI(
@@ -24,6 +45,13 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+# Plain dict results of the routes below are rendered with orjson
+app.router.route_class = FastJSONRoute
+
+# ETag / Cache-Control / 304 for GET responses of every router; added first so CORS wraps the 304s
+app.add_middleware(HTTPCacheMiddleware, policies={**CACHE_POLICIES, "/metrics": NO_STORE})
+# gzip/brotli outside the cache layer, so ETags are computed on the identity body
+app.add_middleware(CompressionMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -39,6 +67,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request timings and in-flight count, outermost so they include every layer above
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(air_quality_router)
 app.include_router(users.router)
@@ -49,6 +81,13 @@ app.include_router(notifications.router)
 def health_check():
     return {"status": "ok", "message": "Air Pollution Monitoring API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics; rendered on the event loop so no request updates them mid-scrape"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/mongo-health")
 async def mongo_health_check():
     """Check MongoDB connection status"""
@@ -3,11 +3,16 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from enum import Enum
 from bson import ObjectId
+from pydantic_core import core_schema
 
 class PyObjectId(ObjectId):
     @classmethod
-    def __get_validators__(cls):
-        yield cls.validate
+    def __get_pydantic_core_schema__(cls, source_type, handler):
+        # Rendered as a string by pydantic-core itself, no json_encoders needed
+        return core_schema.no_info_plain_validator_function(
+            cls.validate,
+            serialization=core_schema.plain_serializer_function_ser_schema(str, when_used="json"),
+        )
 
     @classmethod
     def validate(cls, v):
@@ -16,9 +21,8 @@ class PyObjectId(ObjectId):
         return ObjectId(v)
 
     @classmethod
-    def __get_pydantic_json_schema__(cls, field_schema):
-        field_schema.update(type="string")
-        return field_schema
+    def __get_pydantic_json_schema__(cls, schema, handler):
+        return {"type": "string"}
 
 # User Models
 class UserBase(BaseModel):
@@ -40,7 +44,6 @@ class UserResponse(UserBase):
 
     class Config:
         validate_by_name = True
-        json_encoders = {ObjectId: str}
 
 # Location Models
 class LocationBase(BaseModel):
@@ -61,7 +64,6 @@ class LocationResponse(LocationBase):
 
     class Config:
         validate_by_name = True
-        json_encoders = {ObjectId: str}
 
 # Air Quality Models
 class AirQualityData(BaseModel):
@@ -81,7 +83,8 @@ class AirQualityData(BaseModel):
 
 class AirQualityHistory(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
-    location_id: PyObjectId
+    location_id: Optional[PyObjectId] = None
+    location_key: Optional[str] = None  # "lat,lng" rounded to 2 decimals
     location_name: str
     latitude: float
     longitude: float
@@ -90,7 +93,6 @@ class AirQualityHistory(BaseModel):
 
     class Config:
         validate_by_name = True
-        json_encoders = {ObjectId: str}
 
 # Notification Models
 class NotificationType(str, Enum):
@@ -123,7 +125,6 @@ class NotificationResponse(NotificationBase):
 
     class Config:
         validate_by_name = True
-        json_encoders = {ObjectId: str}
 
 # User Settings Models
 class UserSettings(BaseModel):
@@ -139,7 +140,6 @@ class UserSettings(BaseModel):
 
     class Config:
         validate_by_name = True
-        json_encoders = {ObjectId: str}
 
 # API Response Models
 class APIResponse(BaseModel):
@@ -12,10 +12,11 @@ from ..models import (
     NotificationCreate, NotificationResponse, APIResponse,
     NotificationType, NotificationPriority
 )
+from ..core.serialization import FastJSONRoute
 from ..auth import get_current_user
 from ..models import UserResponse
 
-router = APIRouter(prefix="/notifications", tags=["notifications"])
+router = APIRouter(prefix="/notifications", tags=["notifications"], route_class=FastJSONRoute)
 
 @router.post("/", response_model=NotificationResponse)
 async def create_notification(
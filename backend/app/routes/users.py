@@ -13,12 +13,13 @@ from ..models import (
     UserCreate, UserLogin, UserResponse, TokenResponse, 
     UserSettings, APIResponse
 )
+from ..core.serialization import FastJSONRoute
 from ..auth import (
     get_password_hash, authenticate_user, create_access_token,
     get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], route_class=FastJSONRoute)
 
 @router.post("/register", response_model=TokenResponse)
 async def register_user(user_data: UserCreate):
@@ -0,0 +1,300 @@
+import asyncio
+import datetime
+import os
+import time
+import warnings
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import history, ingestion
+from .history import hourly_history, location_key
+from .synthetic import current_hour, synthetic_hourly_aqi
+
+# Forecast model settings
+FORECAST_SEASON_HOURS = int(os.getenv("FORECAST_SEASON_HOURS", "24"))
+FORECAST_HORIZON_HOURS = int(os.getenv("FORECAST_HORIZON_HOURS", "24"))
+FORECAST_HISTORY_HOURS = int(os.getenv("FORECAST_HISTORY_HOURS", "336"))
+FORECAST_MIN_HOURS = int(os.getenv("FORECAST_MIN_HOURS", "48"))
+FORECAST_MAX_AGE = float(os.getenv("FORECAST_MAX_AGE", "3600"))
+FORECAST_CACHE_SIZE = int(os.getenv("FORECAST_CACHE_SIZE", "5000"))
+
+# Smoothing parameters tried for every station: level, trend, season
+ALPHAS = (0.1, 0.3, 0.5, 0.8)
+BETAS = (0.0, 0.01, 0.05)
+GAMMAS = (0.05, 0.15, 0.3)
+# Two-sided 80% normal interval
+BAND_Z = 1.2816
+
+def _param_grid(alphas=ALPHAS, betas=BETAS, gammas=GAMMAS) -> np.ndarray:
+    return np.array([(a, b, g) for a in alphas for b in betas for g in gammas], dtype=np.float64)
+
+def holt_winters_forecast(
+    series: np.ndarray,
+    horizon: int = FORECAST_HORIZON_HOURS,
+    season: int = FORECAST_SEASON_HOURS,
+    grid: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Fit additive Holt-Winters to every row of `series` and forecast `horizon` steps.
+
+    `series` is (stations, hours) with NaN for missing hours. All stations
+    and all grid parameter sets run together as one (stations, params)
+    array per time step; each station keeps the parameters with the lowest
+    one-step-ahead squared error. Returns the forecasts, the half-width of
+    an 80% band around them, and the chosen (alpha, beta, gamma) per station.
+    """
+    y = np.atleast_2d(np.asarray(series, dtype=np.float64))
+    grid = _param_grid() if grid is None else np.asarray(grid, dtype=np.float64)
+    n_stations, n_hours = y.shape
+    alpha, beta, gamma = (grid[:, i][None, :] for i in range(3))
+
+    # Initial state from the hour-of-day profile and the first two seasons;
+    # sparse stations make some of these means empty, which is handled below
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean = np.nanmean(y, axis=1)
+        mean = np.where(np.isnan(mean), 0.0, mean)
+        padded = np.full((n_stations, -(-n_hours // season) * season), np.nan)
+        padded[:, :n_hours] = y
+        by_phase = padded.reshape(n_stations, -1, season)
+        profile = np.nanmean(by_phase, axis=1) - mean[:, None]
+        profile = np.where(np.isnan(profile), 0.0, profile)
+        first = np.nanmean(y[:, :season], axis=1)
+        second = np.nanmean(y[:, season:2 * season], axis=1) if n_hours >= 2 * season else first
+        first = np.where(np.isnan(first), mean, first)
+        second = np.where(np.isnan(second), first, second)
+
+    level = np.repeat(first[:, None], len(grid), axis=1)
+    trend = np.repeat(((second - first) / season)[:, None], len(grid), axis=1)
+    seasonal = np.repeat(profile[:, None, :], len(grid), axis=1)
+    sse = np.zeros_like(level)
+    observed = np.zeros_like(level)
+
+    for t in range(n_hours):
+        phase = t % season
+        s_t = seasonal[:, :, phase]
+        predicted = level + trend + s_t
+        value = y[:, t][:, None]
+        has_value = ~np.isnan(value)
+        if t >= season:
+            # The first season only warms up the state
+            error = np.where(has_value, value - predicted, 0.0)
+            sse += error * error
+            observed += has_value
+        # A missing hour is treated as if the model had predicted it exactly
+        value = np.where(has_value, value, predicted)
+        new_level = alpha * (value - s_t) + (1 - alpha) * (level + trend)
+        trend = beta * (new_level - level) + (1 - beta) * trend
+        seasonal[:, :, phase] = gamma * (value - new_level) + (1 - gamma) * s_t
+        level = new_level
+
+    mse = np.where(observed > 0, sse / np.maximum(observed, 1), np.inf)
+    best = np.argmin(mse, axis=1)
+    rows = np.arange(n_stations)
+    level, trend, seasonal = level[rows, best], trend[rows, best], seasonal[rows, best]
+    params = grid[best]
+    dof = np.maximum(observed[rows, best] - 3, 1)
+    sigma = np.sqrt(sse[rows, best] / dof)
+
+    steps = np.arange(1, horizon + 1)
+    phases = (n_hours + steps - 1) % season
+    forecast = level[:, None] + steps[None, :] * trend[:, None] + seasonal[:, phases]
+    # Forecast error variance grows with the level and trend updates still to come
+    growth = (params[:, 0:1] * (1 + (steps[None, :-1]) * params[:, 1:2])) ** 2
+    variance = np.concatenate([np.ones((n_stations, 1)), 1 + np.cumsum(growth, axis=1)], axis=1)
+    band = BAND_Z * sigma[:, None] * np.sqrt(variance)
+    return forecast, band, params
+
+def hours_to_matrix(series: Dict[str, Tuple[List[str], List[float]]], keys: Sequence[str], end_hour: np.datetime64, hours: int) -> np.ndarray:
+    """Align ("YYYY-MM-DDTHH", value) series into a (len(keys), hours) array ending at end_hour"""
+    matrix = np.full((len(keys), hours), np.nan)
+    start_hour = end_hour - np.timedelta64(hours - 1, "h")
+    for row, key in enumerate(keys):
+        labels, values = series.get(key, ((), ()))
+        if not labels:
+            continue
+        offsets = (np.array(labels, dtype="datetime64[h]") - start_hour).astype(np.int64)
+        keep = (offsets >= 0) & (offsets < hours)
+        matrix[row, offsets[keep]] = np.asarray(values, dtype=np.float64)[keep]
+    return matrix
+
+def _as_response(forecast: np.ndarray, band: np.ndarray, timestamp: Optional[str] = None) -> dict:
+    return {
+        "forecast": np.clip(np.rint(forecast), 0, 500).astype(int).tolist(),
+        # Half-width of the 80% prediction interval, in AQI points
+        "confidence": np.round(band, 1).tolist(),
+        "timestamp": timestamp or datetime.datetime.utcnow().isoformat(),
+    }
+
+class ForecastEngine:
+    """Holt-Winters AQI forecasts fitted in batch over stored hourly history"""
+
+    def __init__(
+        self,
+        horizon: int = FORECAST_HORIZON_HOURS,
+        season: int = FORECAST_SEASON_HOURS,
+        history_hours: int = FORECAST_HISTORY_HOURS,
+        min_hours: int = FORECAST_MIN_HOURS,
+        max_age: float = FORECAST_MAX_AGE,
+        max_entries: int = FORECAST_CACHE_SIZE,
+    ):
+        self.horizon = horizon
+        self.season = season
+        self.history_hours = history_hours
+        self.min_hours = min_hours
+        self.max_age = max_age
+        self.max_entries = max_entries
+        # location_key -> (fitted_at, forecast response)
+        self._forecasts: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        # location_key -> band half-widths of the last fit on recorded readings
+        self._bands: "OrderedDict[str, List[float]]" = OrderedDict()
+        # Per-step median band over the last batch refit, for locations without one of their own
+        self._typical_band: Optional[List[float]] = None
+        # location_key -> (hour, forecast fitted to that hour's synthetic week)
+        self._synthetic: "OrderedDict[str, Tuple[int, dict]]" = OrderedDict()
+        self._refit_task: Optional[asyncio.Task] = None
+        self.refits = 0
+        self.last_refit_stations = 0
+        self.last_refit_seconds: Optional[float] = None
+        self.on_demand_fits = 0
+        self.synthetic_fits = 0
+
+    def _store(self, key: str, response: dict):
+        self._forecasts[key] = (time.time(), response)
+        self._forecasts.move_to_end(key)
+        while len(self._forecasts) > self.max_entries:
+            self._forecasts.popitem(last=False)
+
+    def get(self, lat: float, lng: float) -> Optional[dict]:
+        entry = self._forecasts.get(location_key(lat, lng))
+        if entry is None or time.time() - entry[0] > self.max_age:
+            return None
+        return entry[1]
+
+    def fit(self, keys: Sequence[str], matrix: np.ndarray) -> Dict[str, dict]:
+        """Forecast responses for every row with enough observed hours"""
+        enough = np.count_nonzero(~np.isnan(matrix), axis=1) >= self.min_hours
+        if not enough.any():
+            return {}
+        forecast, band, _ = holt_winters_forecast(matrix[enough], self.horizon, self.season)
+        fitted = [key for key, ok in zip(keys, enough.tolist()) if ok]
+        return {key: _as_response(forecast[i], band[i]) for i, key in enumerate(fitted)}
+
+    def forecast_synthetic(self, lat: float, lng: float) -> dict:
+        """Forecast fitted to the location's synthetic week, refitted once an hour.
+
+        The input only changes on the hour and the timestamp is the hour, so
+        every worker returns the same body (and ETag) until the next one.
+        """
+        key = location_key(lat, lng)
+        hour = current_hour()
+        entry = self._synthetic.get(key)
+        if entry is None or entry[0] != hour:
+            values = synthetic_hourly_aqi(lat, lng, 7 * 24, end_hour=hour)
+            forecast, band, _ = holt_winters_forecast(values[None, :], self.horizon, self.season)
+            stamp = datetime.datetime.fromtimestamp(hour * 3600, datetime.timezone.utc).replace(tzinfo=None).isoformat()
+            entry = (hour, _as_response(forecast[0], band[0], timestamp=stamp))
+            self._synthetic[key] = entry
+            self.synthetic_fits += 1
+            while len(self._synthetic) > self.max_entries:
+                self._synthetic.popitem(last=False)
+        self._synthetic.move_to_end(key)
+        return entry[1]
+
+    async def _load_and_fit(self, keys: Sequence[str]) -> int:
+        series = await hourly_history(keys, self.history_hours)
+        end_hour = np.datetime64(datetime.datetime.utcnow(), "h")
+        matrix = hours_to_matrix(series, keys, end_hour, self.history_hours)
+        # Fit off the event loop, then publish the results from it
+        responses = await asyncio.to_thread(self.fit, keys, matrix)
+        for key, response in responses.items():
+            self._store(key, response)
+            self._bands[key] = response["confidence"]
+            self._bands.move_to_end(key)
+        while len(self._bands) > self.max_entries:
+            self._bands.popitem(last=False)
+        if len(responses) > 1:
+            bands = np.array([response["confidence"] for response in responses.values()])
+            self._typical_band = np.round(np.median(bands, axis=0), 1).tolist()
+        return len(responses)
+
+    async def refit(self, coordinates: Sequence[Tuple[float, float]]):
+        """Refit all the given locations in one batch"""
+        start = time.perf_counter()
+        keys = list(dict.fromkeys(location_key(lat, lng) for lat, lng in coordinates))
+        if history.history_writer is not None:
+            # Include the readings the last ingestion cycle is still buffering
+            await history.history_writer.flush()
+        self.last_refit_stations = await self._load_and_fit(keys)
+        self.last_refit_seconds = time.perf_counter() - start
+        self.refits += 1
+
+    def schedule_refit(self, coordinates: Sequence[Tuple[float, float]]):
+        """Start a background refit unless one is already running"""
+        if self._refit_task is not None and not self._refit_task.done():
+            return
+        self._refit_task = asyncio.create_task(self._safe_refit(coordinates))
+
+    async def _safe_refit(self, coordinates):
+        try:
+            await self.refit(coordinates)
+        except Exception as e:
+            print(f"Forecast refit failed: {e}")
+
+    async def forecast_from_history(self, lat: float, lng: float) -> Optional[dict]:
+        """Fit one location from its stored history; None if there is too little"""
+        key = location_key(lat, lng)
+        if await self._load_and_fit([key]):
+            self.on_demand_fits += 1
+            return self._forecasts[key][1]
+        return None
+
+    def confidence(self, lat: float, lng: float, steps: int) -> Optional[List[float]]:
+        """80% band half-widths for a forecast made elsewhere, such as OpenAQ's.
+
+        Uses the spread of the model's own errors on this location's recorded
+        readings, or the median over every refitted city when it has too few.
+        """
+        band = self._bands.get(location_key(lat, lng)) or self._typical_band
+        if not band:
+            return None
+        # Past the model's horizon the last step's band is the best guess
+        return (band + band[-1:] * steps)[:steps]
+
+    async def stop(self):
+        if self._refit_task is not None:
+            self._refit_task.cancel()
+            try:
+                await self._refit_task
+            except asyncio.CancelledError:
+                pass
+            self._refit_task = None
+
+    def stats(self) -> dict:
+        return {
+            "cached": len(self._forecasts),
+            "refits": self.refits,
+            "last_refit_stations": self.last_refit_stations,
+            "last_refit_seconds": round(self.last_refit_seconds, 3) if self.last_refit_seconds is not None else None,
+            "on_demand_fits": self.on_demand_fits,
+            "synthetic_fits": self.synthetic_fits,
+        }
+
+# Engine used by the /forecast endpoint
+forecast_engine = ForecastEngine()
+
+def start_forecasting(cities: List[dict]):
+    """Fit all cities now and again after every background ingestion cycle"""
+    coordinates = [(city["lat"], city["lng"]) for city in cities]
+    forecast_engine.schedule_refit(coordinates)
+    if ingestion.ingestion_scheduler is not None:
+        ingestion.ingestion_scheduler.on_cycle_complete.append(
+            lambda scheduler: forecast_engine.schedule_refit(coordinates)
+        )
+
+async def stop_forecasting():
+    await forecast_engine.stop()
+
+def forecast_stats() -> dict:
+    return forecast_engine.stats()
@@ -0,0 +1,392 @@
+import asyncio
+import datetime
+import os
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from ..database import USE_LOCAL_DB, get_local_db, get_air_quality_history_collection, timed_sqlite
+
+# Batched history write settings
+HISTORY_ENABLED = os.getenv("HISTORY_ENABLED", "true").lower() == "true"
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "5"))
+HISTORY_MAX_PENDING = int(os.getenv("HISTORY_MAX_PENDING", "50000"))
+# "columnar" stores history as per-station segment files instead of the database
+HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "database").lower()
+# Readings read from the store per chunk of a streamed export
+HISTORY_EXPORT_CHUNK_ROWS = int(os.getenv("HISTORY_EXPORT_CHUNK_ROWS", "1000"))
+
+POLLUTANT_FIELDS = ("aqi", "pm25", "pm10", "o3", "no2", "co", "so2")
+
+def location_key(lat: float, lng: float) -> str:
+    """History series key: coordinates rounded to ~1 km"""
+    return f"{lat:.2f},{lng:.2f}"
+
+def normalize_timestamp(value: Optional[str]) -> str:
+    """UTC ISO timestamp without offset, so stored values sort and compare as text"""
+    try:
+        parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    except (AttributeError, ValueError):
+        parsed = datetime.datetime.utcnow()
+    return parsed.isoformat(timespec="seconds")
+
+def history_row(lat: float, lng: float, reading: dict, name: Optional[str] = None) -> dict:
+    key = location_key(lat, lng)
+    row = {
+        "location_key": key,
+        "location_name": name or key,
+        "latitude": lat,
+        "longitude": lng,
+        "timestamp": normalize_timestamp(reading.get("timestamp")),
+    }
+    for field in POLLUTANT_FIELDS:
+        row[field] = reading.get(field)
+    return row
+
+class SQLiteHistoryBackend:
+    """air_quality_history in the local SQLite database"""
+
+    @timed_sqlite("history_insert")
+    def _insert(self, rows: List[dict]):
+        conn = get_local_db()
+        try:
+            conn.executemany(
+                '''INSERT OR IGNORE INTO air_quality_history
+                   (location_key, location_name, latitude, longitude, timestamp, aqi, pm25, pm10, o3, no2, co, so2)
+                   VALUES (:location_key, :location_name, :latitude, :longitude, :timestamp,
+                           :aqi, :pm25, :pm10, :o3, :no2, :co, :so2)''',
+                rows,
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    @timed_sqlite("history_daily")
+    def _daily(self, key: str, start: str, end: str) -> List[dict]:
+        conn = get_local_db()
+        try:
+            cursor = conn.execute(
+                '''SELECT substr(timestamp, 1, 10) AS day, AVG(aqi) AS aqi, AVG(pm25) AS pm25,
+                          AVG(pm10) AS pm10, AVG(o3) AS o3, AVG(no2) AS no2, COUNT(*) AS samples
+                   FROM air_quality_history
+                   WHERE location_key = ? AND timestamp >= ? AND timestamp < ?
+                   GROUP BY day ORDER BY day''',
+                (key, start, end),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    @timed_sqlite("history_hourly")
+    def _hourly(self, keys: Sequence[str], start: str, end: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        series: Dict[str, Tuple[List[str], List[float]]] = {}
+        conn = get_local_db()
+        try:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = list(keys[i:i + 500])
+                cursor = conn.execute(
+                    f'''SELECT location_key, substr(timestamp, 1, 13) AS hour, AVG(aqi) AS aqi
+                        FROM air_quality_history
+                        WHERE location_key IN ({",".join("?" * len(chunk))})
+                          AND timestamp >= ? AND timestamp < ? AND aqi IS NOT NULL
+                        GROUP BY location_key, hour ORDER BY location_key, hour''',
+                    (*chunk, start, end),
+                )
+                for key, hour, aqi in cursor.fetchall():
+                    hours, values = series.setdefault(key, ([], []))
+                    hours.append(hour)
+                    values.append(aqi)
+            return series
+        finally:
+            conn.close()
+
+    @timed_sqlite("history_rows")
+    def _rows_from(self, key: str, after: str, end: str, fields: Sequence[str], limit: int, inclusive: bool) -> List[tuple]:
+        conn = get_local_db()
+        try:
+            # Keyset pagination on the (location_key, timestamp) index: each chunk is one index range read
+            cursor = conn.execute(
+                f'''SELECT timestamp, {", ".join(fields)} FROM air_quality_history
+                    WHERE location_key = ? AND timestamp {">=" if inclusive else ">"} ? AND timestamp < ?
+                    ORDER BY timestamp LIMIT ?''',
+                (key, after, end, limit),
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    async def append_many(self, rows: List[dict]):
+        await asyncio.to_thread(self._insert, rows)
+
+    async def iter_rows(self, key: str, start: str, end: str, fields: Sequence[str], chunk_size: int) -> AsyncIterator[List[tuple]]:
+        """(timestamp, *fields) readings of one location in [start, end), chunk_size at a time"""
+        after, inclusive = start, True
+        while True:
+            rows = await asyncio.to_thread(self._rows_from, key, after, end, fields, chunk_size, inclusive)
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            after, inclusive = rows[-1][0], False
+
+    async def daily_summary(self, key: str, start: str, end: str) -> List[dict]:
+        return await asyncio.to_thread(self._daily, key, start, end)
+
+    async def hourly_aqi(self, keys: Sequence[str], start: str, end: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        return await asyncio.to_thread(self._hourly, keys, start, end)
+
+class MongoHistoryBackend:
+    """air_quality_history collection in MongoDB"""
+
+    async def ensure_indexes(self):
+        collection = get_air_quality_history_collection()
+        await collection.create_index(
+            [("location_key", 1), ("data.timestamp", 1)], unique=True, name="location_time"
+        )
+
+    async def append_many(self, rows: List[dict]):
+        from pymongo.errors import BulkWriteError
+
+        now = datetime.datetime.utcnow()
+        docs = [
+            {
+                "location_key": row["location_key"],
+                "location_name": row["location_name"],
+                "latitude": row["latitude"],
+                "longitude": row["longitude"],
+                "data": {
+                    "timestamp": datetime.datetime.fromisoformat(row["timestamp"]),
+                    **{field: row[field] for field in POLLUTANT_FIELDS},
+                },
+                "created_at": now,
+            }
+            for row in rows
+        ]
+        try:
+            await get_air_quality_history_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Duplicate (location, timestamp) readings are expected and skipped
+            if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+                raise
+
+    async def daily_summary(self, key: str, start: str, end: str) -> List[dict]:
+        pipeline = [
+            {"$match": {
+                "location_key": key,
+                "data.timestamp": {
+                    "$gte": datetime.datetime.fromisoformat(start),
+                    "$lt": datetime.datetime.fromisoformat(end),
+                },
+            }},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$data.timestamp"}},
+                "aqi": {"$avg": "$data.aqi"},
+                "pm25": {"$avg": "$data.pm25"},
+                "pm10": {"$avg": "$data.pm10"},
+                "o3": {"$avg": "$data.o3"},
+                "no2": {"$avg": "$data.no2"},
+                "samples": {"$sum": 1},
+            }},
+            {"$sort": {"_id": 1}},
+        ]
+        results = await get_air_quality_history_collection().aggregate(pipeline).to_list(length=None)
+        return [{"day": doc.pop("_id"), **doc} for doc in results]
+
+    async def hourly_aqi(self, keys: Sequence[str], start: str, end: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        pipeline = [
+            {"$match": {
+                "location_key": {"$in": list(keys)},
+                "data.timestamp": {
+                    "$gte": datetime.datetime.fromisoformat(start),
+                    "$lt": datetime.datetime.fromisoformat(end),
+                },
+                "data.aqi": {"$ne": None},
+            }},
+            {"$group": {
+                "_id": {
+                    "key": "$location_key",
+                    "hour": {"$dateToString": {"format": "%Y-%m-%dT%H", "date": "$data.timestamp"}},
+                },
+                "aqi": {"$avg": "$data.aqi"},
+            }},
+            {"$sort": {"_id.key": 1, "_id.hour": 1}},
+        ]
+        series: Dict[str, Tuple[List[str], List[float]]] = {}
+        async for doc in get_air_quality_history_collection().aggregate(pipeline):
+            hours, values = series.setdefault(doc["_id"]["key"], ([], []))
+            hours.append(doc["_id"]["hour"])
+            values.append(doc["aqi"])
+        return series
+
+    async def iter_rows(self, key: str, start: str, end: str, fields: Sequence[str], chunk_size: int) -> AsyncIterator[List[tuple]]:
+        cursor = get_air_quality_history_collection().find(
+            {
+                "location_key": key,
+                "data.timestamp": {
+                    "$gte": datetime.datetime.fromisoformat(start),
+                    "$lt": datetime.datetime.fromisoformat(end),
+                },
+            },
+            projection={"_id": 0, "data.timestamp": 1, **{f"data.{field}": 1 for field in fields}},
+        ).sort("data.timestamp", 1).batch_size(chunk_size)
+        rows = []
+        async for doc in cursor:
+            data = doc["data"]
+            rows.append((data["timestamp"].isoformat(timespec="seconds"), *(data.get(field) for field in fields)))
+            if len(rows) >= chunk_size:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+class HistoryWriter:
+    """Buffer readings in memory and write them to the history store in batches"""
+
+    def __init__(
+        self,
+        backend,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        max_pending: int = HISTORY_MAX_PENDING,
+    ):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: List[dict] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+
+    def record(self, row: dict):
+        """Queue a row without blocking the caller"""
+        self._pending.append(row)
+        if len(self._pending) > self.max_pending:
+            # Storage is falling behind: keep the newest readings
+            overflow = len(self._pending) - self.max_pending
+            del self._pending[:overflow]
+            self.dropped += overflow
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                try:
+                    await self.backend.append_many(batch)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.failed_batches += 1
+                    self.dropped += len(batch)
+                    print(f"History write failed ({len(batch)} rows): {e}")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+        }
+
+def create_history_backend():
+    """History backend for the configured storage"""
+    if HISTORY_BACKEND == "columnar":
+        from .history_segments import ColumnarHistoryBackend
+        return ColumnarHistoryBackend()
+    if USE_LOCAL_DB:
+        return SQLiteHistoryBackend()
+    return MongoHistoryBackend()
+
+# Store and writer used by the air-quality endpoints
+history_backend = None
+history_writer: Optional[HistoryWriter] = None
+
+async def start_history():
+    global history_backend, history_writer
+    history_backend = create_history_backend()
+    if isinstance(history_backend, MongoHistoryBackend):
+        try:
+            await history_backend.ensure_indexes()
+        except Exception as e:
+            print(f"⚠️ Could not create history indexes: {e}")
+    if HISTORY_ENABLED:
+        history_writer = HistoryWriter(history_backend)
+        history_writer.start()
+
+async def stop_history():
+    global history_writer
+    if history_writer is not None:
+        await history_writer.stop()
+        history_writer = None
+    if hasattr(history_backend, "close"):
+        # Unmap the columnar segments; their tails are already in the tail logs
+        await asyncio.to_thread(history_backend.close)
+
+def record_reading(lat: float, lng: float, reading: dict, name: Optional[str] = None):
+    """Append a fetched reading to history; a no-op until the writer is started"""
+    if history_writer is not None and reading:
+        history_writer.record(history_row(lat, lng, reading, name))
+
+async def daily_history(lat: float, lng: float, days: int) -> List[dict]:
+    """Per-day averages for the last `days` days, oldest first"""
+    if history_backend is None:
+        return []
+    today = datetime.datetime.utcnow().date()
+    start = (today - datetime.timedelta(days=days - 1)).isoformat()
+    end = (today + datetime.timedelta(days=1)).isoformat()
+    return await history_backend.daily_summary(location_key(lat, lng), start, end)
+
+async def hourly_history(keys: Sequence[str], hours: int) -> Dict[str, Tuple[List[str], List[float]]]:
+    """Per-hour mean AQI ("YYYY-MM-DDTHH", value) for each key over the last `hours` hours"""
+    if history_backend is None or not keys:
+        return {}
+    now = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    start = (now - datetime.timedelta(hours=hours - 1)).isoformat()
+    end = (now + datetime.timedelta(hours=1)).isoformat()
+    return await history_backend.hourly_aqi(keys, start, end)
+
+async def export_history(keys: Sequence[str], days: int, fields: Sequence[str], chunk_size: int = HISTORY_EXPORT_CHUNK_ROWS) -> AsyncIterator[Tuple[str, List[tuple]]]:
+    """(key, rows) chunks of the raw readings of each key over the last `days` days, oldest first"""
+    if history_backend is None:
+        return
+    today = datetime.datetime.utcnow().date()
+    start = (today - datetime.timedelta(days=days - 1)).isoformat()
+    end = (today + datetime.timedelta(days=1)).isoformat()
+    for key in keys:
+        async for rows in history_backend.iter_rows(key, start, end, fields, chunk_size):
+            yield key, rows
+
+def history_stats() -> Optional[dict]:
+    if history_writer is None:
+        return None
+    return history_writer.stats()
@@ -0,0 +1,48 @@
+import csv
+import io
+import os
+from typing import AsyncIterator, Dict, Sequence
+
+from ..core.serialization import dumps
+from .history import export_history
+
+# Limits of one /air-quality/historical/export request
+HISTORY_EXPORT_MAX_DAYS = int(os.getenv("HISTORY_EXPORT_MAX_DAYS", "3650"))
+HISTORY_EXPORT_MAX_LOCATIONS = int(os.getenv("HISTORY_EXPORT_MAX_LOCATIONS", "100"))
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+_export_totals = {"exports": 0, "rows": 0, "bytes": 0}
+
+def encode_ndjson(label: str, rows, fields: Sequence[str]) -> bytes:
+    return b"".join(
+        dumps({"location": label, "timestamp": row[0], **dict(zip(fields, row[1:]))}) + b"\n"
+        for row in rows
+    )
+
+def encode_csv(label: str, rows, fields: Sequence[str]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerows((label, *row) for row in rows)
+    return buffer.getvalue().encode()
+
+async def stream_history_export(labels: Dict[str, str], days: int, fields: Sequence[str], export_format: str) -> AsyncIterator[bytes]:
+    """Encoded export body, one chunk of store rows at a time.
+
+    `labels` maps history keys to the name written in the location column.
+    Memory use follows the chunk size, not the number of days or locations.
+    """
+    _export_totals["exports"] += 1
+    encode = encode_csv if export_format == "csv" else encode_ndjson
+    if export_format == "csv":
+        header = ",".join(("location", "timestamp", *fields)).encode() + b"\n"
+        _export_totals["bytes"] += len(header)
+        yield header
+    async for key, rows in export_history(list(labels), days, fields):
+        body = encode(labels[key], rows, fields)
+        _export_totals["rows"] += len(rows)
+        _export_totals["bytes"] += len(body)
+        yield body
+
+def export_stats() -> dict:
+    return dict(_export_totals)
@@ -0,0 +1,464 @@
+import asyncio
+import datetime
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..core.paths import data_path
+from .history import POLLUTANT_FIELDS
+
+HISTORY_SEGMENT_DIR = os.getenv("HISTORY_SEGMENT_DIR", data_path("history_segments"))
+SEGMENT_ROWS = int(os.getenv("HISTORY_SEGMENT_ROWS", "4096"))
+# Locations whose segments stay memory-mapped; each segment holds a map and a file descriptor
+HISTORY_OPEN_LOCATIONS = int(os.getenv("HISTORY_OPEN_LOCATIONS", "256"))
+
+MAGIC = b"AQHS"
+FORMAT_VERSION = 1
+# magic, version, dod width, column count, rows, t0, first delta, t_min, t_max
+HEADER = struct.Struct("<4sHBBIqqqq")
+HEADER_SIZE = 64
+DOD_DTYPES = {1: "<i1", 2: "<i2", 4: "<i4", 8: "<i8"}
+VALUE_DTYPE = np.dtype("<f4")
+# One fixed-size record per unsealed reading in a location's tail log
+TAIL_DTYPE = np.dtype([("ts", "<i8")] + [(field, VALUE_DTYPE) for field in POLLUTANT_FIELDS])
+TAIL_LOG = "tail.log"
+
+def _epoch(iso: str) -> int:
+    return int(datetime.datetime.fromisoformat(iso).replace(tzinfo=datetime.timezone.utc).timestamp())
+
+def encode_segment(timestamps: np.ndarray, columns: Dict[str, np.ndarray]) -> bytes:
+    """Serialize sorted epoch timestamps and their value columns as one segment"""
+    count = len(timestamps)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    deltas = np.diff(timestamps)
+    first_delta = int(deltas[0]) if count > 1 else 0
+    dod = np.zeros(count, dtype=np.int64)
+    if count > 2:
+        dod[2:] = np.diff(deltas)
+    width = 8
+    for candidate in (1, 2, 4):
+        info = np.iinfo(DOD_DTYPES[candidate])
+        if count == 0 or (dod.min() >= info.min and dod.max() <= info.max):
+            width = candidate
+            break
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, width, len(POLLUTANT_FIELDS), count,
+        int(timestamps[0]) if count else 0, first_delta,
+        int(timestamps[0]) if count else 0, int(timestamps[-1]) if count else 0,
+    )
+    dod_bytes = dod.astype(DOD_DTYPES[width]).tobytes()
+    padding = (-(HEADER_SIZE + len(dod_bytes))) % 8
+    parts = [header.ljust(HEADER_SIZE, b"\0"), dod_bytes, b"\0" * padding]
+    for field in POLLUTANT_FIELDS:
+        parts.append(np.asarray(columns[field], dtype=VALUE_DTYPE).tobytes())
+    return b"".join(parts)
+
+class Segment:
+    """A memory-mapped segment file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, width, n_cols, count, t0, first_delta, t_min, t_max = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or n_cols != len(POLLUTANT_FIELDS):
+            self._mmap.close()
+            raise ValueError(f"Not a history segment: {path}")
+        self.count = count
+        self.t0 = t0
+        self.first_delta = first_delta
+        self.t_min = t_min
+        self.t_max = t_max
+        self._dod = np.frombuffer(self._mmap, dtype=DOD_DTYPES[width], count=count, offset=HEADER_SIZE)
+        offset = HEADER_SIZE + count * width
+        offset += (-offset) % 8
+        self.columns = {}
+        for field in POLLUTANT_FIELDS:
+            self.columns[field] = np.frombuffer(self._mmap, dtype=VALUE_DTYPE, count=count, offset=offset)
+            offset += count * VALUE_DTYPE.itemsize
+        self._timestamps: Optional[np.ndarray] = None
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        if self._timestamps is None:
+            ts = np.empty(self.count, dtype=np.int64)
+            if self.count:
+                deltas = self.first_delta + np.cumsum(self._dod[1:], dtype=np.int64)
+                ts[0] = self.t0
+                ts[1:] = self.t0 + np.cumsum(deltas)
+            self._timestamps = ts
+        return self._timestamps
+
+    def close(self):
+        self.columns = {}
+        self._dod = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a view; the map is released when it is dropped
+            pass
+
+class ColumnarHistoryBackend:
+    """Columnar history, one directory of segment files per location.
+
+    A segment holds up to segment_rows readings as a 64-byte header, the
+    timestamps as delta-of-deltas in the narrowest integer width that fits
+    (one byte per reading for hourly data) and one float32 column per
+    pollutant. Segments are read through mmap, so range scans slice NumPy
+    views over the page cache instead of copying rows. New readings wait in
+    an in-memory tail until it fills a segment; each is also appended to the
+    location's tail log, which is replayed when the location is next opened,
+    so a crash or restart loses nothing and never seals a short segment.
+    A reading older than the newest sealed one is merged into the segment
+    covering its time, which is rewritten; only a repeated timestamp for
+    the same location is dropped, as with the other backends.
+    Adjacent short segments left by seal_all are merged when a location is
+    opened, and only the most recently used locations stay mapped.
+    """
+
+    def __init__(
+        self,
+        root: str = HISTORY_SEGMENT_DIR,
+        segment_rows: int = SEGMENT_ROWS,
+        open_locations: int = HISTORY_OPEN_LOCATIONS,
+    ):
+        self.root = root
+        self.segment_rows = segment_rows
+        self.open_locations = open_locations
+        os.makedirs(root, exist_ok=True)
+        self._lock = threading.RLock()
+        # location_key -> rows not yet sealed into a segment
+        self._tails: Dict[str, List[dict]] = {}
+        # location_key -> mapped segments, least recently used first
+        self._segments: "OrderedDict[str, List[Segment]]" = OrderedDict()
+        # location_key -> newest timestamp in a segment; later readings go to the tail
+        self._sealed_ts: Dict[str, int] = {}
+        self.compactions = 0
+
+    def _dir(self, key: str) -> str:
+        return os.path.join(self.root, key.replace(",", "_"))
+
+    def _load_segments(self, key: str) -> List[Segment]:
+        segments = self._segments.get(key)
+        if segments is not None:
+            self._segments.move_to_end(key)
+            return segments
+        segments = self._open_segments(key)
+        self._segments[key] = segments
+        if segments:
+            self._sealed_ts[key] = segments[-1].t_max
+        if key not in self._tails:
+            self._tails[key] = self._replay_tail(key)
+        while len(self._segments) > max(1, self.open_locations):
+            _, evicted = self._segments.popitem(last=False)
+            for segment in evicted:
+                segment.close()
+        return segments
+
+    def _open_segments(self, key: str) -> List[Segment]:
+        segments: List[Segment] = []
+        directory = self._dir(key)
+        if not os.path.isdir(directory):
+            return segments
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.endswith(".seg"):
+                segment = Segment(path)
+                # Left behind by an interrupted compaction: its rows are in the merged segment before it
+                if segments and segment.t_max <= segments[-1].t_max:
+                    segment.close()
+                    os.remove(path)
+                    continue
+                segments.append(segment)
+        try:
+            self._compact(segments)
+        except OSError as e:
+            print(f"⚠️ Could not compact history segments in {directory}: {e}")
+        return segments
+
+    def _compact(self, segments: List[Segment]):
+        """Merge runs of adjacent short segments, in place, into segments of at most segment_rows"""
+        i = 0
+        while i < len(segments):
+            group = [segments[i]]
+            total = segments[i].count
+            while (
+                i + len(group) < len(segments)
+                and total < self.segment_rows
+                and total + segments[i + len(group)].count <= self.segment_rows
+            ):
+                group.append(segments[i + len(group)])
+                total += group[-1].count
+            if len(group) < 2:
+                i += 1
+                continue
+            timestamps = np.concatenate([segment.timestamps for segment in group])
+            columns = {
+                field: np.concatenate([segment.columns[field] for segment in group]) for field in POLLUTANT_FIELDS
+            }
+            # The merged file replaces the group's first one atomically; the rest are then redundant
+            path = group[0].path
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encode_segment(timestamps, columns))
+            for segment in group:
+                segment.close()
+            os.replace(tmp_path, path)
+            for segment in group[1:]:
+                os.remove(segment.path)
+            segments[i:i + len(group)] = [Segment(path)]
+            self.compactions += 1
+            i += 1
+
+    def _tail_path(self, key: str) -> str:
+        return os.path.join(self._dir(key), TAIL_LOG)
+
+    def _replay_tail(self, key: str) -> List[dict]:
+        """Unsealed rows from the tail log, oldest first, skipping any already sealed and a torn last record"""
+        try:
+            with open(self._tail_path(key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        records = np.frombuffer(data, dtype=TAIL_DTYPE, count=len(data) // TAIL_DTYPE.itemsize)
+        sealed_ts = self._sealed_ts.get(key, -1)
+        rows: List[dict] = []
+        # Records are in arrival order; the first one logged for a timestamp wins, as in _append
+        for record in records.tolist():
+            if record[0] > sealed_ts:
+                self._insert_tail(rows, {
+                    "ts": record[0],
+                    **{field: None if value != value else value for field, value in zip(POLLUTANT_FIELDS, record[1:])},
+                })
+        return rows
+
+    @staticmethod
+    def _insert_tail(tail: List[dict], entry: dict) -> bool:
+        """Insert entry into a tail kept sorted by timestamp; False if that timestamp is already there"""
+        if not tail or entry["ts"] > tail[-1]["ts"]:
+            tail.append(entry)
+            return True
+        stamps = [row["ts"] for row in tail]
+        i = bisect_left(stamps, entry["ts"])
+        if stamps[i] == entry["ts"]:
+            return False
+        tail.insert(i, entry)
+        return True
+
+    def _log_tail(self, key: str, rows: List[dict]):
+        records = np.zeros(len(rows), dtype=TAIL_DTYPE)
+        records["ts"] = [row["ts"] for row in rows]
+        for field in POLLUTANT_FIELDS:
+            records[field] = [np.nan if row[field] is None else row[field] for row in rows]
+        os.makedirs(self._dir(key), exist_ok=True)
+        with open(self._tail_path(key), "ab") as f:
+            f.write(records.tobytes())
+
+    def _seal(self, key: str, rows: List[dict]):
+        timestamps = np.array([row["ts"] for row in rows], dtype=np.int64)
+        columns = {
+            field: np.array([np.nan if row[field] is None else row[field] for row in rows], dtype=np.float64)
+            for field in POLLUTANT_FIELDS
+        }
+        directory = self._dir(key)
+        os.makedirs(directory, exist_ok=True)
+        segments = self._load_segments(key)
+        path = os.path.join(directory, f"{int(timestamps[0]):012d}-{len(segments):06d}.seg")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encode_segment(timestamps, columns))
+        os.replace(tmp_path, path)
+        segments.append(Segment(path))
+        self._sealed_ts[key] = int(timestamps[-1])
+        # Every logged row is now in the segment
+        try:
+            os.remove(self._tail_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _rewrite(self, key: str, entries: List[dict]):
+        """Merge readings older than the newest sealed one into the segments covering them"""
+        segments = self._load_segments(key)
+        starts = [segment.t_min for segment in segments]
+        groups: Dict[int, Dict[int, dict]] = {}
+        for entry in entries:
+            # The segment whose range it falls in, or else the one before the gap; the first wins a tie
+            i = max(bisect_right(starts, entry["ts"]) - 1, 0)
+            groups.setdefault(i, {}).setdefault(entry["ts"], entry)
+        for i, late in groups.items():
+            segment = segments[i]
+            late_ts = np.array(sorted(late), dtype=np.int64)
+            late_ts = late_ts[~np.isin(late_ts, segment.timestamps)]
+            if not len(late_ts):
+                continue
+            timestamps = np.concatenate([segment.timestamps, late_ts])
+            order = np.argsort(timestamps, kind="stable")
+            columns = {
+                field: np.concatenate([
+                    segment.columns[field].astype(np.float64),
+                    np.array([np.nan if late[ts][field] is None else late[ts][field] for ts in late_ts.tolist()], dtype=np.float64),
+                ])[order]
+                for field in POLLUTANT_FIELDS
+            }
+            tmp_path = f"{segment.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(encode_segment(timestamps[order], columns))
+            segment.close()
+            os.replace(tmp_path, segment.path)
+            segments[i] = Segment(segment.path)
+
+    def _append(self, rows: List[dict]):
+        with self._lock:
+            # location_key -> rows appended to the tail but not yet logged
+            unlogged: Dict[str, List[dict]] = {}
+            # location_key -> rows older than the newest sealed reading
+            late: Dict[str, List[dict]] = {}
+            for row in sorted(rows, key=lambda r: r["timestamp"]):
+                key = row["location_key"]
+                self._load_segments(key)
+                entry = {"ts": _epoch(row["timestamp"]), **{field: row.get(field) for field in POLLUTANT_FIELDS}}
+                if entry["ts"] <= self._sealed_ts.get(key, -1):
+                    late.setdefault(key, []).append(entry)
+                    continue
+                tail = self._tails.setdefault(key, [])
+                # Only a repeated (location, timestamp) is dropped, like the unique index of the other backends
+                if not self._insert_tail(tail, entry):
+                    continue
+                unlogged.setdefault(key, []).append(entry)
+                if len(tail) >= self.segment_rows:
+                    self._seal(key, tail)
+                    self._tails[key] = []
+                    unlogged[key] = []
+            for key, entries in unlogged.items():
+                if entries:
+                    self._log_tail(key, entries)
+            for key, entries in late.items():
+                self._rewrite(key, entries)
+
+    def scan(self, key: str, start: str, end: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """Timestamps and value columns for [start, end), oldest first.
+
+        Columns from a single segment are views over the mapped file; they
+        are only copied when several segments or the tail are combined.
+        """
+        with self._lock:
+            return self._scan(key, _epoch(start), _epoch(end))
+
+    def _slices(self, key: str, t_start: int, t_end: int):
+        """(timestamps, columns) of each segment overlapping [t_start, t_end), then of the tail"""
+        for segment in self._load_segments(key):
+            if segment.t_max < t_start or segment.t_min >= t_end:
+                continue
+            ts = segment.timestamps
+            lo, hi = np.searchsorted(ts, [t_start, t_end], side="left")
+            if hi > lo:
+                yield ts[lo:hi], {field: segment.columns[field][lo:hi] for field in POLLUTANT_FIELDS}
+        tail = [row for row in self._tails.get(key, ()) if t_start <= row["ts"] < t_end]
+        if tail:
+            yield np.array([row["ts"] for row in tail], dtype=np.int64), {
+                field: np.array([np.nan if row[field] is None else row[field] for row in tail], dtype=VALUE_DTYPE)
+                for field in POLLUTANT_FIELDS
+            }
+
+    def _scan(self, key: str, t_start: int, t_end: int):
+        slices = list(self._slices(key, t_start, t_end))
+        if not slices:
+            return np.empty(0, dtype=np.int64), {field: np.empty(0, dtype=VALUE_DTYPE) for field in POLLUTANT_FIELDS}
+        if len(slices) == 1:
+            return slices[0]
+        return (
+            np.concatenate([ts for ts, _ in slices]),
+            {field: np.concatenate([columns[field] for _, columns in slices]) for field in POLLUTANT_FIELDS},
+        )
+
+    def _daily(self, key: str, start: str, end: str) -> List[dict]:
+        ts, columns = self.scan(key, start, end)
+        if not len(ts):
+            return []
+        days = ts // 86400
+        # ts is sorted, so each day is one contiguous run
+        day_values, starts = np.unique(days, return_index=True)
+        summary = {}
+        for field in ("aqi", "pm25", "pm10", "o3", "no2"):
+            values = columns[field].astype(np.float64)
+            present = ~np.isnan(values)
+            sums = np.add.reduceat(np.where(present, values, 0.0), starts)
+            counts = np.add.reduceat(present.astype(np.int64), starts)
+            summary[field] = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        samples = np.diff(np.append(starts, len(ts))).tolist()
+        labels = np.datetime_as_string(day_values.astype("datetime64[D]")).tolist()
+        values = {field: [None if np.isnan(v) else v for v in column.tolist()] for field, column in summary.items()}
+        return [
+            {"day": label, **{field: values[field][i] for field in values}, "samples": samples[i]}
+            for i, label in enumerate(labels)
+        ]
+
+    def _hourly(self, keys: Sequence[str], start: str, end: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        series = {}
+        for key in keys:
+            ts, columns = self.scan(key, start, end)
+            present = ~np.isnan(columns["aqi"])
+            ts, aqi = ts[present], columns["aqi"][present].astype(np.float64)
+            if not len(ts):
+                continue
+            hour_values, starts = np.unique(ts // 3600, return_index=True)
+            means = np.add.reduceat(aqi, starts) / np.diff(np.append(starts, len(ts)))
+            labels = np.datetime_as_string(hour_values.astype("datetime64[h]")).tolist()
+            series[key] = (labels, means.tolist())
+        return series
+
+    def seal_all(self):
+        """Write every buffered tail as a (possibly short) segment"""
+        with self._lock:
+            for key, tail in self._tails.items():
+                if tail:
+                    self._seal(key, tail)
+                    self._tails[key] = []
+
+    def close(self):
+        """Unmap every segment; unsealed tails stay in their logs for the next start"""
+        with self._lock:
+            for segments in self._segments.values():
+                for segment in segments:
+                    segment.close()
+            self._segments = OrderedDict()
+
+    async def append_many(self, rows: List[dict]):
+        await asyncio.to_thread(self._append, rows)
+
+    async def daily_summary(self, key: str, start: str, end: str) -> List[dict]:
+        return await asyncio.to_thread(self._daily, key, start, end)
+
+    async def hourly_aqi(self, keys: Sequence[str], start: str, end: str) -> Dict[str, Tuple[List[str], List[float]]]:
+        return await asyncio.to_thread(self._hourly, keys, start, end)
+
+    async def iter_rows(self, key: str, start: str, end: str, fields: Sequence[str], chunk_size: int) -> AsyncIterator[List[tuple]]:
+        """(timestamp, *fields) readings in [start, end), converted to rows one chunk at a time"""
+        with self._lock:
+            # Views over the mapped segments; nothing is copied until a chunk is converted
+            slices = list(self._slices(key, _epoch(start), _epoch(end)))
+        for ts, columns in slices:
+            for lo in range(0, len(ts), chunk_size):
+                stamps = np.datetime_as_string(ts[lo:lo + chunk_size].astype("datetime64[s]")).tolist()
+                # Rounded so float32 storage noise does not leak into the export
+                values = [
+                    [None if np.isnan(v) else v for v in columns[field][lo:lo + chunk_size].astype(np.float64).round(3).tolist()]
+                    for field in fields
+                ]
+                yield list(zip(stamps, *values))
+                # Let other requests run between chunks
+                await asyncio.sleep(0)
+
+    def disk_bytes(self) -> int:
+        total = 0
+        for directory, _, files in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(directory, name)) for name in files)
+        return total
@@ -0,0 +1,223 @@
+import asyncio
+import math
+import os
+import random
+import time
+from typing import Awaitable, Callable, List, Optional
+
+from .openaq_client import OPENAQ_TIMEOUT
+from .quota import BACKGROUND, OPENAQ_RATE_PER_MINUTE, QuotaScheduler, openaq_quota, priority
+from .snapshot import ReadingSnapshot, reading_snapshot, snapshot_key
+
+# Background ingestion settings
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "true").lower() == "true"
+INGEST_INTERVAL_SECONDS = float(os.getenv("INGEST_INTERVAL_SECONDS", "900"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "8"))
+INGEST_JITTER_SECONDS = float(os.getenv("INGEST_JITTER_SECONDS", "2"))
+# Call starts are paced at the OpenAQ quota's sustained rate unless set
+INGEST_RATE_PER_SECOND = float(os.getenv("INGEST_RATE_PER_SECOND", str(OPENAQ_RATE_PER_MINUTE / 60)))
+# Startup wait for the first cycle; unset derives it from the rate budget, up to INGEST_PREWARM_MAX_WAIT
+INGEST_PREWARM_TIMEOUT = float(os.getenv("INGEST_PREWARM_TIMEOUT")) if os.getenv("INGEST_PREWARM_TIMEOUT") else None
+INGEST_PREWARM_MAX_WAIT = float(os.getenv("INGEST_PREWARM_MAX_WAIT", "30"))
+# Snapshot entries older than this are not served by /current
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", str(2 * INGEST_INTERVAL_SECONDS)))
+
+class RateBudget:
+    """Space out call starts so a cycle never exceeds `rate` upstream calls per second"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class IngestionScheduler:
+    """Periodically refresh readings for a fixed list of cities into a snapshot"""
+
+    def __init__(
+        self,
+        cities: List[dict],
+        fetch: Callable[[float, float], Awaitable[Optional[dict]]],
+        snapshot: ReadingSnapshot = reading_snapshot,
+        interval: float = INGEST_INTERVAL_SECONDS,
+        workers: int = INGEST_WORKERS,
+        jitter: float = INGEST_JITTER_SECONDS,
+        rate: float = INGEST_RATE_PER_SECOND,
+        quota: QuotaScheduler = openaq_quota,
+    ):
+        self.cities = cities
+        self.keys = {snapshot_key(city["lat"], city["lng"]) for city in cities}
+        self.fetch = fetch
+        self.snapshot = snapshot
+        self.interval = interval
+        self.workers = workers
+        self.jitter = jitter
+        self.budget = RateBudget(rate)
+        self.quota = quota
+        self._random = random.Random()
+        self._task: Optional[asyncio.Task] = None
+        self._first_cycle = asyncio.Event()
+        self.on_cycle_complete: List[Callable[["IngestionScheduler"], None]] = []
+
+        self.cycles = 0
+        self.failures_total = 0
+        self.last_cycle_started: Optional[float] = None
+        self.last_cycle_finished: Optional[float] = None
+        self.last_cycle_duration: Optional[float] = None
+        self.last_cycle_updated = 0
+        self.last_cycle_failures = 0
+        self.last_cycle_no_data = 0
+
+    async def _refresh_city(self, city: dict):
+        if self.jitter:
+            await asyncio.sleep(self._random.uniform(0, self.jitter))
+        await self.budget.acquire()
+        try:
+            # Refreshes leave the reserved share of the OpenAQ quota to user requests
+            with priority(BACKGROUND):
+                reading = await self.fetch(city["lat"], city["lng"])
+        except Exception as e:
+            self.last_cycle_failures += 1
+            self.failures_total += 1
+            print(f"Ingestion error for {city['name']}: {e}")
+            return
+        if reading:
+            self.snapshot.put(city["lat"], city["lng"], reading)
+            self.last_cycle_updated += 1
+        else:
+            self.last_cycle_no_data += 1
+
+    async def run_cycle(self):
+        """Refresh every city once using a bounded pool of workers"""
+        self.last_cycle_started = time.time()
+        self.last_cycle_updated = 0
+        self.last_cycle_failures = 0
+        self.last_cycle_no_data = 0
+        queue: asyncio.Queue = asyncio.Queue()
+        for city in self.cities:
+            queue.put_nowait(city)
+
+        async def worker():
+            while True:
+                try:
+                    city = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._refresh_city(city)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(max(1, self.workers))))
+        self.last_cycle_duration = time.perf_counter() - start
+        self.last_cycle_finished = time.time()
+        self.cycles += 1
+        for callback in self.on_cycle_complete:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"Ingestion callback error: {e}")
+
+    async def _loop(self, immediate: bool):
+        if not immediate:
+            await self._sleep()
+        while True:
+            try:
+                await self.run_cycle()
+            except Exception as e:
+                print(f"Ingestion cycle failed: {e}")
+            self._first_cycle.set()
+            await self._sleep()
+
+    async def _sleep(self):
+        # +/-10% jitter keeps several workers from refreshing in lockstep
+        await asyncio.sleep(self.interval * self._random.uniform(0.9, 1.1))
+
+    def prewarm_seconds(self) -> float:
+        """Time the rate limits and start jitter alone add to a first cycle of a lookup and a reading per city"""
+        pacing = len(self.cities) * self.budget.interval
+        # Each worker sleeps up to `jitter` before every city it takes, one after another
+        jitter = math.ceil(len(self.cities) / max(1, self.workers)) * self.jitter
+        return max(pacing, self.quota.seconds_for(2 * len(self.cities), BACKGROUND)) + jitter
+
+    def prewarm_timeout(self) -> float:
+        """Startup wait for the first cycle: its rate-limited duration plus one call, within the maximum"""
+        needed = self.prewarm_seconds() + OPENAQ_TIMEOUT
+        if needed > INGEST_PREWARM_MAX_WAIT:
+            print(f"⚠️ The OpenAQ budget needs about {needed:.0f}s to pre-warm {len(self.cities)} cities; "
+                  f"waiting at most {INGEST_PREWARM_MAX_WAIT:.0f}s")
+        return min(needed, INGEST_PREWARM_MAX_WAIT)
+
+    async def start(self, prewarm: bool = True, prewarm_timeout: Optional[float] = INGEST_PREWARM_TIMEOUT):
+        """Start the background refresh; with prewarm, run its first cycle now and wait a while for it"""
+        self._task = asyncio.create_task(self._loop(immediate=prewarm))
+        if not prewarm:
+            return
+        if prewarm_timeout is None:
+            prewarm_timeout = self.prewarm_timeout()
+        try:
+            # Only the wait times out; the cycle itself carries on in the background task
+            await asyncio.wait_for(self._first_cycle.wait(), timeout=prewarm_timeout)
+            if self.cycles:
+                print(f"✅ Pre-warmed {len(self.snapshot)} city readings in {self.last_cycle_duration:.1f}s")
+        except asyncio.TimeoutError:
+            print(f"⚠️ Snapshot pre-warm still running after {prewarm_timeout:.0f}s, continuing in background")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "cities": len(self.cities),
+            "interval_seconds": self.interval,
+            "cycles": self.cycles,
+            "freshness_age_seconds": round(now - self.last_cycle_finished, 1) if self.last_cycle_finished else None,
+            "last_cycle_duration_seconds": round(self.last_cycle_duration, 3) if self.last_cycle_duration is not None else None,
+            "last_cycle_updated": self.last_cycle_updated,
+            "last_cycle_no_data": self.last_cycle_no_data,
+            "last_cycle_failures": self.last_cycle_failures,
+            "failures_total": self.failures_total,
+            "snapshot": self.snapshot.stats(),
+        }
+
+# Scheduler started by the FastAPI lifespan
+ingestion_scheduler: Optional[IngestionScheduler] = None
+
+async def start_ingestion(cities: List[dict], fetch: Callable[[float, float], Awaitable[Optional[dict]]]):
+    """Pre-warm the snapshot and start the background refresh"""
+    global ingestion_scheduler
+    if not INGEST_ENABLED:
+        print("Background ingestion disabled")
+        return
+    ingestion_scheduler = IngestionScheduler(cities, fetch)
+    await ingestion_scheduler.start(prewarm=True)
+
+async def stop_ingestion():
+    global ingestion_scheduler
+    if ingestion_scheduler is not None:
+        await ingestion_scheduler.stop()
+        ingestion_scheduler = None
+
+def is_ingested(lat: float, lng: float) -> bool:
+    """Whether the running scheduler keeps this location's snapshot entry fresh"""
+    return ingestion_scheduler is not None and snapshot_key(lat, lng) in ingestion_scheduler.keys
+
+def ingestion_stats() -> Optional[dict]:
+    if ingestion_scheduler is None:
+        return None
+    return ingestion_scheduler.stats()
@@ -0,0 +1,132 @@
+import datetime
+import os
+import threading
+from typing import Dict, Mapping, Optional, Tuple
+
+import numpy as np
+
+from ..core.aqi import POLLUTANTS
+from .snapshot import ReadingSnapshot
+from .spatial_index import GridIndex
+
+# Interpolation settings
+INTERPOLATION_K = int(os.getenv("INTERPOLATION_K", "6"))
+INTERPOLATION_POWER = float(os.getenv("INTERPOLATION_POWER", "2"))
+# No estimate is made farther than this from the nearest reading
+INTERPOLATION_MAX_DISTANCE_KM = float(os.getenv("INTERPOLATION_MAX_DISTANCE_KM", "100"))
+
+POLLUTANT_FIELDS = ("pm25", "pm10", "o3", "no2", "co", "so2")
+
+class IDWInterpolator:
+    """Inverse-distance-weighted estimates from the k nearest of a fixed set of readings"""
+
+    def __init__(self, lats, lngs, values: Mapping[str, np.ndarray], k: int = INTERPOLATION_K, power: float = INTERPOLATION_POWER):
+        self.index = GridIndex(lats, lngs)
+        self.values = {field: np.asarray(column, dtype=np.float64) for field, column in values.items()}
+        self.k = k
+        self.power = power
+
+    def __len__(self):
+        return len(self.index)
+
+    def estimate(self, lats, lngs, max_distance_km: Optional[float] = INTERPOLATION_MAX_DISTANCE_KM) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+        """Estimated value of every field at each query point, and the distance to the nearest reading.
+
+        NaN readings are skipped per field; points with no reading within
+        max_distance_km get NaN.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        if not len(self):
+            return {field: np.full(len(lats), np.nan) for field in self.values}, np.full(len(lats), np.inf)
+        idx, dist = self.index.nearest_many(lats, lngs, self.k)
+        # A query on top of a reading takes its value
+        weights = np.maximum(dist, 1e-3) ** -self.power
+        too_far = dist[:, 0] > max_distance_km if max_distance_km is not None else np.zeros(len(lats), dtype=bool)
+        estimates = {}
+        for field, column in self.values.items():
+            neighbours = column[idx]
+            present = ~np.isnan(neighbours)
+            w = np.where(present, weights, 0.0)
+            total = w.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                value = (w * np.where(present, neighbours, 0.0)).sum(axis=1) / total
+            value[(total == 0) | too_far] = np.nan
+            estimates[field] = value
+        return estimates, dist[:, 0]
+
+def _reading_value(reading: dict, field: str) -> float:
+    # Station parsers report 0 for pollutants a station does not measure
+    value = reading.get(field)
+    return float(value) if value else np.nan
+
+def _dominant_share(reading: dict, pollutant: str) -> float:
+    """1 where the reading's dominant pollutant is this one, so its IDW estimate is a weighted vote"""
+    dominant = reading.get("dominant_pollutant")
+    if not dominant or not reading.get("aqi"):
+        return np.nan
+    return 1.0 if dominant == pollutant else 0.0
+
+class SnapshotInterpolator:
+    """Interpolate pollutant readings at arbitrary points from the reading snapshot.
+
+    The AQI is interpolated from the stations' own AQI, which was computed
+    after converting each station's units, rather than recomputed from the
+    raw concentrations; the dominant pollutant is the weighted vote of the
+    neighbours'. The IDW index is rebuilt only when the snapshot version changes.
+    """
+
+    def __init__(self, snapshot: ReadingSnapshot):
+        self.snapshot = snapshot
+        self._version = None
+        self._interpolator: Optional[IDWInterpolator] = None
+        self._lock = threading.Lock()
+        self.estimates = 0
+        self.out_of_range = 0
+
+    def interpolator(self) -> IDWInterpolator:
+        with self._lock:
+            if self._interpolator is None or self._version != self.snapshot.version:
+                entries = self.snapshot.items()
+                lats = [lat for (lat, _), _ in entries]
+                lngs = [lng for (_, lng), _ in entries]
+                values = {field: [_reading_value(reading, field) for _, reading in entries] for field in POLLUTANT_FIELDS + ("aqi",)}
+                for pollutant in POLLUTANTS:
+                    values[f"dominant_{pollutant}"] = [_dominant_share(reading, pollutant) for _, reading in entries]
+                self._interpolator = IDWInterpolator(lats, lngs, values)
+                self._version = self.snapshot.version
+            return self._interpolator
+
+    def estimate_readings(self, lats, lngs, max_distance_km: float = INTERPOLATION_MAX_DISTANCE_KM):
+        """Readings (in the /current shape, or None when out of range) for many points"""
+        estimates, nearest = self.interpolator().estimate(lats, lngs, max_distance_km)
+        aqi = np.rint(estimates["aqi"])
+        votes = np.stack([np.nan_to_num(estimates[f"dominant_{pollutant}"], nan=-1.0) for pollutant in POLLUTANTS])
+        # No neighbour named a dominant pollutant: every vote is the -1 filler
+        dominant = np.append(np.array(POLLUTANTS, dtype=object), None)[np.where(votes.max(axis=0) < 0, len(POLLUTANTS), np.argmax(votes, axis=0))]
+        timestamp = datetime.datetime.utcnow().isoformat()
+        readings = []
+        columns = {field: np.round(estimates[field], 2).tolist() for field in POLLUTANT_FIELDS}
+        for i, value in enumerate(aqi.tolist()):
+            if np.isnan(value):
+                self.out_of_range += 1
+                readings.append(None)
+                continue
+            self.estimates += 1
+            reading = {field: (0 if np.isnan(columns[field][i]) else columns[field][i]) for field in POLLUTANT_FIELDS}
+            reading["aqi"] = int(value)
+            reading["dominant_pollutant"] = dominant[i]
+            reading["nearest_reading_km"] = round(float(nearest[i]), 1)
+            reading["timestamp"] = timestamp
+            readings.append(reading)
+        return readings
+
+    def estimate_reading(self, lat: float, lng: float, max_distance_km: float = INTERPOLATION_MAX_DISTANCE_KM) -> Optional[dict]:
+        return self.estimate_readings([lat], [lng], max_distance_km)[0]
+
+    def stats(self) -> dict:
+        return {
+            "points": len(self._interpolator) if self._interpolator is not None else 0,
+            "snapshot_version": self._version,
+            "estimates": self.estimates,
+            "out_of_range": self.out_of_range,
+        }
@@ -0,0 +1,222 @@
+import asyncio
+import os
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from ..core.serialization import dumps
+from .quota import BACKGROUND, priority
+from .snapshot import ReadingSnapshot, snapshot_key
+
+# Live subscription settings
+LIVE_QUEUE_SIZE = int(os.getenv("LIVE_QUEUE_SIZE", "32"))
+LIVE_REFRESH_INTERVAL = float(os.getenv("LIVE_REFRESH_INTERVAL", "300"))
+LIVE_HEARTBEAT_INTERVAL = float(os.getenv("LIVE_HEARTBEAT_INTERVAL", "25"))
+LIVE_MAX_LOCATIONS = int(os.getenv("LIVE_MAX_LOCATIONS", "50"))
+
+Key = Tuple[float, float]
+
+class SubscriptionClosed(Exception):
+    """The hub ended a subscription: the consumer fell behind or the server is shutting down"""
+
+class LiveUpdate:
+    """One changed reading, serialized once and shared by every subscriber"""
+
+    __slots__ = ("key", "reading", "seq", "payload", "sse")
+
+    def __init__(self, key: Key, reading: dict, seq: int):
+        self.key = key
+        self.reading = reading
+        self.seq = seq
+        self.payload = dumps({"type": "reading", "lat": key[0], "lng": key[1], "seq": seq, "reading": reading}).decode()
+        self.sse = f"id: {seq}\nevent: reading\ndata: {self.payload}\n\n".encode()
+
+class Subscription:
+    """One connection's locations and its bounded queue of pending updates"""
+
+    __slots__ = ("keys", "queue", "closed", "reason")
+
+    def __init__(self, queue_size: int = LIVE_QUEUE_SIZE):
+        self.keys: Set[Key] = set()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+        self.reason = ""
+
+    def offer(self, update: LiveUpdate) -> bool:
+        """Queue an update without waiting; False if the consumer has fallen too far behind"""
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def close(self, reason: str):
+        self.closed = True
+        self.reason = reason
+        try:
+            # Wake a consumer blocked on an empty queue
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout: float = LIVE_HEARTBEAT_INTERVAL) -> Optional[LiveUpdate]:
+        """Next update, or None after `timeout` seconds so the caller can send a heartbeat"""
+        if self.closed:
+            raise SubscriptionClosed(self.reason)
+        try:
+            update = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if update is None or self.closed:
+            raise SubscriptionClosed(self.reason)
+        return update
+
+def _same_reading(a: dict, b: dict) -> bool:
+    # Estimates are re-stamped on every refresh; only the values matter
+    return {k: v for k, v in a.items() if k != "timestamp"} == {k: v for k, v in b.items() if k != "timestamp"}
+
+class LiveHub:
+    """Fan out reading changes to live subscribers.
+
+    Locations kept fresh by the ingestion scheduler are pushed straight
+    from snapshot changes. Any other subscribed location gets one refresh
+    task, shared by all of its subscribers and cancelled with the last of
+    them. Each connection has a bounded queue; a connection whose queue
+    fills up is dropped rather than allowed to hold back the others, and
+    the client is expected to reconnect.
+    """
+
+    def __init__(
+        self,
+        snapshot: ReadingSnapshot,
+        fetch: Callable[[float, float], Awaitable[Optional[dict]]],
+        covered: Callable[[Key], bool],
+        refresh_interval: float = LIVE_REFRESH_INTERVAL,
+        queue_size: int = LIVE_QUEUE_SIZE,
+    ):
+        self.snapshot = snapshot
+        self.fetch = fetch
+        self.covered = covered
+        self.refresh_interval = refresh_interval
+        self.queue_size = queue_size
+        self._subscribers: Dict[Key, Set[Subscription]] = {}
+        self._latest: Dict[Key, LiveUpdate] = {}
+        self._refreshers: Dict[Key, asyncio.Task] = {}
+        self._seq = 0
+        self.connections = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped_slow = 0
+        snapshot.listeners.append(self._on_snapshot_change)
+
+    def subscribe(self, points: Iterable[Tuple[float, float]] = ()) -> Subscription:
+        subscription = Subscription(self.queue_size)
+        self.connections += 1
+        self.add(subscription, points)
+        return subscription
+
+    def add(self, subscription: Subscription, points: Iterable[Tuple[float, float]]):
+        """Subscribe to more locations; the latest known reading of each is sent right away"""
+        for lat, lng in points:
+            key = snapshot_key(lat, lng)
+            if key in subscription.keys:
+                continue
+            subscription.keys.add(key)
+            self._subscribers.setdefault(key, set()).add(subscription)
+            latest = self._latest.get(key)
+            if latest is None:
+                reading = self.snapshot.get(lat, lng)
+                if reading:
+                    latest = self._remember(key, reading)
+            if latest is not None:
+                self._deliver(subscription, latest)
+            if not self.covered(key) and key not in self._refreshers:
+                self._refreshers[key] = asyncio.create_task(self._refresh(key))
+
+    def remove(self, subscription: Subscription, points: Optional[Iterable[Tuple[float, float]]] = None):
+        """Unsubscribe from some locations, or from all of them"""
+        keys = list(subscription.keys) if points is None else [snapshot_key(lat, lng) for lat, lng in points]
+        for key in keys:
+            subscription.keys.discard(key)
+            subscribers = self._subscribers.get(key)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[key]
+                self._latest.pop(key, None)
+                refresher = self._refreshers.pop(key, None)
+                if refresher is not None:
+                    refresher.cancel()
+
+    def unsubscribe(self, subscription: Subscription):
+        if not subscription.closed:
+            subscription.close("unsubscribed")
+        self.remove(subscription)
+        self.connections -= 1
+
+    def _remember(self, key: Key, reading: dict) -> LiveUpdate:
+        self._seq += 1
+        update = LiveUpdate(key, reading, self._seq)
+        self._latest[key] = update
+        return update
+
+    def _deliver(self, subscription: Subscription, update: LiveUpdate):
+        if subscription.offer(update):
+            self.delivered += 1
+            return
+        self.dropped_slow += 1
+        subscription.close("slow consumer")
+        self.remove(subscription)
+
+    def publish(self, key: Key, reading: dict) -> bool:
+        """Send a reading to the key's subscribers if it differs from the last one sent"""
+        subscribers = self._subscribers.get(key)
+        if not subscribers:
+            return False
+        latest = self._latest.get(key)
+        if latest is not None and _same_reading(latest.reading, reading):
+            return False
+        update = self._remember(key, reading)
+        self.published += 1
+        for subscription in list(subscribers):
+            self._deliver(subscription, update)
+        return True
+
+    def _on_snapshot_change(self, key: Key, reading: dict):
+        self.publish(key, reading)
+
+    async def _refresh(self, key: Key):
+        # Live refreshes are background work as far as the OpenAQ quota is concerned
+        with priority(BACKGROUND):
+            while key in self._subscribers:
+                try:
+                    reading = await self.fetch(*key)
+                except Exception as e:
+                    print(f"Live refresh error for {key}: {e}")
+                else:
+                    if reading:
+                        self.publish(key, reading)
+                await asyncio.sleep(self.refresh_interval)
+
+    async def close(self):
+        """Cancel refreshes and end every subscription"""
+        refreshers = list(self._refreshers.values())
+        for refresher in refreshers:
+            refresher.cancel()
+        await asyncio.gather(*refreshers, return_exceptions=True)
+        self._refreshers.clear()
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                subscription.close("server shutting down")
+        self._subscribers.clear()
+        self._latest.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "locations": len(self._subscribers),
+            "subscriptions": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "refresh_tasks": len(self._refreshers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_slow_consumers": self.dropped_slow,
+        }
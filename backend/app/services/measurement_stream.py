@@ -0,0 +1,211 @@
+import codecs
+import json
+import os
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Measurement query settings: only the newest rows for the pollutants the AQI uses
+OPENAQ_MEASUREMENT_LIMIT = int(os.getenv("OPENAQ_MEASUREMENT_LIMIT", "24"))
+
+POLLUTANTS = ("pm25", "pm10", "o3", "no2", "co", "so2")
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+class JSONArrayStream:
+    """Incrementally yield the elements of one top-level array in a streamed JSON object.
+
+    Text is fed in arbitrary chunks. Keys before the array are skipped
+    with the C decoder, and each element is decoded as soon as its
+    closing bracket arrives, so a caller can stop reading the body
+    once it has what it needs.
+    """
+
+    def __init__(self, key: str = "results"):
+        self.key = key
+        self._buffer = ""
+        self._pos = 0
+        # opening -> key -> colon -> value (skipped) -> comma -> key ... -> array -> done
+        self._state = "opening"
+        self._current_key = None
+        self.done = False
+
+    def _skip_whitespace(self):
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        self._pos = pos
+
+    def _decode(self):
+        """Decode one value at the cursor, or raise IndexError if it is not complete yet"""
+        try:
+            value, end = _decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            # Assume the value is cut off at the end of the buffer; close() reports real errors
+            raise IndexError
+        if end == len(self._buffer) and isinstance(value, (int, float)):
+            # A number at the buffer end may continue in the next chunk
+            raise IndexError
+        self._pos = end
+        return value
+
+    def _expect(self, char: str) -> bool:
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            return False
+        if self._buffer[self._pos] != char:
+            raise ValueError(f"Expected {char!r} at offset {self._pos}")
+        self._pos += 1
+        return True
+
+    def feed(self, text: str) -> Iterator:
+        """Add text and lazily yield the array elements it completes.
+
+        Elements are decoded one at a time as the caller iterates, so
+        stopping early skips the rest of the chunk; anything not yet
+        yielded is kept for the next feed.
+        """
+        if self.done:
+            return
+        # Drop consumed text so the buffer only holds what is still unread
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        try:
+            while not self.done:
+                state = self._state
+                if state == "opening":
+                    if not self._expect("{"):
+                        break
+                    self._state = "key"
+                elif state == "key":
+                    self._skip_whitespace()
+                    if self._pos < len(self._buffer) and self._buffer[self._pos] == "}":
+                        # The object ended without the array
+                        self.done = True
+                        break
+                    self._current_key = self._decode()
+                    self._state = "colon"
+                elif state == "colon":
+                    if not self._expect(":"):
+                        break
+                    self._state = "array" if self._current_key == self.key else "value"
+                elif state == "value":
+                    self._skip_whitespace()
+                    self._decode()
+                    self._state = "comma"
+                elif state == "comma":
+                    self._skip_whitespace()
+                    if self._pos >= len(self._buffer):
+                        break
+                    char = self._buffer[self._pos]
+                    self._pos += 1
+                    if char == "}":
+                        self.done = True
+                    elif char == ",":
+                        self._state = "key"
+                    else:
+                        raise ValueError(f"Unexpected {char!r} at offset {self._pos - 1}")
+                elif state == "array":
+                    if not self._expect("["):
+                        break
+                    self._state = "element"
+                elif state == "element":
+                    self._skip_whitespace()
+                    if self._pos >= len(self._buffer):
+                        break
+                    char = self._buffer[self._pos]
+                    if char == "]":
+                        self._pos += 1
+                        self.done = True
+                    elif char == ",":
+                        self._pos += 1
+                    else:
+                        yield self._decode()
+        except IndexError:
+            pass
+
+    def close(self):
+        """Raise if the stream ended before the array was complete"""
+        if not self.done:
+            raise ValueError(f"Truncated or invalid JSON while reading '{self.key}'")
+
+class MeasurementSummary:
+    """First (newest) value and unit per pollutant, collected from measurement rows"""
+
+    def __init__(self, wanted: Iterable[str] = POLLUTANTS):
+        self.wanted = frozenset(wanted)
+        self.values: Dict[str, float] = {}
+        self.units: Dict[str, Optional[str]] = {}
+        self.timestamp = ""
+        self.rows = 0
+
+    @property
+    def complete(self) -> bool:
+        return self.wanted.issubset(self.values)
+
+    def add(self, row: dict):
+        if not self.rows:
+            self.timestamp = (row.get("date") or {}).get("utc", "")
+        self.rows += 1
+        param = row.get("parameter")
+        value = row.get("value")
+        if param in self.wanted and value is not None and param not in self.values:
+            self.values[param] = value
+            self.units[param] = row.get("unit")
+
+# Parser counters across all measurement responses
+_parse_totals = {"responses": 0, "early_exits": 0, "bytes_read": 0, "bytes_drained": 0, "rows_parsed": 0}
+
+async def read_latest_measurements(chunks: AsyncIterator[bytes], wanted: Iterable[str] = POLLUTANTS) -> MeasurementSummary:
+    """Summarise a streamed measurements response, parsing only until every wanted pollutant is seen"""
+    chunks = chunks.__aiter__()
+    summary = MeasurementSummary(wanted)
+    stream = JSONArrayStream("results")
+    text = codecs.getincrementaldecoder("utf-8")()
+    bytes_read = 0
+    early_exit = False
+    async for chunk in chunks:
+        bytes_read += len(chunk)
+        for row in stream.feed(text.decode(chunk)):
+            summary.add(row)
+            if summary.complete:
+                early_exit = True
+                break
+        if early_exit or stream.done:
+            break
+    else:
+        for row in stream.feed(text.decode(b"", final=True)):
+            summary.add(row)
+        stream.close()
+    # Read the rest unparsed so the connection goes back to the pool instead of being closed
+    bytes_drained = 0
+    async for chunk in chunks:
+        bytes_drained += len(chunk)
+    _parse_totals["responses"] += 1
+    _parse_totals["early_exits"] += early_exit
+    _parse_totals["bytes_read"] += bytes_read
+    _parse_totals["bytes_drained"] += bytes_drained
+    _parse_totals["rows_parsed"] += summary.rows
+    return summary
+
+def summarise_measurements(body: bytes, wanted: Iterable[str] = POLLUTANTS) -> MeasurementSummary:
+    """Same summary from a complete body, parsed in one go"""
+    summary = MeasurementSummary(wanted)
+    for row in json.loads(body).get("results", []):
+        summary.add(row)
+        if summary.complete:
+            break
+    return summary
+
+def measurement_query(location_id, limit: int = OPENAQ_MEASUREMENT_LIMIT) -> List[Tuple[str, str]]:
+    """Query parameters for the newest measurements of the AQI pollutants at one station"""
+    params = [("location_id", str(location_id)), ("limit", str(limit)), ("order_by", "datetime"), ("sort", "desc")]
+    params.extend(("parameter", pollutant) for pollutant in POLLUTANTS)
+    return params
+
+def measurement_parse_stats() -> dict:
+    responses = _parse_totals["responses"]
+    return {
+        **_parse_totals,
+        "avg_bytes_read": round(_parse_totals["bytes_read"] / responses) if responses else 0,
+        "early_exit_ratio": round(_parse_totals["early_exits"] / responses, 4) if responses else 0.0,
+    }
@@ -0,0 +1,95 @@
+import os
+from typing import Optional
+
+import httpx
+
+# OpenAQ API location; point it at benchmarks/fake_openaq.py to run without network access
+OPENAQ_BASE_URL = os.getenv("OPENAQ_BASE_URL", "https://api.openaq.org").rstrip("/")
+
+# Connection pool settings for the shared OpenAQ client
+OPENAQ_MAX_CONNECTIONS = int(os.getenv("OPENAQ_MAX_CONNECTIONS", "20"))
+OPENAQ_MAX_KEEPALIVE = int(os.getenv("OPENAQ_MAX_KEEPALIVE", "10"))
+OPENAQ_KEEPALIVE_EXPIRY = float(os.getenv("OPENAQ_KEEPALIVE_EXPIRY", "60"))
+OPENAQ_TIMEOUT = float(os.getenv("OPENAQ_TIMEOUT", "10"))
+OPENAQ_CONNECT_TIMEOUT = float(os.getenv("OPENAQ_CONNECT_TIMEOUT", "5"))
+OPENAQ_HTTP2 = os.getenv("OPENAQ_HTTP2", "false").lower() == "true"
+
+# Pool limits for any other host reached through the shared client
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "10"))
+
+def url_origin(url: str) -> str:
+    """scheme://host[:port] of a URL, the key its pooled transport is mounted under"""
+    parsed = httpx.URL(url)
+    return f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+
+OPENAQ_HOST = url_origin(OPENAQ_BASE_URL)
+
+# Shared client, owned by the FastAPI lifespan
+openaq_client: Optional[httpx.AsyncClient] = None
+
+def http2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def create_openaq_client(
+    max_connections: int = OPENAQ_MAX_CONNECTIONS,
+    max_keepalive: int = OPENAQ_MAX_KEEPALIVE,
+    keepalive_expiry: float = OPENAQ_KEEPALIVE_EXPIRY,
+    http2: bool = OPENAQ_HTTP2,
+    host: str = OPENAQ_HOST,
+    verify=True,
+) -> httpx.AsyncClient:
+    """Build a pooled keep-alive client with its own connection limit for the OpenAQ host"""
+    if http2 and not http2_available():
+        print("⚠️ OPENAQ_HTTP2 requested but h2 is not installed, using HTTP/1.1")
+        http2 = False
+
+    timeout = httpx.Timeout(OPENAQ_TIMEOUT, connect=OPENAQ_CONNECT_TIMEOUT)
+    host_limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive,
+        keepalive_expiry=keepalive_expiry,
+    )
+    default_limits = httpx.Limits(
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive_connections=DEFAULT_MAX_CONNECTIONS,
+        keepalive_expiry=keepalive_expiry,
+    )
+
+    # Mounting a dedicated transport gives the OpenAQ host its own pool, so
+    # a slow third-party host can never starve the air-quality requests.
+    return httpx.AsyncClient(
+        timeout=timeout,
+        limits=default_limits,
+        http2=http2,
+        verify=verify,
+        mounts={
+            url_origin(host): httpx.AsyncHTTPTransport(limits=host_limits, http2=http2, verify=verify, retries=1),
+        },
+    )
+
+async def init_openaq_client():
+    """Create the shared OpenAQ client"""
+    global openaq_client
+    if openaq_client is None:
+        openaq_client = create_openaq_client()
+        print(f"✅ OpenAQ client ready (pool={OPENAQ_MAX_CONNECTIONS}, http2={OPENAQ_HTTP2 and http2_available()})")
+
+async def close_openaq_client():
+    """Close the shared OpenAQ client and its pooled connections"""
+    global openaq_client
+    if openaq_client is not None:
+        await openaq_client.aclose()
+        openaq_client = None
+        print("OpenAQ client closed")
+
+def get_openaq_client() -> httpx.AsyncClient:
+    """Get the shared OpenAQ client, creating it lazily outside the lifespan"""
+    global openaq_client
+    if openaq_client is None:
+        openaq_client = create_openaq_client()
+    return openaq_client
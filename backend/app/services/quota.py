@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import datetime
+import email.utils
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from ..core.paths import data_path, ensure_parent
+
+try:
+    import fcntl
+except ImportError:  # Windows: the budget is kept per process
+    fcntl = None
+
+# OpenAQ request budget, shared by every worker process through QUOTA_STATE_PATH
+OPENAQ_RATE_PER_MINUTE = float(os.getenv("OPENAQ_RATE_PER_MINUTE", "60"))
+OPENAQ_BURST = float(os.getenv("OPENAQ_BURST", "10"))
+QUOTA_STATE_PATH = os.getenv("QUOTA_STATE_PATH", data_path("openaq_quota.json"))
+# Share of the burst lower-priority calls must leave untouched
+QUOTA_BACKGROUND_RESERVE = float(os.getenv("QUOTA_BACKGROUND_RESERVE", "0.3"))
+QUOTA_BACKFILL_RESERVE = float(os.getenv("QUOTA_BACKFILL_RESERVE", "0.6"))
+# Pause after a 429 that carries no Retry-After header
+QUOTA_DEFAULT_BACKOFF = float(os.getenv("QUOTA_DEFAULT_BACKOFF", "10"))
+# Longest a call waits for a token before giving up; user requests fall back to estimates instead
+QUOTA_MAX_WAIT_INTERACTIVE = float(os.getenv("QUOTA_MAX_WAIT_INTERACTIVE", "5"))
+QUOTA_MAX_WAIT_BACKGROUND = float(os.getenv("QUOTA_MAX_WAIT_BACKGROUND", "120"))
+QUOTA_MAX_WAIT_BACKFILL = float(os.getenv("QUOTA_MAX_WAIT_BACKFILL", "600"))
+
+INTERACTIVE, BACKGROUND, BACKFILL = "interactive", "background", "backfill"
+
+class QuotaExceededError(Exception):
+    """Raised instead of waiting longer than a priority's maximum for an OpenAQ token"""
+
+# Priority of the OpenAQ calls made by the current task; user requests are interactive
+openaq_priority: ContextVar[str] = ContextVar("openaq_priority", default=INTERACTIVE)
+
+@contextlib.contextmanager
+def priority(level: str):
+    """Run the enclosed OpenAQ calls at the given priority"""
+    token = openaq_priority.set(level)
+    try:
+        yield
+    finally:
+        openaq_priority.reset(token)
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given as seconds or an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+class QuotaScheduler:
+    """Token bucket for upstream calls, with per-priority reserves and a shared state file.
+
+    A call of a given priority may only take a token if at least its
+    reserve (a share of the burst) is left afterwards, so background and
+    backfill traffic always leave headroom for interactive requests. The
+    bucket lives in a small JSON file guarded by flock, so every uvicorn
+    worker on the host draws from one budget; a 429's Retry-After pauses
+    all of them. The locked update runs in a worker thread, so a lock held
+    by another process never stalls the event loop. No caller waits longer than its priority's maximum: a
+    wait that would run past it, such as a long Retry-After, fails at once
+    with QuotaExceededError.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float = OPENAQ_RATE_PER_MINUTE,
+        burst: float = OPENAQ_BURST,
+        path: Optional[str] = QUOTA_STATE_PATH,
+        reserves: Optional[Dict[str, float]] = None,
+        max_waits: Optional[Dict[str, float]] = None,
+    ):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.path = path if path and fcntl is not None else None
+        if self.path is not None:
+            ensure_parent(self.path)
+        self.reserves = reserves or {
+            INTERACTIVE: 0.0,
+            BACKGROUND: QUOTA_BACKGROUND_RESERVE,
+            BACKFILL: QUOTA_BACKFILL_RESERVE,
+        }
+        self.max_waits = max_waits or {
+            INTERACTIVE: QUOTA_MAX_WAIT_INTERACTIVE,
+            BACKGROUND: QUOTA_MAX_WAIT_BACKGROUND,
+            BACKFILL: QUOTA_MAX_WAIT_BACKFILL,
+        }
+        self._lock = threading.Lock()
+        self._local = {"tokens": burst, "updated": time.time(), "blocked_until": 0.0}
+        self.granted = {level: 0 for level in self.reserves}
+        self.waited_seconds = {level: 0.0 for level in self.reserves}
+        self.rejected = {level: 0 for level in self.reserves}
+        self.throttled = 0
+
+    @contextlib.contextmanager
+    def _state(self, blocking: bool = True):
+        """Exclusive read-modify-write access to the bucket; raises BlockingIOError if busy and not blocking"""
+        if not self._lock.acquire(blocking):
+            raise BlockingIOError("quota state is in use")
+        try:
+            if self.path is None:
+                yield self._local
+                return
+            with open(self.path, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "{}")
+                    except ValueError:
+                        state = {}
+                    state.setdefault("tokens", self.burst)
+                    state.setdefault("updated", time.time())
+                    state.setdefault("blocked_until", 0.0)
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        finally:
+            self._lock.release()
+
+    async def _off_loop(self, fn, *args):
+        """Run fn in a worker thread when it takes the file lock, which may wait on other workers"""
+        if self.path is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    def _refill(self, state: dict, now: float):
+        elapsed = max(0.0, now - state["updated"])
+        state["tokens"] = min(self.burst, state["tokens"] + elapsed * self.rate)
+        state["updated"] = now
+
+    def _take(self, level: str, blocking: bool = True) -> float:
+        """Take a token and return 0, or return how long to wait before trying again"""
+        floor = self.reserves.get(level, 0.0) * self.burst
+        now = time.time()
+        with self._state(blocking) as state:
+            self._refill(state, now)
+            if state["blocked_until"] > now:
+                return state["blocked_until"] - now
+            if state["tokens"] - 1 >= floor - 1e-9:
+                state["tokens"] -= 1
+                return 0.0
+            return (1 + floor - state["tokens"]) / self.rate if self.rate > 0 else 1.0
+
+    async def acquire(self, level: Optional[str] = None):
+        """Wait until a call at this priority (default: the task's) may go upstream.
+
+        Raises QuotaExceededError as soon as the wait would exceed the
+        priority's maximum.
+        """
+        level = level or openaq_priority.get()
+        max_wait = self.max_waits.get(level)
+        start = time.monotonic()
+        while True:
+            wait = await self._off_loop(self._take, level)
+            if wait <= 0:
+                break
+            waited = time.monotonic() - start
+            if max_wait is not None and waited + wait > max_wait:
+                self.rejected[level] = self.rejected.get(level, 0) + 1
+                raise QuotaExceededError(f"OpenAQ quota: {level} call would wait {waited + wait:.0f}s, limit {max_wait:.0f}s")
+            # Re-check at least every second: other workers share the bucket
+            await asyncio.sleep(min(wait, 1.0))
+        self.granted[level] = self.granted.get(level, 0) + 1
+        self.waited_seconds[level] = self.waited_seconds.get(level, 0.0) + time.monotonic() - start
+
+    def try_acquire(self, level: Optional[str] = None) -> bool:
+        """Take a token only if one is available right now, without waiting for the lock"""
+        level = level or openaq_priority.get()
+        try:
+            if self._take(level, blocking=False) > 0:
+                return False
+        except BlockingIOError:
+            return False
+        self.granted[level] = self.granted.get(level, 0) + 1
+        return True
+
+    def seconds_for(self, calls: int, level: str = BACKGROUND) -> float:
+        """How long `calls` calls at this priority take on a full bucket at the sustained rate"""
+        usable = self.burst * (1 - self.reserves.get(level, 0.0))
+        if self.rate <= 0:
+            return 0.0
+        return max(0.0, calls - usable) / self.rate
+
+    async def penalize(self, retry_after: Optional[float]):
+        """Pause every caller after a 429, for Retry-After seconds if given"""
+        self.throttled += 1
+        seconds = QUOTA_DEFAULT_BACKOFF if retry_after is None else retry_after
+        await self._off_loop(self._block, time.time() + seconds)
+
+    def _block(self, until: float):
+        with self._state() as state:
+            self._refill(state, time.time())
+            state["blocked_until"] = max(state["blocked_until"], until)
+            state["tokens"] = 0.0
+
+    def stats(self) -> dict:
+        now = time.time()
+        with self._state() as state:
+            self._refill(state, now)
+            tokens, blocked_until = state["tokens"], state["blocked_until"]
+        return {
+            "rate_per_minute": round(self.rate * 60, 2),
+            "burst": self.burst,
+            "tokens": round(tokens, 2),
+            "blocked_for_seconds": round(max(0.0, blocked_until - now), 1),
+            "shared_state": self.path,
+            "throttled": self.throttled,
+            "granted": dict(self.granted),
+            "rejected": dict(self.rejected),
+            "avg_wait_seconds": {
+                level: round(self.waited_seconds[level] / count, 3) if count else 0.0
+                for level, count in self.granted.items()
+            },
+        }
+
+# Budget shared by every OpenAQ call
+openaq_quota = QuotaScheduler()
@@ -0,0 +1,255 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+import numpy as np
+
+from ..core.metrics import OPENAQ_REQUEST_SECONDS, OPENAQ_REQUESTS
+from .openaq_client import OPENAQ_TIMEOUT
+from .quota import QuotaExceededError, QuotaScheduler, openaq_quota, retry_after_seconds
+
+# Circuit breaker settings
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))
+# Adaptive timeout: a multiple of the observed p99, within [min, max]
+ADAPTIVE_TIMEOUT_MIN = float(os.getenv("ADAPTIVE_TIMEOUT_MIN", "1"))
+ADAPTIVE_TIMEOUT_MAX = float(os.getenv("ADAPTIVE_TIMEOUT_MAX", str(OPENAQ_TIMEOUT)))
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", "3"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "20"))
+# Hedging sends a second identical request once the first is slower than p95
+OPENAQ_HEDGE = os.getenv("OPENAQ_HEDGE", "false").lower() == "true"
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+def call_outcome(error: BaseException) -> str:
+    """Metrics label for how a failed upstream call ended"""
+    if isinstance(error, QuotaExceededError):
+        return "quota_exceeded"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, httpx.HTTPStatusError):
+        return "throttled" if error.response.status_code == 429 else f"http_{error.response.status_code // 100}xx"
+    if isinstance(error, httpx.TransportError):
+        return "transport_error"
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    return "error"
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+class UpstreamTimeoutError(asyncio.TimeoutError):
+    """An upstream call exceeded its adaptive timeout"""
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Errors that say the upstream is unhealthy, as opposed to a bad request"""
+    if isinstance(error, httpx.HTTPStatusError):
+        code = error.response.status_code
+        return code >= 500 or code == 429
+    return isinstance(error, (httpx.TransportError, asyncio.TimeoutError))
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        return float(np.percentile(np.fromiter(self._samples, dtype=np.float64), q))
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; half-open probes after a cool-down"""
+
+    def __init__(
+        self,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = BREAKER_RESET_TIMEOUT,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.state_changed_at = time.time()
+        self._probes = 0
+        self.trips = 0
+        self.rejections = 0
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            self.state_changed_at = time.time()
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; counts half-open probes"""
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejections += 1
+                return False
+            self._set_state(HALF_OPEN)
+            self._probes = 0
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejections += 1
+                return False
+            self._probes += 1
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        if self.state == HALF_OPEN:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.trips += 1
+            self._set_state(OPEN)
+            self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """A half-open probe ended without a verdict (e.g. a client error)"""
+        if self.state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+class ResilientEndpoint:
+    """Circuit breaker, quota, latency-derived timeout and optional hedging for one upstream endpoint.
+
+    Waiting for a quota token happens before the timeout starts, so a busy
+    budget never counts against the upstream's health.
+    """
+
+    def __init__(self, name: str, hedge: bool = OPENAQ_HEDGE, quota: Optional[QuotaScheduler] = openaq_quota):
+        self.name = name
+        self.hedge = hedge
+        self.quota = quota
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Metric children of the common case, looked up once
+        self._ok_calls = OPENAQ_REQUESTS.labels(name, "ok")
+        self._ok_latency = OPENAQ_REQUEST_SECONDS.labels(name, "ok")
+
+    def timeout(self) -> float:
+        if len(self.latency) < LATENCY_MIN_SAMPLES:
+            return ADAPTIVE_TIMEOUT_MAX
+        p99 = self.latency.percentile(99)
+        return min(ADAPTIVE_TIMEOUT_MAX, max(ADAPTIVE_TIMEOUT_MIN, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn (a factory, so it can be called again for a hedge) under the breaker"""
+        if not self.breaker.allow():
+            OPENAQ_REQUESTS.labels(self.name, "circuit_open").inc()
+            raise CircuitOpenError(f"OpenAQ {self.name} circuit is open")
+        start = None
+        try:
+            if self.quota is not None:
+                await self.quota.acquire()
+            self.calls += 1
+            timeout = self.timeout()
+            start = time.perf_counter()
+            if self.hedge and len(self.latency) >= LATENCY_MIN_SAMPLES:
+                result = await self._hedged(fn, timeout)
+            else:
+                try:
+                    result = await asyncio.wait_for(fn(), timeout)
+                except asyncio.TimeoutError:
+                    raise UpstreamTimeoutError(f"OpenAQ {self.name} timed out after {timeout:.1f}s")
+        except BaseException as e:
+            outcome = call_outcome(e)
+            OPENAQ_REQUESTS.labels(self.name, outcome).inc()
+            if start is not None:
+                OPENAQ_REQUEST_SECONDS.labels(self.name, outcome).observe(time.perf_counter() - start)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429 and self.quota is not None:
+                await self.quota.penalize(retry_after_seconds(e.response.headers.get("Retry-After")))
+            if isinstance(e, Exception) and is_upstream_failure(e):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+            raise
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        self._ok_calls.inc()
+        self._ok_latency.observe(elapsed)
+        self.breaker.record_success()
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        primary = asyncio.ensure_future(fn())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=min(self.latency.percentile(95), timeout))
+            # A hedge is only worth sending if the budget has a token to spare
+            if not done and (self.quota is None or self.quota.try_acquire()):
+                self.hedges += 1
+                tasks.append(asyncio.ensure_future(fn()))
+            error: Optional[BaseException] = None
+            while tasks:
+                remaining = deadline - loop.time()
+                done, _ = await asyncio.wait(tasks, timeout=max(remaining, 0), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise UpstreamTimeoutError(f"OpenAQ {self.name} timed out after {timeout:.1f}s")
+                for task in done:
+                    tasks.remove(task)
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # The slower attempt is abandoned once either one answers
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        p50, p95, p99 = (self.latency.percentile(q) for q in (50, 95, 99))
+        return {
+            "state": self.breaker.state,
+            "state_age_seconds": round(time.time() - self.breaker.state_changed_at, 1),
+            "trips": self.breaker.trips,
+            "rejections": self.breaker.rejections,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "timeout_seconds": round(self.timeout(), 3),
+            "latency_ms": {
+                name: round(value * 1000, 1) if value is not None else None
+                for name, value in (("p50", p50), ("p95", p95), ("p99", p99))
+            },
+        }
+
+# One guard per OpenAQ endpoint used by the air-quality routes
+location_guard = ResilientEndpoint("locations")
+measurement_guard = ResilientEndpoint("measurements")
+forecast_guard = ResilientEndpoint("forecast")
+
+def resilience_stats() -> Dict[str, dict]:
+    return {guard.name: guard.stats() for guard in (location_guard, measurement_guard, forecast_guard)}
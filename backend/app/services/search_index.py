@@ -0,0 +1,134 @@
+from typing import Dict, List, Optional, Sequence
+
+# Result tiers, best first
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, FUZZY = range(5)
+
+# Minimum trigram similarity for a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+def _trigrams(text: str) -> set:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """Precomputed name search over a static list of dicts.
+
+    Holds a lowercase prefix trie over full names and each word in them,
+    n-gram posting lists (lengths 1-3) for substring matches, padded
+    trigram sets for typo-tolerant fuzzy matches, and optional buckets
+    (e.g. by state) for cheap filtering.
+    """
+
+    def __init__(self, entries: Sequence[dict], name_key: str = "name", bucket_key: Optional[str] = None):
+        self.entries = list(entries)
+        self.name_key = name_key
+        self._names = [entry[name_key].lower() for entry in self.entries]
+        self._trie: dict = {}
+        self._grams: Dict[str, List[int]] = {}
+        self._fuzzy_grams: Dict[str, List[int]] = {}
+        self._fuzzy_sizes: List[int] = []
+        self._buckets: Dict[str, set] = {}
+
+        for i, name in enumerate(self._names):
+            words = name.replace(",", " ").split()
+            starts = {name} | {" ".join(words[w:]) for w in range(1, len(words))}
+            for start in starts:
+                self._add_prefixes(start, i)
+            grams = {name[a:a + n] for n in (1, 2, 3) for a in range(len(name) - n + 1)}
+            for gram in grams:
+                self._grams.setdefault(gram, []).append(i)
+            fuzzy = _trigrams(name)
+            self._fuzzy_sizes.append(len(fuzzy))
+            for gram in fuzzy:
+                self._fuzzy_grams.setdefault(gram, []).append(i)
+            if bucket_key:
+                self._buckets.setdefault(str(self.entries[i][bucket_key]).lower(), set()).add(i)
+
+    def _add_prefixes(self, text: str, i: int):
+        node = self._trie
+        for char in text:
+            node = node.setdefault(char, {})
+            ids = node.setdefault("\0", [])
+            if not ids or ids[-1] != i:
+                ids.append(i)
+
+    def _prefix_ids(self, prefix: str) -> List[int]:
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get("\0", [])
+
+    def _substring_ids(self, query: str) -> set:
+        if len(query) <= 3:
+            return set(self._grams.get(query, ()))
+        postings = [self._grams.get(query[a:a + 3]) for a in range(len(query) - 2)]
+        if not all(postings):
+            return set()
+        candidates = set(min(postings, key=len))
+        for posting in postings:
+            candidates.intersection_update(posting)
+        return {i for i in candidates if query in self._names[i]}
+
+    def _fuzzy_ids(self, query: str) -> Dict[int, float]:
+        grams = _trigrams(query)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for i in self._fuzzy_grams.get(gram, ()):
+                shared[i] = shared.get(i, 0) + 1
+        scores = {}
+        for i, count in shared.items():
+            score = count / (len(grams) + self._fuzzy_sizes[i] - count)
+            if score >= FUZZY_THRESHOLD:
+                scores[i] = score
+        return scores
+
+    def bucket(self, value: str) -> set:
+        return self._buckets.get(value.lower(), set())
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        bucket: Optional[str] = None,
+        limit: Optional[int] = None,
+        fuzzy: bool = True,
+    ) -> List[dict]:
+        """Entries matching query (substring, ranked) within an optional bucket.
+
+        Fuzzy trigram matches are only used when nothing matches as a
+        substring, so a typo still finds the intended entry.
+        """
+        allowed = self.bucket(bucket) if bucket else None
+        query = (query or "").lower().strip()
+        if not query:
+            ids = range(len(self.entries)) if allowed is None else sorted(allowed)
+            ids = list(ids)[:limit] if limit is not None else list(ids)
+            return [self.entries[i] for i in ids]
+
+        matches = self._substring_ids(query)
+        if allowed is not None:
+            matches &= allowed
+
+        ranked = []
+        if matches:
+            prefix = set(self._prefix_ids(query))
+            for i in matches:
+                name = self._names[i]
+                if name == query:
+                    tier = EXACT
+                elif name.startswith(query):
+                    tier = PREFIX
+                elif i in prefix:
+                    tier = WORD_PREFIX
+                else:
+                    tier = SUBSTRING
+                ranked.append((tier, 0.0, i))
+        elif fuzzy:
+            for i, score in self._fuzzy_ids(query).items():
+                if allowed is None or i in allowed:
+                    ranked.append((FUZZY, -score, i))
+        ranked.sort()
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [self.entries[i] for _, _, i in ranked]
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight upstream task"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.leaders = 0
+        self.shared = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the call already running for it"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._forget(key, t))
+        else:
+            self.shared += 1
+        # Shielding means a cancelled caller only stops waiting; the upstream
+        # call keeps running for everyone else who joined it.
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved even if every waiter was cancelled;
+        # each joined caller still receives it from the shielded await.
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def inflight(self) -> int:
+        return len(self._inflight)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "upstream_calls": self.leaders,
+            "coalesced_calls": self.shared,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+            "coalescing_ratio": round(self.shared / self.calls, 4) if self.calls else 0.0,
+        }
+
+# Shared groups for the OpenAQ calls made by the air-quality endpoints
+location_flights = SingleFlight("locations")
+measurement_flights = SingleFlight("measurements")
+forecast_flights = SingleFlight("forecast")
+
+def coalescing_stats() -> dict:
+    return {group.name: group.stats() for group in (location_flights, measurement_flights, forecast_flights)}
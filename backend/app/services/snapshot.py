@@ -0,0 +1,81 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+def snapshot_key(lat: float, lng: float) -> Tuple[float, float]:
+    """Round coordinates so the same city always maps to the same entry"""
+    return (round(lat, 4), round(lng, 4))
+
+class ReadingSnapshot:
+    """In-memory latest reading per location, versioned so readers can detect changes"""
+
+    def __init__(self):
+        # key -> (reading dict, wall-clock time it was fetched)
+        self._entries: Dict[Tuple[float, float], tuple] = {}
+        # key -> snapshot version at which that entry last changed, oldest change first
+        self._changed_at: "OrderedDict[Tuple[float, float], int]" = OrderedDict()
+        self.version = 0
+        # Versions only mean something within one process lifetime
+        self.epoch = uuid.uuid4().hex[:12]
+        # Called with (key, reading) whenever an entry changes
+        self.listeners = []
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, lat: float, lng: float, max_age: Optional[float] = None) -> Optional[dict]:
+        entry = self._entries.get(snapshot_key(lat, lng))
+        if entry is None or (max_age is not None and time.time() - entry[1] > max_age):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, lat: float, lng: float, reading: dict) -> bool:
+        """Store a reading; returns True (and bumps the version) if it changed"""
+        key = snapshot_key(lat, lng)
+        previous = self._entries.get(key)
+        self._entries[key] = (reading, time.time())
+        if previous is not None and previous[0] == reading:
+            return False
+        self.version += 1
+        self._changed_at[key] = self.version
+        self._changed_at.move_to_end(key)
+        for listener in self.listeners:
+            try:
+                listener(key, reading)
+            except Exception as e:
+                print(f"Snapshot listener error: {e}")
+        return True
+
+    def changed_since(self, version: int) -> Dict[Tuple[float, float], dict]:
+        """Entries changed after `version`; walks only the changes, newest first"""
+        changed = {}
+        for key in reversed(self._changed_at):
+            if self._changed_at[key] <= version:
+                break
+            changed[key] = self._entries[key][0]
+        return changed
+
+    def items(self):
+        return [(key, reading) for key, (reading, _) in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        now = time.time()
+        ages = [now - fetched_at for _, fetched_at in self._entries.values()]
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "version": self.version,
+            "oldest_age_seconds": round(max(ages), 1) if ages else None,
+            "newest_age_seconds": round(min(ages), 1) if ages else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+# Latest readings for INDIAN_CITIES, filled by the ingestion scheduler
+reading_snapshot = ReadingSnapshot()
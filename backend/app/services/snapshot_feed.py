@@ -0,0 +1,85 @@
+import os
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+from ..core.serialization import dumps
+from .snapshot import ReadingSnapshot
+
+# Encoded bodies kept per (since, version), so clients at the same version share one
+SNAPSHOT_FEED_CACHE_SIZE = int(os.getenv("SNAPSHOT_FEED_CACHE_SIZE", "64"))
+
+FEED_COLUMNS = ("lat", "lng", "aqi", "pm25", "pm10", "o3", "no2", "co", "so2", "dominant_pollutant", "timestamp")
+
+def encode_columns(entries: Iterable[Tuple[Tuple[float, float], dict]]) -> dict:
+    """Array-of-columns encoding of (key, reading) entries: one list per field instead of one dict per city"""
+    columns = {column: [] for column in FEED_COLUMNS}
+    lat, lng = columns["lat"], columns["lng"]
+    fields = [(columns[column], column) for column in FEED_COLUMNS[2:]]
+    for (entry_lat, entry_lng), reading in entries:
+        lat.append(entry_lat)
+        lng.append(entry_lng)
+        for values, column in fields:
+            values.append(reading.get(column))
+    return columns
+
+class SnapshotFeed:
+    """Versioned snapshot bodies for map clients: the full snapshot, or only what changed since a version.
+
+    A client sends back the epoch and version of its last body. A matching
+    epoch gets a delta whose size (and encoding cost) follows the number of
+    changed cities; anything else, such as a server restart, gets the full
+    snapshot.
+    """
+
+    def __init__(self, snapshot: ReadingSnapshot, cache_size: int = SNAPSHOT_FEED_CACHE_SIZE):
+        self.snapshot = snapshot
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[Optional[int], int], bytes]" = OrderedDict()
+        self.full_responses = 0
+        self.delta_responses = 0
+        self.bytes_served = 0
+        self.hits = 0
+        self.misses = 0
+
+    def body(self, since: Optional[int] = None, epoch: Optional[str] = None) -> bytes:
+        snapshot = self.snapshot
+        version = snapshot.version
+        full = since is None or epoch != snapshot.epoch or since > version
+        if full:
+            self.full_responses += 1
+        else:
+            self.delta_responses += 1
+        key = (None if full else since, version)
+        body = self._cache.get(key)
+        if body is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            entries = snapshot.items() if full else snapshot.changed_since(since).items()
+            columns = encode_columns(entries)
+            body = dumps({
+                "epoch": snapshot.epoch,
+                "version": version,
+                "since": None if full else since,
+                "full": full,
+                "count": len(columns["lat"]),
+                "columns": columns,
+            })
+            self._cache[key] = body
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self.bytes_served += len(body)
+        return body
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "epoch": self.snapshot.epoch,
+            "version": self.snapshot.version,
+            "full_responses": self.full_responses,
+            "delta_responses": self.delta_responses,
+            "bytes_served": self.bytes_served,
+            "cached_bodies": len(self._cache),
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
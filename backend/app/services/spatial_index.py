@@ -0,0 +1,186 @@
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 110.57
+KM_PER_DEG_LNG_EQUATOR = 111.32
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; broadcasts over NumPy arrays"""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+class GridIndex:
+    """Uniform lat/lng grid over a static set of points.
+
+    Points are bucketed once into square cells stored CSR-style (a sorted
+    permutation plus per-cell offsets). Queries visit rings of cells around
+    the query cell and stop as soon as no unvisited cell can hold a closer
+    point, so they touch a handful of cells instead of every point.
+    """
+
+    def __init__(self, lats, lngs, cell_deg: Optional[float] = None, points_per_cell: float = 4.0):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        if self.lats.shape != self.lngs.shape or self.lats.ndim != 1:
+            raise ValueError("lats and lngs must be 1-D arrays of equal length")
+        n = len(self.lats)
+        if n:
+            self.lat0, lat_max = float(self.lats.min()), float(self.lats.max())
+            self.lng0, lng_max = float(self.lngs.min()), float(self.lngs.max())
+        else:
+            self.lat0 = lat_max = self.lng0 = lng_max = 0.0
+        if cell_deg is None:
+            # Size cells so that each holds a few points on average
+            area = max(lat_max - self.lat0, 0.01) * max(lng_max - self.lng0, 0.01)
+            cell_deg = min(5.0, max(0.01, math.sqrt(area * points_per_cell / max(n, 1))))
+        self.cell_deg = cell_deg
+        self.n_rows = int((lat_max - self.lat0) // cell_deg) + 1
+        self.n_cols = int((lng_max - self.lng0) // cell_deg) + 1
+        self.max_abs_lat = max(abs(self.lat0), abs(lat_max))
+
+        rows, cols = self._cell_of(self.lats, self.lngs)
+        cell_ids = rows * self.n_cols + cols
+        self._order = np.argsort(cell_ids, kind="stable")
+        self._offsets = np.searchsorted(cell_ids[self._order], np.arange(self.n_rows * self.n_cols + 1))
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _cell_of(self, lats, lngs):
+        rows = np.floor((np.asarray(lats) - self.lat0) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lngs) - self.lng0) / self.cell_deg).astype(np.int64)
+        return rows, cols
+
+    def _km_per_ring(self, lat: float) -> float:
+        """Lower bound on the distance covered by each extra ring of cells"""
+        widest = min(89.9, max(self.max_abs_lat, abs(lat)))
+        return self.cell_deg * min(KM_PER_DEG_LAT, KM_PER_DEG_LNG_EQUATOR * math.cos(math.radians(widest)))
+
+    def _ring_points(self, row: int, col: int, r: int) -> np.ndarray:
+        """Indices of the points in cells exactly r rings away from (row, col)"""
+        r0, r1 = max(row - r, 0), min(row + r, self.n_rows - 1)
+        c0, c1 = max(col - r, 0), min(col + r, self.n_cols - 1)
+        if r0 > r1 or c0 > c1:
+            return np.empty(0, dtype=np.int64)
+        chunks = []
+        for rr in range(r0, r1 + 1):
+            if r == 0 or rr in (row - r, row + r):
+                spans = [(c0, c1)]
+            else:
+                spans = [(c, c) for c in (col - r, col + r) if c0 <= c <= c1]
+            base = rr * self.n_cols
+            for a, b in spans:
+                start, end = self._offsets[base + a], self._offsets[base + b + 1]
+                if end > start:
+                    chunks.append(self._order[start:end])
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(chunks)
+
+    def _rings_to_cover(self, row: int, col: int) -> int:
+        return max(row, self.n_rows - 1 - row, col, self.n_cols - 1 - col, 0)
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of the k nearest points, closest first"""
+        k = min(k, len(self))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        row, col = (int(v) for v in self._cell_of(lat, lng))
+        km_per_ring = self._km_per_ring(lat)
+        last_ring = self._rings_to_cover(row, col)
+        found_idx = []
+        found_dist = []
+        count = 0
+        r = 0
+        while True:
+            idx = self._ring_points(row, col, r)
+            if len(idx):
+                found_idx.append(idx)
+                found_dist.append(haversine_km(lat, lng, self.lats[idx], self.lngs[idx]))
+                count += len(idx)
+            if count >= k:
+                dist = np.concatenate(found_dist)
+                kth = np.partition(dist, k - 1)[k - 1]
+                # Everything outside the visited block is at least r rings away
+                if kth <= r * km_per_ring or r >= last_ring:
+                    break
+            elif r >= last_ring:
+                break
+            r += 1
+        idx = np.concatenate(found_idx)
+        dist = np.concatenate(found_dist)
+        top = np.argpartition(dist, k - 1)[:k] if k < len(dist) else np.arange(len(dist))
+        top = top[np.argsort(dist[top], kind="stable")]
+        return idx[top], dist[top]
+
+    def nearest_many(self, lats, lngs, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """(n, k) indices and distances (km) of the k nearest points to each query, closest first.
+
+        Queries are grouped by grid cell and every group is answered with one
+        distance matrix against the candidates from the rings around its cell,
+        so thousands of nearby queries cost a few array operations.
+        """
+        lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+        lngs = np.atleast_1d(np.asarray(lngs, dtype=np.float64))
+        k = min(k, len(self))
+        out_idx = np.zeros((len(lats), max(k, 0)), dtype=np.int64)
+        out_dist = np.full((len(lats), max(k, 0)), np.inf)
+        if k <= 0 or not len(lats):
+            return out_idx, out_dist
+        rows, cols = self._cell_of(lats, lngs)
+        cells, group_of = np.unique(np.stack([rows, cols], axis=1), axis=0, return_inverse=True)
+        order = np.argsort(group_of.ravel(), kind="stable")
+        bounds = np.searchsorted(group_of.ravel()[order], np.arange(len(cells) + 1))
+        for g, (row, col) in enumerate(cells.tolist()):
+            queries = order[bounds[g]:bounds[g + 1]]
+            q_lats, q_lngs = lats[queries], lngs[queries]
+            km_per_ring = self._km_per_ring(float(np.abs(q_lats).max()))
+            last_ring = self._rings_to_cover(row, col)
+            chunks = []
+            count = 0
+            r = 0
+            while True:
+                idx = self._ring_points(row, col, r)
+                if len(idx):
+                    chunks.append(idx)
+                    count += len(idx)
+                if count >= k:
+                    candidates = np.concatenate(chunks)
+                    dist = haversine_km(q_lats[:, None], q_lngs[:, None], self.lats[candidates][None, :], self.lngs[candidates][None, :])
+                    kth = np.partition(dist, k - 1, axis=1)[:, k - 1]
+                    # Same stopping rule as nearest(), for every query in the cell at once
+                    if (kth <= r * km_per_ring).all() or r >= last_ring:
+                        break
+                elif r >= last_ring:
+                    break
+                r += 1
+            if k < dist.shape[1]:
+                top = np.argpartition(dist, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(dist.shape[1]), (len(queries), dist.shape[1]))
+            top_dist = np.take_along_axis(dist, top, axis=1)
+            ranked = np.argsort(top_dist, axis=1, kind="stable")
+            out_idx[queries] = candidates[np.take_along_axis(top, ranked, axis=1)]
+            out_dist[queries] = np.take_along_axis(top_dist, ranked, axis=1)
+        return out_idx, out_dist
+
+    def within(self, lat: float, lng: float, radius_km: float, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Indices and distances (km) of points within radius_km, closest first"""
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        row, col = (int(v) for v in self._cell_of(lat, lng))
+        km_per_ring = self._km_per_ring(lat)
+        rings = min(self._rings_to_cover(row, col), int(math.ceil(radius_km / km_per_ring)) if km_per_ring > 0 else self._rings_to_cover(row, col))
+        chunks = [self._ring_points(row, col, r) for r in range(rings + 1)]
+        idx = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        dist = haversine_km(lat, lng, self.lats[idx], self.lngs[idx])
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        if limit is not None:
+            order = order[:limit]
+        return idx[order], dist[order]
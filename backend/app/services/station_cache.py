@@ -0,0 +1,185 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from ..core.paths import data_path, ensure_parent
+
+# Station lookup cache settings
+STATION_CACHE_PATH = os.getenv("STATION_CACHE_PATH", data_path("station_cache.json"))
+STATION_CACHE_TTL = float(os.getenv("STATION_CACHE_TTL", str(7 * 24 * 3600)))
+STATION_CACHE_NEGATIVE_TTL = float(os.getenv("STATION_CACHE_NEGATIVE_TTL", str(6 * 3600)))
+STATION_CACHE_MAX_ENTRIES = int(os.getenv("STATION_CACHE_MAX_ENTRIES", "10000"))
+# Geohash precision 6 is a ~1.2 km x 0.6 km cell, well inside the 10 km search radius
+STATION_CACHE_PRECISION = int(os.getenv("STATION_CACHE_PRECISION", "6"))
+
+SNAPSHOT_VERSION = 1
+
+# Returned by StationCache.get when nothing is cached for a bucket, so that a
+# cached "no station nearby" (None) can be told apart from a cache miss.
+MISSING = object()
+
+_GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+def geohash_encode(lat: float, lng: float, precision: int = STATION_CACHE_PRECISION) -> str:
+    """Encode coordinates as a geohash string of the given length"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if lng >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if lat >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+class StationCache:
+    """LRU + TTL cache mapping geohash buckets to the nearest OpenAQ station id"""
+
+    def __init__(
+        self,
+        max_entries: int = STATION_CACHE_MAX_ENTRIES,
+        ttl: float = STATION_CACHE_TTL,
+        negative_ttl: float = STATION_CACHE_NEGATIVE_TTL,
+        precision: int = STATION_CACHE_PRECISION,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.precision = precision
+        # bucket -> (station_id or None, expires_at as wall-clock seconds)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, lat: float, lng: float) -> str:
+        return geohash_encode(lat, lng, self.precision)
+
+    def get(self, lat: float, lng: float):
+        """Return the cached station id, None for a cached negative, or MISSING"""
+        key = self.key_for(lat, lng)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        station_id, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        if station_id is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return station_id
+
+    def set(self, lat: float, lng: float, station_id: Optional[int]):
+        """Cache a station id, or None when no station is within the search radius"""
+        ttl = self.ttl if station_id is not None else self.negative_ttl
+        key = self.key_for(lat, lng)
+        self._entries[key] = (station_id, time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    def save(self, path: str = STATION_CACHE_PATH):
+        """Write unexpired entries to disk, atomically replacing the previous snapshot"""
+        now = time.time()
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "precision": self.precision,
+            "entries": [
+                [key, station_id, expires_at]
+                for key, (station_id, expires_at) in self._entries.items()
+                if expires_at > now
+            ],
+        }
+        ensure_parent(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+        return len(snapshot["entries"])
+
+    def load(self, path: str = STATION_CACHE_PATH):
+        """Load a snapshot written by save, skipping expired entries"""
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable station cache snapshot: {e}")
+            return 0
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("precision") != self.precision:
+            return 0
+        now = time.time()
+        loaded = 0
+        # Entries were saved in LRU order, so replaying them keeps recency intact
+        for key, station_id, expires_at in snapshot.get("entries", []):
+            if expires_at > now:
+                self._entries[key] = (station_id, expires_at)
+                loaded += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return loaded
+
+# Shared cache used by get_location_id
+station_cache = StationCache()
+
+def load_station_cache():
+    """Warm the station cache from its on-disk snapshot"""
+    loaded = station_cache.load(STATION_CACHE_PATH)
+    if loaded:
+        print(f"✅ Loaded {loaded} cached station lookups")
+
+def save_station_cache():
+    """Persist the station cache so warm restarts skip the lookups"""
+    try:
+        saved = station_cache.save(STATION_CACHE_PATH)
+        print(f"Saved {saved} cached station lookups")
+    except OSError as e:
+        print(f"⚠️ Could not save station cache: {e}")
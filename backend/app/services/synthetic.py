@@ -0,0 +1,164 @@
+import argparse
+import datetime
+import json
+import sys
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+from ..core.aqi import compute_aqi
+
+# Independent random streams per (location, hour) key
+PM25, PM10, O3, NO2, CO, SO2, DAILY_AQI, DAILY_PM25, DAILY_PM10, DAILY_O3, DAILY_NO2 = range(11)
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+_LNG_MUL = np.uint64(0xD6E8FEB86659FD93)
+_HOUR_MUL = np.uint64(0xA0761D6478BD642F)
+_STREAM_MUL = 0xE7037ED1A0B428DB
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * _MIX1
+    x = (x ^ (x >> np.uint64(27))) * _MIX2
+    return x ^ (x >> np.uint64(31))
+
+def _milli(degrees) -> np.ndarray:
+    # Same truncation as int(lat * 1000); the cast keeps the two's-complement bits
+    return np.atleast_1d(np.trunc(np.asarray(degrees, dtype=np.float64) * 1000)).astype(np.int64).view(np.uint64)
+
+def keyed_uniform(lat, lng, hour, stream: int) -> np.ndarray:
+    """Uniform [0, 1) draws that depend only on (lat, lng, hour, stream).
+
+    A counter-based hash instead of a stateful generator: every element is
+    computed independently, so whole grids or time ranges come out of one
+    vectorized call, concurrent requests share no state, and a single
+    location gets the same value whether it is drawn alone or in a batch.
+    Arguments broadcast against each other.
+    """
+    lat_m, lng_m = _milli(lat), _milli(lng)
+    hours = np.atleast_1d(np.asarray(hour, dtype=np.int64)).view(np.uint64)
+    key = _splitmix64(lat_m) ^ (lng_m * _LNG_MUL)
+    key = _splitmix64(key) ^ (hours * _HOUR_MUL)
+    key = _splitmix64(key ^ np.uint64((stream * _STREAM_MUL) & 0xFFFFFFFFFFFFFFFF))
+    return (_splitmix64(key) >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+def _uniform(low: float, high: float, lat, lng, hour, stream: int) -> np.ndarray:
+    return low + (high - low) * keyed_uniform(lat, lng, hour, stream)
+
+def current_hour() -> int:
+    return int(time.time() // 3600)
+
+def synthetic_readings(lat, lng, hour) -> Dict[str, np.ndarray]:
+    """Pollutant readings, AQI and dominant pollutant for broadcast (lat, lng, hour) arrays.
+
+    Distributions match the original per-request generator: PM levels
+    follow latitude/longitude bands plus uniform noise, gases are uniform.
+    The AQI is scored on PM2.5 and PM10 only, as it always was: the gas
+    ranges are not realistic CPCB concentrations (CO would dominate).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    base_pm25 = 15 + np.mod(lat * 10, 30)
+    base_pm10 = 25 + np.mod(lng * 8, 40)
+    pm25 = np.maximum(5, base_pm25 + _uniform(-10, 20, lat, lng, hour, PM25))
+    pm10 = np.maximum(10, base_pm10 + _uniform(-15, 25, lat, lng, hour, PM10))
+    aqi, dominant = compute_aqi({"pm25": pm25, "pm10": pm10})
+    readings = {
+        "pm25": np.round(pm25, 1),
+        "pm10": np.round(pm10, 1),
+        "o3": np.round(_uniform(20, 60, lat, lng, hour, O3), 1),
+        "no2": np.round(_uniform(10, 40, lat, lng, hour, NO2), 1),
+        "co": np.round(_uniform(0.5, 2.5, lat, lng, hour, CO), 2),
+        "so2": np.round(_uniform(5, 20, lat, lng, hour, SO2), 1),
+    }
+    shape = np.broadcast_shapes(*(v.shape for v in readings.values()))
+    readings = {name: np.broadcast_to(values, shape) for name, values in readings.items()}
+    readings["aqi"] = np.broadcast_to(aqi.astype(np.int64), shape)
+    readings["dominant_pollutant"] = np.broadcast_to(dominant, shape)
+    return readings
+
+def synthetic_reading(lat: float, lng: float, hour: Optional[int] = None) -> dict:
+    """One reading in the /air-quality/current response shape"""
+    readings = synthetic_readings(lat, lng, current_hour() if hour is None else hour)
+    reading = {name: values[0].item() for name, values in readings.items() if name != "dominant_pollutant"}
+    reading["dominant_pollutant"] = readings["dominant_pollutant"][0]
+    reading["timestamp"] = datetime.datetime.utcnow().isoformat()
+    return reading
+
+def synthetic_hourly_aqi(lat: float, lng: float, hours: int, end_hour: Optional[int] = None) -> np.ndarray:
+    """Hourly AQI ending at end_hour, with morning and evening traffic peaks"""
+    end_hour = current_hour() if end_hour is None else end_hour
+    hour = np.arange(end_hour - hours + 1, end_hour + 1)
+    aqi = synthetic_readings(lat, lng, hour)["aqi"].astype(np.float64)
+    # India is UTC+5:30
+    local_hour = np.mod(hour + 5.5, 24)
+    peaks = 25 * np.exp(-((local_hour - 9) ** 2) / 6) + 35 * np.exp(-((local_hour - 21) ** 2) / 8)
+    return np.maximum(0, aqi + peaks - 15)
+
+def synthetic_daily_history(lat: float, lng: float, days: int, end_day: Optional[datetime.date] = None) -> Dict[str, np.ndarray]:
+    """Daily summaries for the `days` days ending at end_day, keyed by day"""
+    end_day = end_day or datetime.datetime.utcnow().date()
+    day = np.arange(end_day.toordinal() - days + 1, end_day.toordinal() + 1)
+    base_aqi = 50 + np.mod(lat * 10 + lng * 5, 100)
+    return {
+        "date": np.array([datetime.date.fromordinal(int(d)).isoformat() for d in day]),
+        "aqi": np.clip(base_aqi + _uniform(-30, 40, lat, lng, day, DAILY_AQI), 0, 500).astype(np.int64),
+        "pm25": np.round(_uniform(10, 50, lat, lng, day, DAILY_PM25), 1),
+        "pm10": np.round(_uniform(15, 80, lat, lng, day, DAILY_PM10), 1),
+        "o3": np.round(_uniform(20, 60, lat, lng, day, DAILY_O3), 1),
+        "no2": np.round(_uniform(10, 40, lat, lng, day, DAILY_NO2), 1),
+    }
+
+FIELDS = ("aqi", "pm25", "pm10", "o3", "no2", "co", "so2", "dominant_pollutant")
+
+def _write_chunk(out, fmt, lats, lngs, hour, readings):
+    stamp = datetime.datetime.fromtimestamp(hour * 3600, datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    columns = [lats.tolist(), lngs.tolist()] + [readings[f].tolist() for f in FIELDS]
+    lines = []
+    for row in zip(*columns):
+        if fmt == "csv":
+            lines.append(f"{stamp},{','.join(str(v) for v in row)}\n")
+        else:
+            lines.append(json.dumps({"timestamp": stamp, "lat": row[0], "lng": row[1], **dict(zip(FIELDS, row[2:]))}) + "\n")
+    out.write("".join(lines))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.services.synthetic",
+        description="Emit deterministic synthetic readings for load tests",
+    )
+    parser.add_argument("--grid", type=float, nargs=5, metavar=("LAT0", "LAT1", "LNG0", "LNG1", "STEP"),
+                        help="regular lat/lng grid instead of the Indian city list")
+    parser.add_argument("--hours", type=int, default=24, help="hours of readings per location, ending now")
+    parser.add_argument("--end-hour", type=int, default=None, help="last hour as epoch hours (default: now)")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+    parser.add_argument("--output", default="-", help="file to write (default: stdout)")
+    args = parser.parse_args(argv)
+
+    if args.grid:
+        lat0, lat1, lng0, lng1, step = args.grid
+        grid_lats, grid_lngs = np.meshgrid(np.arange(lat0, lat1 + step / 2, step), np.arange(lng0, lng1 + step / 2, step), indexing="ij")
+        lats, lngs = np.round(grid_lats.ravel(), 6), np.round(grid_lngs.ravel(), 6)
+    else:
+        from ..api.air_quality import INDIAN_CITIES
+        lats = np.array([city["lat"] for city in INDIAN_CITIES])
+        lngs = np.array([city["lng"] for city in INDIAN_CITIES])
+
+    end_hour = current_hour() if args.end_hour is None else args.end_hour
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        if args.format == "csv":
+            out.write("timestamp,lat,lng," + ",".join(FIELDS) + "\n")
+        for hour in range(end_hour - args.hours + 1, end_hour + 1):
+            # One vectorized draw per hour across every location
+            _write_chunk(out, args.format, lats, lngs, hour, synthetic_readings(lats, lngs, hour))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Wrote {len(lats) * args.hours:,} readings", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
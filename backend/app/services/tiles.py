@@ -0,0 +1,196 @@
+import math
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .interpolation import IDWInterpolator
+from .snapshot import ReadingSnapshot
+from .synthetic import current_hour, synthetic_readings
+
+# Heatmap tile settings
+TILE_SIZE = 256
+TILE_MAX_ZOOM = int(os.getenv("TILE_MAX_ZOOM", "12"))
+TILE_CACHE_PER_ZOOM = int(os.getenv("TILE_CACHE_PER_ZOOM", "512"))
+# Pixels farther than this from every reading are left transparent
+TILE_MAX_DISTANCE_KM = float(os.getenv("TILE_MAX_DISTANCE_KM", "150"))
+TILE_ALPHA = int(os.getenv("TILE_ALPHA", "150"))
+# Interpolate every Nth pixel and fill in between bilinearly
+TILE_SAMPLE_STEP = int(os.getenv("TILE_SAMPLE_STEP", "4"))
+
+KM_PER_DEG = 111.195
+# Upper AQI bound and RGB of each band, matching the map's marker colors
+AQI_BANDS = np.array([50, 100, 150, 200, 300])
+AQI_COLORS = np.array([
+    (0x00, 0x99, 0x66),
+    (0xFF, 0xDE, 0x33),
+    (0xFF, 0x99, 0x33),
+    (0xCC, 0x00, 0x33),
+    (0x66, 0x00, 0x99),
+    (0x7E, 0x00, 0x23),
+], dtype=np.uint8)
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """Encode an (height, width, 4) uint8 array as an RGBA PNG"""
+    height, width, _ = rgba.shape
+    # Filter type 0 (none) in front of every scanline
+    raw = np.concatenate([np.zeros((height, 1), dtype=np.uint8), rgba.reshape(height, width * 4)], axis=1)
+    return b"".join([
+        b"\x89PNG\r\n\x1a\n",
+        _png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)),
+        _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 6)),
+        _png_chunk(b"IEND", b""),
+    ])
+
+def tile_pixel_coordinates(z: int, x: int, y: int, size: int = TILE_SIZE, pixels: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """Latitudes of the pixel rows and longitudes of the pixel columns of a web-mercator tile"""
+    n = 2 ** z
+    pixels = np.arange(size) if pixels is None else pixels
+    offsets = (pixels + 0.5) / size
+    lngs = (x + offsets) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return lats, lngs
+
+def _linear_weights(samples: np.ndarray, size: int) -> np.ndarray:
+    """(size, len(samples)) matrix interpolating sample positions linearly onto every pixel"""
+    pixels = np.arange(size, dtype=np.float64)
+    position = np.interp(pixels, samples, np.arange(len(samples), dtype=np.float64))
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, len(samples) - 1)
+    frac = position - lower
+    weights = np.zeros((size, len(samples)))
+    weights[np.arange(size), lower] += 1 - frac
+    weights[np.arange(size), upper] += frac
+    return weights
+
+def upsample(grid: np.ndarray, samples: np.ndarray, size: int) -> np.ndarray:
+    """Bilinear resize of a sampled grid to size x size, renormalised around NaN samples"""
+    weights = _linear_weights(samples, size)
+    valid = ~np.isnan(grid)
+    total = weights @ np.where(valid, grid, 0.0) @ weights.T
+    coverage = weights @ valid.astype(np.float64) @ weights.T
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(coverage >= 0.5, total / coverage, np.nan)
+
+def colorize(aqi: np.ndarray, alpha: int = TILE_ALPHA) -> np.ndarray:
+    """RGBA pixels for an AQI grid; NaN becomes transparent"""
+    missing = np.isnan(aqi)
+    band = np.searchsorted(AQI_BANDS, np.where(missing, 0, aqi), side="left")
+    rgba = np.empty(aqi.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = AQI_COLORS[band]
+    rgba[..., 3] = np.where(missing, 0, alpha)
+    return rgba
+
+class TileRenderer:
+    """Render AQI heatmap tiles from the reading snapshot, with a per-zoom LRU cache.
+
+    Cached tiles stay valid until the data they were drawn from changes:
+    the snapshot version, or the hour when synthetic city readings stand
+    in for an empty snapshot.
+    """
+
+    def __init__(self, snapshot: ReadingSnapshot, cities: List[dict], cache_per_zoom: int = TILE_CACHE_PER_ZOOM):
+        self.snapshot = snapshot
+        self.cities = cities
+        self.cache_per_zoom = cache_per_zoom
+        self._caches: Dict[int, "OrderedDict[Tuple[int, int], bytes]"] = {}
+        self._data_version = None
+        self._points: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+        self._interpolator: Optional[IDWInterpolator] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def current_version(self):
+        """The data tiles are drawn from right now: the snapshot version, or the hour for synthetic data"""
+        if len(self.snapshot):
+            return ("snapshot", self.snapshot.version)
+        return ("synthetic", current_hour())
+
+    def _load_points(self, version) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if version[0] == "snapshot":
+            entries = [(lat, lng, reading.get("aqi")) for (lat, lng), reading in self.snapshot.items()]
+            entries = [entry for entry in entries if entry[2] is not None]
+            lats, lngs, aqi = (np.array(column, dtype=np.float64) for column in zip(*entries)) if entries else (np.empty(0),) * 3
+            return lats, lngs, aqi
+        lats = np.array([city["lat"] for city in self.cities])
+        lngs = np.array([city["lng"] for city in self.cities])
+        return lats, lngs, synthetic_readings(lats, lngs, version[1])["aqi"].astype(np.float64)
+
+    def capture(self):
+        """The current data version, with its points if tiles are not drawn from it yet.
+
+        Call on the event loop that updates the snapshot, then hand the
+        result to render in a worker thread.
+        """
+        version = self.current_version()
+        return version, None if version == self._data_version else self._load_points(version)
+
+    def _refresh(self, version, points):
+        """Drop every cached tile if the underlying readings changed"""
+        if points is not None and version != self._data_version:
+            if self._data_version is not None:
+                self.invalidations += 1
+            self._caches.clear()
+            self._points = points
+            lats, lngs, aqi = points
+            self._interpolator = IDWInterpolator(lats, lngs, {"aqi": aqi})
+            self._data_version = version
+
+    def render(self, z: int, x: int, y: int, data=None) -> bytes:
+        """PNG tile drawn from data returned by capture, taken now if not given"""
+        version, points = data if data is not None else self.capture()
+        with self._lock:
+            self._refresh(version, points)
+            cache = self._caches.setdefault(z, OrderedDict())
+            tile = cache.get((x, y))
+            if tile is not None:
+                cache.move_to_end((x, y))
+                self.hits += 1
+                return tile
+            self.misses += 1
+            version, (point_lats, point_lngs, _), interpolator = self._data_version, self._points, self._interpolator
+
+        samples = np.arange(TILE_SAMPLE_STEP / 2 - 0.5, TILE_SIZE, TILE_SAMPLE_STEP)
+        lats, lngs = tile_pixel_coordinates(z, x, y, pixels=samples)
+        # Tiles with no reading close enough to colour a pixel stay empty
+        margin = TILE_MAX_DISTANCE_KM / KM_PER_DEG
+        lng_margin = margin / max(math.cos(math.radians(min(abs(lats).max(), 89.0))), 0.01)
+        near = (
+            (point_lats >= lats.min() - margin) & (point_lats <= lats.max() + margin)
+            & (point_lngs >= lngs.min() - lng_margin) & (point_lngs <= lngs.max() + lng_margin)
+        )
+        if near.any():
+            pixel_lats, pixel_lngs = np.meshgrid(lats, lngs, indexing="ij")
+            estimates, _ = interpolator.estimate(pixel_lats.ravel(), pixel_lngs.ravel(), TILE_MAX_DISTANCE_KM)
+            grid = upsample(estimates["aqi"].reshape(len(lats), len(lngs)), samples, TILE_SIZE)
+        else:
+            grid = np.full((TILE_SIZE, TILE_SIZE), np.nan)
+        tile = encode_png(colorize(grid))
+
+        with self._lock:
+            if version == self._data_version:
+                cache = self._caches.setdefault(z, OrderedDict())
+                cache[(x, y)] = tile
+                while len(cache) > self.cache_per_zoom:
+                    cache.popitem(last=False)
+        return tile
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached_tiles": {z: len(cache) for z, cache in sorted(self._caches.items())},
+            "data_version": list(self._data_version) if self._data_version else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,73 @@
+"""
+Score synthetic backfill rows with the original scalar AQI functions and the
+vectorized CPCB engine.
+
+    python benchmarks/bench_aqi.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.core.aqi import POLLUTANTS, compute_aqi
+
+def scalar_pm25(pm25):
+    # The per-value scan used by compute_aqi_pm25 before the vectorized engine
+    breakpoints = [
+        (0, 30, 0, 50), (31, 60, 51, 100), (61, 90, 101, 200),
+        (91, 120, 201, 300), (121, 250, 301, 400), (251, 500, 401, 500),
+    ]
+    for bp_low, bp_high, i_low, i_high in breakpoints:
+        if bp_low <= pm25 <= bp_high:
+            return round(((i_high - i_low)/(bp_high - bp_low)) * (pm25 - bp_low) + i_low)
+    return 500
+
+def scalar_pm10(pm10):
+    breakpoints = [
+        (0, 50, 0, 50), (51, 100, 51, 100), (101, 250, 101, 200),
+        (251, 350, 201, 300), (351, 430, 301, 400), (431, 600, 401, 500),
+    ]
+    for bp_low, bp_high, i_low, i_high in breakpoints:
+        if bp_low <= pm10 <= bp_high:
+            return round(((i_high - i_low)/(bp_high - bp_low)) * (pm10 - bp_low) + i_low)
+    return 500
+
+def synthetic_readings(rows, rng):
+    scale = {"pm25": 120, "pm10": 200, "no2": 80, "so2": 40, "co": 2, "o3": 60, "nh3": 100, "pb": 0.5}
+    return {name: rng.gamma(2.0, scale[name] / 2, rows) for name in POLLUTANTS}
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+def main(args):
+    rng = np.random.default_rng(42)
+    readings = synthetic_readings(args.rows, rng)
+    pm25 = readings["pm25"]
+    pm10 = readings["pm10"]
+
+    # The scalar loop is slow, so it runs on a sample and is extrapolated
+    sample = min(args.rows, args.scalar_sample)
+    pm25_list = pm25[:sample].tolist()
+    pm10_list = pm10[:sample].tolist()
+    _, scalar_time = timed(lambda: [max(scalar_pm25(a), scalar_pm10(b)) for a, b in zip(pm25_list, pm10_list)])
+    scalar_rate = sample / scalar_time
+
+    _, pm_time = timed(lambda: compute_aqi({"pm25": pm25, "pm10": pm10}))
+    _, all_time = timed(lambda: compute_aqi(readings))
+
+    print(f"rows={args.rows:,}")
+    print(f"scalar pm25+pm10   {scalar_rate:14,.0f} rows/s  (est. {args.rows / scalar_rate:7.2f} s, measured on {sample:,} rows)")
+    print(f"vector pm25+pm10   {args.rows / pm_time:14,.0f} rows/s  ({pm_time:7.3f} s)")
+    print(f"vector 8 pollutants{args.rows / all_time:14,.0f} rows/s  ({all_time:7.3f} s)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--scalar-sample", type=int, default=200_000)
+    main(parser.parse_args())
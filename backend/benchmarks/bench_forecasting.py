@@ -0,0 +1,59 @@
+"""
+Refit Holt-Winters forecasts for synthetic hourly AQI series: one batched
+fit over all stations vs fitting stations one at a time, plus the holdout
+error against a naive "repeat yesterday" forecast.
+
+    python benchmarks/bench_forecasting.py --stations 141 1000 5000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.forecasting import ALPHAS, BETAS, GAMMAS, holt_winters_forecast
+
+def synthetic_series(stations, hours, rng):
+    t = np.arange(hours)
+    base = rng.uniform(40, 250, (stations, 1))
+    amplitude = rng.uniform(10, 60, (stations, 1))
+    phase = rng.uniform(0, 24, (stations, 1))
+    drift = rng.normal(0, 0.05, (stations, 1)) * t
+    noise = rng.normal(0, 12, (stations, hours))
+    series = base + amplitude * np.sin(2 * np.pi * (t - phase) / 24) + drift + noise
+    # Stations miss a few readings
+    series[rng.random((stations, hours)) < 0.05] = np.nan
+    return np.maximum(series, 0)
+
+def main(args):
+    rng = np.random.default_rng(3)
+    print(f"grid={len(ALPHAS) * len(BETAS) * len(GAMMAS)} parameter sets, history={args.hours} h, horizon=24 h")
+    for n in args.stations:
+        series = synthetic_series(n, args.hours + 24, rng)
+        train, holdout = series[:, :args.hours], series[:, args.hours:]
+
+        start = time.perf_counter()
+        forecast, band, _ = holt_winters_forecast(train, 24)
+        batched = time.perf_counter() - start
+
+        sample = min(n, args.loop_sample)
+        start = time.perf_counter()
+        for row in train[:sample]:
+            holt_winters_forecast(row[None, :], 24)
+        looped = (time.perf_counter() - start) / sample * n
+
+        mae = np.nanmean(np.abs(forecast - holdout))
+        naive_mae = np.nanmean(np.abs(train[:, -24:] - holdout))
+        inside = np.nanmean(np.abs(forecast - holdout) <= band)
+        print(f"stations={n:>6}  batched {batched:7.2f} s   one-at-a-time ~{looped:7.2f} s")
+        print(f"  holdout MAE {mae:6.1f} (naive {naive_mae:6.1f})   80% band coverage {inside:5.1%}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, nargs="+", default=[141, 1000, 5000])
+    parser.add_argument("--hours", type=int, default=336)
+    parser.add_argument("--loop-sample", type=int, default=50, help="stations timed one at a time, then extrapolated")
+    main(parser.parse_args())
@@ -0,0 +1,98 @@
+"""
+Export long history ranges from the SQLite history table: loading every
+row and serializing one response body vs the chunked NDJSON/CSV stream
+behind /air-quality/historical/export, by time and peak Python memory.
+
+    python benchmarks/bench_history_export.py --stations 5 --days 3650
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app import database
+from app.core.serialization import dumps
+from app.services import history
+from app.services.history import POLLUTANT_FIELDS, SQLiteHistoryBackend
+from app.services.history_export import stream_history_export
+
+def synthetic_rows(key, days, rng):
+    end = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    hours = days * 24
+    values = {field: rng.gamma(2.0, 30.0, hours).round(1).tolist() for field in POLLUTANT_FIELDS}
+    for h in range(hours):
+        yield {
+            "location_key": key,
+            "location_name": key,
+            "latitude": 0.0,
+            "longitude": 0.0,
+            "timestamp": (end - datetime.timedelta(hours=h)).isoformat(timespec="seconds"),
+            **{field: values[field][h] for field in POLLUTANT_FIELDS},
+        }
+
+def load_all(keys, days):
+    """The whole range read and serialized at once, as a list-building endpoint would"""
+    start = (datetime.datetime.utcnow().date() - datetime.timedelta(days=days - 1)).isoformat()
+    conn = database.get_local_db()
+    try:
+        rows = []
+        for key in keys:
+            rows.extend(dict(row) for row in conn.execute(
+                "SELECT location_key, timestamp, aqi, pm25, pm10, o3, no2, co, so2 FROM air_quality_history "
+                "WHERE location_key = ? AND timestamp >= ? ORDER BY timestamp",
+                (key, start),
+            ))
+        return len(dumps({"data": rows}))
+    finally:
+        conn.close()
+
+async def stream(keys, days, export_format):
+    size = 0
+    async for chunk in stream_history_export({key: key for key in keys}, days, POLLUTANT_FIELDS, export_format):
+        size += len(chunk)
+    return size
+
+def profile(label, fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f"  {label:16} {seconds:7.2f} s  {size / 2**20:8.1f} MiB body  peak {peak / 2**20:8.1f} MiB")
+
+async def main(args):
+    rng = np.random.default_rng(7)
+    keys = [f"{20 + s * 0.1:.2f},77.00" for s in range(args.stations)]
+    with tempfile.TemporaryDirectory() as tmp:
+        database.LOCAL_DB_PATH = os.path.join(tmp, "history.db")
+        database.init_local_database()
+        backend = SQLiteHistoryBackend()
+        for key in keys:
+            rows = list(synthetic_rows(key, args.days, rng))
+            for i in range(0, len(rows), 5000):
+                await backend.append_many(rows[i:i + 5000])
+        history.history_backend = backend
+        print(f"{args.stations} stations x {args.days} days = {args.stations * args.days * 24:,} readings")
+        profile("load all, JSON", lambda: load_all(keys, args.days))
+        for export_format in ("ndjson", "csv"):
+            start = time.perf_counter()
+            tracemalloc.start()
+            size = await stream(keys, args.days, export_format)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"  {'stream ' + export_format:16} {time.perf_counter() - start:7.2f} s  {size / 2**20:8.1f} MiB body  peak {peak / 2**20:8.1f} MiB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=5)
+    parser.add_argument("--days", type=int, default=3650)
+    asyncio.run(main(parser.parse_args()))
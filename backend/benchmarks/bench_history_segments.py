@@ -0,0 +1,107 @@
+"""
+Store hourly readings for a set of stations in the SQLite history table and
+in columnar segments, then compare bytes per reading, raw range scans and
+the per-day summary behind /historical.
+
+    python benchmarks/bench_history_segments.py --stations 50 --days 365
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app import database
+from app.services.history import POLLUTANT_FIELDS, SQLiteHistoryBackend
+from app.services.history_segments import ColumnarHistoryBackend
+
+def synthetic_rows(stations, days, rng):
+    start = datetime.datetime(2024, 1, 1)
+    hours = days * 24
+    rows = []
+    for s in range(stations):
+        key = f"{20 + s * 0.1:.2f},{77 + s * 0.1:.2f}"
+        values = {field: rng.gamma(2.0, 30.0, hours).round(1) for field in POLLUTANT_FIELDS}
+        for h in range(hours):
+            row = {
+                "location_key": key,
+                "location_name": key,
+                "latitude": 20 + s * 0.1,
+                "longitude": 77 + s * 0.1,
+                "timestamp": (start + datetime.timedelta(hours=h)).isoformat(timespec="seconds"),
+            }
+            for field in POLLUTANT_FIELDS:
+                row[field] = float(values[field][h])
+            rows.append(row)
+    return rows
+
+def sqlite_scan(key, start, end):
+    conn = database.get_local_db()
+    try:
+        return conn.execute(
+            "SELECT timestamp, aqi, pm25, pm10, o3, no2, co, so2 FROM air_quality_history "
+            "WHERE location_key = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+            (key, start, end),
+        ).fetchall()
+    finally:
+        conn.close()
+
+def timed_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+async def main(args):
+    rng = np.random.default_rng(11)
+    rows = synthetic_rows(args.stations, args.days, rng)
+    key = rows[0]["location_key"]
+    scan_start = datetime.datetime(2024, 1, 1) + datetime.timedelta(days=max(args.days - args.window, 0))
+    start, end = scan_start.isoformat(), (scan_start + datetime.timedelta(days=args.window)).isoformat()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.LOCAL_DB_PATH = os.path.join(tmp, "history.db")
+        database.init_local_database()
+        sqlite_backend = SQLiteHistoryBackend()
+        columnar = ColumnarHistoryBackend(os.path.join(tmp, "segments"), segment_rows=args.segment_rows)
+
+        t = time.perf_counter()
+        for i in range(0, len(rows), 5000):
+            await sqlite_backend.append_many(rows[i:i + 5000])
+        sqlite_write = time.perf_counter() - t
+        t = time.perf_counter()
+        for i in range(0, len(rows), 5000):
+            await columnar.append_many(rows[i:i + 5000])
+        columnar.seal_all()
+        columnar_write = time.perf_counter() - t
+
+        sqlite_bytes = os.path.getsize(database.LOCAL_DB_PATH)
+        columnar_bytes = columnar.disk_bytes()
+        n = len(rows)
+        print(f"{args.stations} stations x {args.days} days = {n:,} readings")
+        print(f"  write     sqlite {sqlite_write:8.2f} s    columnar {columnar_write:8.2f} s")
+        print(f"  size      sqlite {sqlite_bytes / n:8.1f} B/reading  columnar {columnar_bytes / n:8.1f} B/reading")
+
+        scan_sqlite = timed_ms(lambda: sqlite_scan(key, start, end), args.repeat)
+        scan_columnar = timed_ms(lambda: columnar.scan(key, start, end), args.repeat)
+        print(f"  {args.window}-day scan   sqlite {scan_sqlite:8.2f} ms   columnar {scan_columnar:8.3f} ms")
+
+        daily_sqlite = timed_ms(lambda: sqlite_backend._daily(key, start, end), args.repeat)
+        daily_columnar = timed_ms(lambda: columnar._daily(key, start, end), args.repeat)
+        print(f"  {args.window}-day daily  sqlite {daily_sqlite:8.2f} ms   columnar {daily_columnar:8.3f} ms")
+        columnar.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stations", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--window", type=int, default=90, help="days covered by each range query")
+    parser.add_argument("--segment-rows", type=int, default=4096)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,107 @@
+"""
+Parse OpenAQ measurement responses: the old path (json.loads of a
+limit=100 body, then a loop) vs the streaming parser that stops once all
+six pollutants are seen, on full and narrowed (limit=24, pollutant
+filter) payloads. Pass --payload to use a recorded response instead of
+the generated one.
+
+    python benchmarks/bench_measurement_parse.py --chunk-size 4096
+    python benchmarks/bench_measurement_parse.py --payload recorded_measurements.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.measurement_stream import POLLUTANTS, read_latest_measurements, summarise_measurements
+
+UNITS = {"pm25": "µg/m³", "pm10": "µg/m³", "o3": "µg/m³", "no2": "µg/m³", "co": "µg/m³", "so2": "µg/m³",
+         "temperature": "c", "relativehumidity": "%", "wind_speed": "m/s"}
+
+def generated_payload(limit, parameters, rng):
+    """An OpenAQ-shaped measurements body: hourly rows, newest first, several parameters per hour"""
+    now = datetime.datetime(2024, 11, 5, 12, tzinfo=datetime.timezone.utc)
+    rows = []
+    hour = 0
+    while len(rows) < limit:
+        when = now - datetime.timedelta(hours=hour)
+        for parameter in rng.sample(parameters, len(parameters)):
+            rows.append({
+                "locationId": 8118,
+                "location": "Anand Vihar, New Delhi - DPCC",
+                "parameter": parameter,
+                "value": round(rng.uniform(5, 400), 2),
+                "date": {"utc": when.isoformat(), "local": (when + datetime.timedelta(hours=5, minutes=30)).isoformat()},
+                "unit": UNITS[parameter],
+                "coordinates": {"latitude": 28.646835, "longitude": 77.316032},
+                "country": "IN",
+                "city": "Delhi",
+                "isMobile": False,
+                "isAnalysis": None,
+                "entity": "Governmental Organization",
+                "sensorType": "reference grade",
+            })
+        hour += 1
+    meta = {"name": "openaq-api", "license": "CC BY 4.0d", "website": "https://api.openaq.org", "page": 1, "limit": limit, "found": 48213}
+    return json.dumps({"meta": meta, "results": rows[:limit]}, ensure_ascii=False).encode("utf-8")
+
+async def _chunks(body, size):
+    for i in range(0, len(body), size):
+        yield body[i:i + size]
+
+def time_full(body, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        summary = summarise_measurements(body)
+    return (time.perf_counter() - start) / repeat, len(body), summary
+
+def time_streaming(body, repeat, chunk_size):
+    async def run():
+        summary = None
+        start = time.perf_counter()
+        for _ in range(repeat):
+            read = 0
+
+            async def counted():
+                nonlocal read
+                async for chunk in _chunks(body, chunk_size):
+                    read += len(chunk)
+                    yield chunk
+
+            summary = await read_latest_measurements(counted())
+        return (time.perf_counter() - start) / repeat, read, summary
+    return asyncio.run(run())
+
+def main(args):
+    rng = random.Random(7)
+    if args.payload:
+        with open(args.payload, "rb") as f:
+            payloads = [("recorded", f.read())]
+    else:
+        payloads = [
+            ("limit=100, all parameters", generated_payload(100, list(UNITS), rng)),
+            ("limit=24, pollutants only", generated_payload(24, list(POLLUTANTS), rng)),
+        ]
+    baseline = None
+    for name, body in payloads:
+        full, full_bytes, expected = time_full(body, args.repeat)
+        stream, stream_bytes, summary = time_streaming(body, args.repeat, args.chunk_size)
+        assert summary.values == expected.values, "streaming parser disagrees with json.loads"
+        baseline = baseline or (full, full_bytes)
+        print(f"{name}: {len(body) / 1024:.1f} KiB, {len(summary.values)} pollutants found")
+        print(f"  json.loads  {full * 1e6:8.1f} µs  {full_bytes:>7} bytes read")
+        print(f"  streaming   {stream * 1e6:8.1f} µs  {stream_bytes:>7} bytes read"
+              f"   ({baseline[0] / stream:.1f}x faster, {baseline[1] / stream_bytes:.1f}x fewer bytes than the old path)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payload", help="recorded OpenAQ measurements response (JSON file)")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="bytes per network chunk fed to the streaming parser")
+    parser.add_argument("--repeat", type=int, default=2000)
+    main(parser.parse_args())
@@ -0,0 +1,165 @@
+"""
+Compare a fresh httpx client per OpenAQ call against the shared pooled client.
+
+Each simulated /air-quality/current request makes the same two upstream calls
+as the API (station lookup, then measurements) against a local stand-in
+server, so the difference is purely connection setup.
+
+    python benchmarks/bench_openaq_client.py --requests 500 --concurrency 20 --tls
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.services.openaq_client import create_openaq_client
+
+def build_stand_in_app(latency_ms: float):
+    """Tiny OpenAQ stand-in answering the two calls made by /current"""
+    async def locations(request):
+        await asyncio.sleep(latency_ms / 1000)
+        return JSONResponse({"results": [{"id": 8118}]})
+
+    async def measurements(request):
+        await asyncio.sleep(latency_ms / 1000)
+        return JSONResponse({"results": [
+            {"parameter": "pm25", "value": 42.0, "date": {"utc": "2024-01-01T00:00:00Z"}},
+            {"parameter": "pm10", "value": 80.0, "date": {"utc": "2024-01-01T00:00:00Z"}},
+        ]})
+
+    return Starlette(routes=[
+        Route("/v2/locations", locations),
+        Route("/v3/measurements", measurements),
+    ])
+
+def write_self_signed_cert(directory: str):
+    """Generate a throwaway localhost certificate so the TLS handshake is measured too"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    import ipaddress
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        ))
+    return cert_path, key_path
+
+def start_server(app, port: int, cert_path=None, key_path=None):
+    config = uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="error",
+        ssl_certfile=cert_path, ssl_keyfile=key_path,
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def simulated_current(client: httpx.AsyncClient, base: str):
+    resp = await client.get(f"{base}/v2/locations?coordinates=28.61,77.20&radius=10000&limit=1")
+    resp.raise_for_status()
+    location_id = resp.json()["results"][0]["id"]
+    resp = await client.get(f"{base}/v3/measurements?location_id={location_id}&limit=100")
+    resp.raise_for_status()
+    return resp.json()
+
+async def run_scenario(name, total, concurrency, call):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{name:<10} p50={statistics.median(latencies):7.2f} ms  p99={p99:7.2f} ms  rps={total / elapsed:8.1f}")
+
+async def main(args):
+    scheme = "https" if args.tls else "http"
+    base = f"{scheme}://127.0.0.1:{args.port}"
+    verify = True
+    if args.tls:
+        verify = ssl.create_default_context(cafile=args.cert_path)
+
+    async def per_call():
+        # Mirrors the original code: a brand-new client for every upstream call
+        async with httpx.AsyncClient(verify=verify) as client:
+            resp = await client.get(f"{base}/v2/locations?coordinates=28.61,77.20&radius=10000&limit=1")
+            resp.raise_for_status()
+        async with httpx.AsyncClient(verify=verify) as client:
+            resp = await client.get(f"{base}/v3/measurements?location_id=8118&limit=100")
+            resp.raise_for_status()
+
+    pooled_client = create_openaq_client(host=base, verify=verify, http2=args.http2)
+
+    async def pooled():
+        await simulated_current(pooled_client, base)
+
+    print(f"{args.requests} simulated /current requests, concurrency={args.concurrency}, {scheme}")
+    await run_scenario("per-call", args.requests, args.concurrency, per_call)
+    await run_scenario("pooled", args.requests, args.concurrency, pooled)
+    await pooled_client.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tls", action="store_true", help="Serve over TLS with a self-signed certificate")
+    parser.add_argument("--http2", action="store_true", help="Enable HTTP/2 on the pooled client (needs h2)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path = key_path = None
+        if args.tls:
+            cert_path, key_path = write_self_signed_cert(tmp)
+        args.cert_path = cert_path
+        server = start_server(build_stand_in_app(args.latency_ms), args.port, cert_path, key_path)
+        try:
+            asyncio.run(main(args))
+        finally:
+            server.should_exit = True
@@ -0,0 +1,119 @@
+"""
+Serialization CPU per request and bytes on the wire, before and after the
+fast JSON path and response compression.
+
+"before" is FastAPI's default route (jsonable_encoder + json for plain
+results) with no compression; "after" is FastJSONRoute behind
+CompressionMiddleware. Requests go through an in-process ASGI transport,
+so the CPU time covers routing, serialization and compression but no
+sockets.
+
+    python benchmarks/bench_serialization.py --requests 200
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import sys
+import time
+from typing import List
+
+import httpx
+from bson import ObjectId
+from fastapi import APIRouter, FastAPI
+from fastapi.routing import APIRoute
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.air_quality import INDIAN_CITIES
+from app.core.compression import CompressionMiddleware, brotli_available
+from app.core.serialization import FastJSONRoute, orjson_available
+from app.models import NotificationResponse
+from app.services.synthetic import synthetic_reading
+
+NOW = datetime.datetime(2024, 11, 5, 12, 0, tzinfo=datetime.timezone.utc)
+
+def notifications(count):
+    user_id = ObjectId()
+    return [
+        {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "title": f"AQI alert for {city['name']}",
+            "message": f"Air quality in {city['name']} is unhealthy; limit outdoor activity.",
+            "notification_type": "aqi_alert",
+            "priority": "high",
+            "location_name": city["name"],
+            "aqi_value": 150 + i % 200,
+            "is_read": i % 3 == 0,
+            "created_at": NOW - datetime.timedelta(minutes=i),
+        }
+        for i, city in enumerate(INDIAN_CITIES[:count])
+    ]
+
+def build_app(route_class, compress):
+    router = APIRouter(route_class=route_class)
+    rows = notifications(100)
+    models = [NotificationResponse(**row) for row in rows]
+    readings = [
+        {"city": city["name"], "lat": city["lat"], "lng": city["lng"], "updated_at": NOW, **synthetic_reading(city["lat"], city["lng"], 12)}
+        for city in INDIAN_CITIES
+    ]
+
+    def cities():
+        return {"cities": INDIAN_CITIES, "total_count": len(INDIAN_CITIES)}
+
+    def city_readings():
+        return {"readings": readings, "count": len(readings)}
+
+    def notification_models():
+        return models
+
+    def notification_documents():
+        return {"notifications": rows, "count": len(rows)}
+
+    router.add_api_route("/cities", cities)
+    router.add_api_route("/readings", city_readings)
+    router.add_api_route("/notifications", notification_models, response_model=List[NotificationResponse])
+    router.add_api_route("/notification-documents", notification_documents)
+    app = FastAPI()
+    app.include_router(router)
+    if compress:
+        app.add_middleware(CompressionMiddleware)
+    return app
+
+async def measure(app, path, encoding, requests):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Accept-Encoding": encoding}
+        try:
+            response = await client.get(path, headers=headers)
+            response.raise_for_status()
+        except Exception as e:
+            return None, f"{type(e).__name__}"
+        wire = response.num_bytes_downloaded
+        start = time.process_time()
+        for _ in range(requests):
+            await client.get(path, headers=headers)
+        return (time.process_time() - start) / requests, wire
+
+async def main(args):
+    print(f"orjson={orjson_available()} brotli={brotli_available()}")
+    variants = [("before", build_app(APIRoute, False), "identity")]
+    after = build_app(FastJSONRoute, True)
+    variants += [("after", after, "identity"), ("after", after, "gzip")]
+    if brotli_available():
+        variants.append(("after", after, "br"))
+    for path in ("/cities", "/readings", "/notifications", "/notification-documents"):
+        print(path)
+        for label, app, encoding in variants:
+            seconds, wire = await measure(app, path, encoding, args.requests)
+            if seconds is None:
+                print(f"  {label:6} {encoding:8}  failed: {wire}")
+                continue
+            print(f"  {label:6} {encoding:8} {seconds * 1e6:9.0f} µs CPU/request {wire / 1024:9.1f} KiB on the wire")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+Encode the city snapshot for map clients: a list of reading dicts vs the
+column-encoded full snapshot vs deltas at several levels of churn, by
+body size and encoding time.
+
+    python benchmarks/bench_snapshot_feed.py --cities 141 5000 --churn 0.01 0.1
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.snapshot import ReadingSnapshot
+from app.services.snapshot_feed import SnapshotFeed
+
+def reading(rng):
+    return {
+        "aqi": rng.randint(20, 450),
+        "pm25": round(rng.uniform(5, 300), 2),
+        "pm10": round(rng.uniform(10, 500), 2),
+        "o3": round(rng.uniform(5, 120), 2),
+        "no2": round(rng.uniform(5, 150), 2),
+        "co": round(rng.uniform(0.2, 4), 2),
+        "so2": round(rng.uniform(2, 60), 2),
+        "dominant_pollutant": rng.choice(["pm25", "pm10", "no2"]),
+        "timestamp": "2024-11-05T12:00:00+00:00",
+    }
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        body = fn()
+    return (time.perf_counter() - start) / repeat, len(body)
+
+def main(args):
+    rng = random.Random(11)
+    for n in args.cities:
+        snapshot = ReadingSnapshot()
+        points = [(rng.uniform(8, 35), rng.uniform(68, 97)) for _ in range(n)]
+        for lat, lng in points:
+            snapshot.put(lat, lng, reading(rng))
+        # Caching is disabled so every call pays the encoding cost
+        feed = SnapshotFeed(snapshot, cache_size=0)
+
+        def dicts():
+            return json.dumps([{"lat": lat, "lng": lng, **r} for (lat, lng), r in snapshot.items()]).encode()
+
+        seconds, size = timed(dicts, args.repeat)
+        print(f"cities={n}")
+        print(f"  list of dicts     {size / 1024:8.1f} KiB  {seconds * 1000:7.2f} ms")
+        seconds, size = timed(lambda: feed.body(), args.repeat)
+        print(f"  columns, full     {size / 1024:8.1f} KiB  {seconds * 1000:7.2f} ms")
+        for churn in args.churn:
+            version = snapshot.version
+            for lat, lng in rng.sample(points, max(1, int(n * churn))):
+                snapshot.put(lat, lng, reading(rng))
+            seconds, size = timed(lambda: feed.body(version, snapshot.epoch), args.repeat)
+            print(f"  delta, {churn:5.1%} churn {size / 1024:8.1f} KiB  {seconds * 1000:7.2f} ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cities", type=int, nargs="+", default=[141, 5000])
+    parser.add_argument("--churn", type=float, nargs="+", default=[0.01, 0.1, 0.5])
+    parser.add_argument("--repeat", type=int, default=50)
+    main(parser.parse_args())
@@ -0,0 +1,70 @@
+"""
+Nearest-city and radius queries over synthetic gazetteers: grid index
+(per query and cell-batched) vs a full scan (the list-of-dicts loop and a
+vectorized NumPy scan).
+
+    python benchmarks/bench_spatial_index.py --sizes 10000 100000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from app.services.spatial_index import GridIndex, haversine_km
+
+def python_scan_nearest(cities, lat, lng, k):
+    # What a linear scan over INDIAN_CITIES dicts costs per lookup
+    def dist(c):
+        p1, p2 = math.radians(lat), math.radians(c["lat"])
+        a = math.sin((p2 - p1) / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(c["lng"] - lng) / 2) ** 2
+        return 2 * 6371.0088 * math.asin(math.sqrt(a))
+    return sorted(cities, key=dist)[:k]
+
+def numpy_scan_nearest(lats, lngs, lat, lng, k):
+    d = haversine_km(lat, lng, lats, lngs)
+    top = np.argpartition(d, k - 1)[:k]
+    return top[np.argsort(d[top])]
+
+def per_query_us(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(*q)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+def main(args):
+    rng = np.random.default_rng(7)
+    # Queries land inside India's bounding box, like user GPS fixes
+    queries = list(zip(rng.uniform(8, 35, args.queries).tolist(), rng.uniform(68, 97, args.queries).tolist()))
+    for n in args.sizes:
+        lats = rng.uniform(8, 35, n)
+        lngs = rng.uniform(68, 97, n)
+        cities = [{"lat": a, "lng": b} for a, b in zip(lats.tolist(), lngs.tolist())]
+
+        start = time.perf_counter()
+        index = GridIndex(lats, lngs)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        py_queries = queries[: max(1, args.queries // 20)]
+        print(f"n={n:,}  build={build_ms:.1f} ms  cell={index.cell_deg:.3f} deg")
+        print(f"  nearest-{args.k:<3} python scan {per_query_us(lambda a, b: python_scan_nearest(cities, a, b, args.k), py_queries):12.1f} us/query")
+        print(f"  nearest-{args.k:<3} numpy scan  {per_query_us(lambda a, b: numpy_scan_nearest(lats, lngs, a, b, args.k), queries):12.1f} us/query")
+        print(f"  nearest-{args.k:<3} grid index  {per_query_us(lambda a, b: index.nearest(a, b, args.k), queries):12.1f} us/query")
+        q_lats, q_lngs = (np.array(v) for v in zip(*queries))
+        start = time.perf_counter()
+        index.nearest_many(q_lats, q_lngs, args.k)
+        print(f"  nearest-{args.k:<3} grid batch  {(time.perf_counter() - start) / len(queries) * 1e6:12.1f} us/query")
+        print(f"  within {args.radius:.0f} km numpy scan  {per_query_us(lambda a, b: np.nonzero(haversine_km(a, b, lats, lngs) <= args.radius), queries):10.1f} us/query")
+        print(f"  within {args.radius:.0f} km grid index  {per_query_us(lambda a, b: index.within(a, b, args.radius), queries):10.1f} us/query")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--radius", type=float, default=50.0)
+    main(parser.parse_args())
@@ -0,0 +1,281 @@
+"""
+Local OpenAQ stand-in for running the API without network access.
+
+Serves the three calls the backend makes (v2/locations, v3/measurements,
+v3/forecast) with deterministic generated payloads, or with recorded ones
+from --fixtures. A recorded response is looked up first by the exact
+query (<endpoint>-<hash>.json), then per endpoint (<endpoint>.json).
+With --record, requests are forwarded to --upstream and every response is
+saved in that layout for later replay.
+
+Latency, server errors and 429s can be injected, and changed while the
+server runs by POSTing JSON to /_faults; /_stats reports what was served.
+
+    python benchmarks/fake_openaq.py --port 8100 --latency-ms 40 --jitter-ms 20 --error-rate 0.02 --throttle-rate 0.01
+    OPENAQ_BASE_URL=http://127.0.0.1:8100 USE_LOCAL_DB=true uvicorn app.main:app
+
+    python benchmarks/fake_openaq.py --record fixtures/ --upstream https://api.openaq.org
+    python benchmarks/fake_openaq.py --fixtures fixtures/
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import hashlib
+import os
+import random
+import threading
+import time
+import zlib
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+ENDPOINTS = {"/v2/locations": "locations", "/v3/measurements": "measurements", "/v3/forecast": "forecast"}
+POLLUTANTS = ("pm25", "pm10", "o3", "no2", "co", "so2")
+UNITS = {"pm25": "µg/m³", "pm10": "µg/m³", "o3": "µg/m³", "no2": "µg/m³", "co": "µg/m³", "so2": "µg/m³"}
+TYPICAL = {"pm25": 80.0, "pm10": 150.0, "o3": 40.0, "no2": 35.0, "co": 900.0, "so2": 12.0}
+
+class Faults:
+    """Injected latency and failures; every field can be changed at runtime through /_faults"""
+
+    FIELDS = ("latency_ms", "jitter_ms", "slow_rate", "slow_ms", "error_rate", "error_status",
+              "throttle_rate", "retry_after", "rate_per_minute", "no_station_rate")
+    INTEGER_FIELDS = ("error_status", "retry_after", "rate_per_minute")
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, slow_rate=0.0, slow_ms=2000.0, error_rate=0.0, error_status=503,
+                 throttle_rate=0.0, retry_after=5, rate_per_minute=0, no_station_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.rate_per_minute = rate_per_minute
+        self.no_station_rate = no_station_rate
+
+    def update(self, values: dict):
+        for name, value in values.items():
+            if name not in self.FIELDS:
+                raise ValueError(f"Unknown fault setting: {name}")
+            setattr(self, name, int(value) if name in self.INTEGER_FIELDS else float(value))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+def _stable_unit(*parts) -> float:
+    """Deterministic value in [0, 1) for the given parts"""
+    return zlib.crc32(repr(parts).encode()) / 2**32
+
+def generated_locations(lat: float, lng: float, no_station_rate: float) -> dict:
+    # Stations are spread on a ~0.1 degree grid, so nearby cities share one
+    cell = (round(lat, 1), round(lng, 1))
+    if _stable_unit("station", cell) < no_station_rate:
+        return {"meta": {"found": 0}, "results": []}
+    location_id = 10000 + zlib.crc32(repr(cell).encode()) % 900000
+    return {"meta": {"found": 1}, "results": [{
+        "id": location_id,
+        "name": f"Station {location_id}",
+        "coordinates": {"latitude": cell[0], "longitude": cell[1]},
+        "country": "IN",
+    }]}
+
+def generated_measurements(location_id: int, parameters, limit: int) -> dict:
+    now = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    rows = []
+    hour = 0
+    while len(rows) < limit:
+        when = now - datetime.timedelta(hours=hour)
+        for parameter in parameters:
+            level = TYPICAL.get(parameter, 50.0) * (0.4 + 1.2 * _stable_unit(location_id, parameter, when.isoformat()))
+            rows.append({
+                "locationId": location_id,
+                "parameter": parameter,
+                "value": round(level, 2),
+                "unit": UNITS.get(parameter, "µg/m³"),
+                "date": {"utc": when.isoformat().replace("+00:00", "Z")},
+            })
+        hour += 1
+    return {"meta": {"limit": limit, "found": limit}, "results": rows[:limit]}
+
+def generated_forecast(location_id: int) -> dict:
+    start = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    rows = []
+    for hour in range(24):
+        when = start + datetime.timedelta(hours=hour)
+        level = TYPICAL["pm25"] * (0.5 + _stable_unit(location_id, "forecast", when.isoformat()))
+        rows.append({"parameter": "pm25", "value": round(level, 1), "date": {"utc": when.isoformat().replace("+00:00", "Z")}})
+    return {"meta": {"found": 24}, "results": rows}
+
+class FakeOpenAQ:
+    """The stand-in server's state: faults, fixtures, recording and counters"""
+
+    def __init__(self, faults: Faults, fixtures_dir=None, record_dir=None, upstream="https://api.openaq.org", seed=0):
+        self.faults = faults
+        self.fixtures_dir = fixtures_dir
+        self.record_dir = record_dir
+        self.upstream = upstream.rstrip("/")
+        self.rng = random.Random(seed)
+        self.client = None
+        self.counts = {name: {"requests": 0, "ok": 0, "errors": 0, "throttled": 0, "no_station": 0, "replayed": 0} for name in ENDPOINTS.values()}
+        self._tokens = None
+        self._refilled = time.monotonic()
+
+    @staticmethod
+    def query_key(endpoint: str, request: Request) -> str:
+        query = sorted(request.query_params.multi_items())
+        return f"{endpoint}-{hashlib.sha1(repr(query).encode()).hexdigest()[:12]}"
+
+    def _fixture(self, endpoint: str, request: Request):
+        if not self.fixtures_dir:
+            return None
+        for name in (self.query_key(endpoint, request), endpoint):
+            path = os.path.join(self.fixtures_dir, f"{name}.json")
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    return f.read()
+        return None
+
+    def _rate_limited(self) -> bool:
+        rate = self.faults.rate_per_minute
+        if rate <= 0:
+            return False
+        # Bucket of ten seconds' worth of requests, full at start
+        capacity = max(1.0, rate / 6.0)
+        now = time.monotonic()
+        tokens = capacity if self._tokens is None else self._tokens
+        self._tokens = min(capacity, tokens + (now - self._refilled) * rate / 60.0)
+        self._refilled = now
+        if self._tokens < 1:
+            return True
+        self._tokens -= 1
+        return False
+
+    async def _delay(self):
+        faults = self.faults
+        delay = faults.latency_ms + (self.rng.expovariate(1 / faults.jitter_ms) if faults.jitter_ms > 0 else 0)
+        if faults.slow_rate > 0 and self.rng.random() < faults.slow_rate:
+            delay += faults.slow_ms
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+    def _generated(self, endpoint: str, request: Request) -> dict:
+        params = request.query_params
+        if endpoint == "locations":
+            lat, lng = (float(part) for part in params.get("coordinates", "0,0").split(","))
+            return generated_locations(lat, lng, self.faults.no_station_rate)
+        location_id = int(params.get("location_id", 0))
+        if endpoint == "measurements":
+            parameters = params.getlist("parameter") or list(POLLUTANTS)
+            return generated_measurements(location_id, parameters, int(params.get("limit", 100)))
+        return generated_forecast(location_id)
+
+    async def _record(self, endpoint: str, request: Request) -> Response:
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=30)
+        headers = {key: value for key, value in request.headers.items() if key.lower() == "x-api-key"}
+        upstream = await self.client.get(f"{self.upstream}{request.url.path}", params=request.query_params.multi_items(), headers=headers)
+        if upstream.status_code == 200:
+            os.makedirs(self.record_dir, exist_ok=True)
+            for name in (self.query_key(endpoint, request), endpoint):
+                with open(os.path.join(self.record_dir, f"{name}.json"), "wb") as f:
+                    f.write(upstream.content)
+        return Response(upstream.content, status_code=upstream.status_code, media_type="application/json")
+
+    async def handle(self, request: Request) -> Response:
+        endpoint = ENDPOINTS[request.url.path]
+        counts = self.counts[endpoint]
+        counts["requests"] += 1
+        await self._delay()
+        faults = self.faults
+        if self._rate_limited() or (faults.throttle_rate > 0 and self.rng.random() < faults.throttle_rate):
+            counts["throttled"] += 1
+            return JSONResponse({"detail": "Too Many Requests"}, status_code=429, headers={"Retry-After": str(faults.retry_after)})
+        if faults.error_rate > 0 and self.rng.random() < faults.error_rate:
+            counts["errors"] += 1
+            return JSONResponse({"detail": "injected failure"}, status_code=faults.error_status)
+        if self.record_dir:
+            response = await self._record(endpoint, request)
+            counts["ok" if response.status_code == 200 else "errors"] += 1
+            return response
+        body = self._fixture(endpoint, request)
+        if body is not None:
+            counts["replayed"] += 1
+            counts["ok"] += 1
+            return Response(body, media_type="application/json")
+        payload = self._generated(endpoint, request)
+        if endpoint == "locations" and not payload["results"]:
+            counts["no_station"] += 1
+        counts["ok"] += 1
+        return JSONResponse(payload)
+
+    async def faults_endpoint(self, request: Request) -> Response:
+        if request.method == "POST":
+            try:
+                self.faults.update(await request.json())
+            except (ValueError, TypeError) as e:
+                return JSONResponse({"detail": str(e)}, status_code=400)
+        return JSONResponse(self.faults.as_dict())
+
+    async def stats_endpoint(self, request: Request) -> Response:
+        return JSONResponse({"faults": self.faults.as_dict(), "endpoints": self.counts})
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+def build_app(fake: FakeOpenAQ) -> Starlette:
+    routes = [Route(path, fake.handle) for path in ENDPOINTS]
+    routes.append(Route("/_faults", fake.faults_endpoint, methods=["GET", "POST"]))
+    routes.append(Route("/_stats", fake.stats_endpoint))
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        await fake.close()
+
+    return Starlette(routes=routes, lifespan=lifespan)
+
+def start_in_thread(app, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Run the stand-in on a background thread; set server.should_exit to stop it"""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="error"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="fixed delay added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="mean of an exponential extra delay")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of responses delayed by --slow-ms more")
+    parser.add_argument("--slow-ms", type=float, default=2000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of responses failing with --error-status")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="share of responses answered 429")
+    parser.add_argument("--retry-after", type=int, default=5, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--rate-per-minute", type=int, default=0, help="answer 429 above this request rate (0 = unlimited)")
+    parser.add_argument("--no-station-rate", type=float, default=0.0, help="share of coordinates with no station nearby")
+
+def faults_from_args(args) -> Faults:
+    return Faults(**{name: getattr(args, name) for name in Faults.FIELDS})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--fixtures", help="directory of recorded responses to replay")
+    parser.add_argument("--record", help="forward to --upstream and save responses in this directory")
+    parser.add_argument("--upstream", default="https://api.openaq.org")
+    parser.add_argument("--seed", type=int, default=0)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    fake = FakeOpenAQ(faults_from_args(args), args.fixtures, args.record, args.upstream, args.seed)
+    print(f"🧪 Fake OpenAQ on http://{args.host}:{args.port} (set OPENAQ_BASE_URL to use it)")
+    uvicorn.run(build_app(fake), host=args.host, port=args.port, log_level="warning")
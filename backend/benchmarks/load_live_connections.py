@@ -0,0 +1,175 @@
+"""
+Load test for live AQI subscriptions.
+
+First times an in-process fan-out: one reading change delivered to N
+subscriber queues. Then holds N idle Server-Sent Events connections
+against a single uvicorn worker (spawned here with the local database
+and no ingestion, or an already running server via --url) and reports
+connect rate, heartbeats received, failures and the server's memory.
+
+    python benchmarks/load_live_connections.py --connections 10000
+    python benchmarks/load_live_connections.py --url http://127.0.0.1:8000 --connections 2000 --hold 60
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.parse
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+from app.services.live import LiveHub
+from app.services.snapshot import ReadingSnapshot
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+async def fanout(connections, keys):
+    snapshot = ReadingSnapshot()
+    hub = LiveHub(snapshot, fetch=None, covered=lambda key: True)
+    subscriptions = [hub.subscribe([(20.0 + i % keys, 78.0)]) for i in range(connections)]
+    start = time.perf_counter()
+    for k in range(keys):
+        snapshot.put(20.0 + k, 78.0, {"aqi": 150, "pm25": 61.2, "timestamp": "now"})
+    publish = time.perf_counter() - start
+    start = time.perf_counter()
+    for subscription in subscriptions:
+        await subscription.get(0)
+    drain = time.perf_counter() - start
+    print(f"in-process fan-out: {connections} subscribers over {keys} locations")
+    print(f"  publish {publish * 1000:7.1f} ms ({publish / connections * 1e6:.2f} µs/subscriber), drain {drain * 1000:7.1f} ms")
+    await hub.close()
+
+def spawn_server(port):
+    env = dict(os.environ, USE_LOCAL_DB="true", INGEST_ENABLED="false", LIVE_HEARTBEAT_INTERVAL="5")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", "1", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(f"{url}/air-quality/stats", timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("server did not start")
+
+def server_rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return None
+
+def live_stats(url):
+    with urllib.request.urlopen(f"{url}/air-quality/stats", timeout=30) as resp:
+        return json.load(resp)["live"]
+
+class Connection:
+    def __init__(self):
+        self.events = 0
+        self.pings = 0
+        self.closed = False
+
+async def hold_connection(host, port, path, connection, opened, stop):
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+    except OSError:
+        connection.closed = True
+        opened.release()
+        return
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: text/event-stream\r\n\r\n".encode())
+    counted = False
+    try:
+        status = await reader.readline()
+        if b" 200 " not in status:
+            raise ConnectionError(status)
+        opened.release()
+        counted = True
+        while not stop.is_set():
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b"data:"):
+                connection.events += 1
+            elif line.startswith(b": ping"):
+                connection.pings += 1
+    except (OSError, ConnectionError):
+        pass
+    finally:
+        if not counted:
+            opened.release()
+        connection.closed = True
+        writer.close()
+
+async def idle_connections(url, count, cities, hold, ramp, pid):
+    parsed = urllib.parse.urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    with urllib.request.urlopen(f"{url}/air-quality/indian-cities?limit={cities}", timeout=30) as resp:
+        names = [city["name"] for city in json.load(resp)["cities"]]
+    baseline = server_rss_mb(pid) if pid else None
+    connections = [Connection() for _ in range(count)]
+    opened = asyncio.Semaphore(0)
+    stop = asyncio.Event()
+    start = time.perf_counter()
+    tasks = []
+    for i, connection in enumerate(connections):
+        path = "/air-quality/live?" + urllib.parse.urlencode({"cities": names[i % len(names)]})
+        tasks.append(asyncio.create_task(hold_connection(host, port, path, connection, opened, stop)))
+        if ramp and i % ramp == ramp - 1:
+            await asyncio.sleep(0)
+    for _ in connections:
+        await opened.acquire()
+    connect = time.perf_counter() - start
+    alive = sum(not c.closed for c in connections)
+    print(f"idle SSE connections: {alive}/{count} open after {connect:.1f} s ({count / connect:.0f} connections/s)")
+    await asyncio.sleep(hold)
+    stats = await asyncio.to_thread(live_stats, url)
+    alive = sum(not c.closed for c in connections)
+    print(f"  after {hold:.0f} s: {alive} open, {sum(c.events for c in connections)} readings, "
+          f"{sum(c.pings for c in connections)} heartbeats received")
+    print(f"  server hub: {stats}")
+    if pid:
+        rss = server_rss_mb(pid)
+        print(f"  server RSS {rss:.0f} MiB ({(rss - baseline) * 1024 / max(alive, 1):.1f} KiB per connection)")
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+def main(args):
+    limit = raise_fd_limit()
+    if args.connections * (1 if args.url else 2) + 100 > limit:
+        print(f"⚠️ open-file limit is {limit}; some connections may fail")
+    asyncio.run(fanout(args.connections, args.cities))
+    process = None
+    url = args.url
+    if url is None:
+        process, url = spawn_server(args.port)
+    try:
+        asyncio.run(idle_connections(url, args.connections, args.cities, args.hold, args.ramp, process.pid if process else None))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--cities", type=int, default=20, help="distinct cities the connections subscribe to")
+    parser.add_argument("--hold", type=float, default=15, help="seconds to keep the connections idle")
+    parser.add_argument("--ramp", type=int, default=200, help="connections opened per event-loop turn")
+    parser.add_argument("--url", help="running server to test instead of spawning one")
+    parser.add_argument("--port", type=int, default=8765)
+    main(parser.parse_args())
@@ -0,0 +1,365 @@
+"""
+End-to-end load test of the API with local stand-ins.
+
+Boots app.main:app in a uvicorn subprocess (SQLite mode via USE_LOCAL_DB,
+background ingestion off, OpenAQ pointed at benchmarks/fake_openaq.py,
+all state in a temporary directory) and replays the frontend's call mix
+from frontend/src/services/api.js: current, forecast, historical,
+indian-cities, login, /users/me and notifications. Each concurrency
+level runs closed-loop clients for a fixed time and reports requests per
+second and p50/p95/p99 latency per route, plus the server's event-loop
+lag sampled inside the server process. With --isolate every route is
+run on its own, so loop lag can be attributed to a route.
+
+Results can be saved as JSON and compared with an earlier run; the
+comparison exits non-zero when a route got slower than --threshold.
+
+    python benchmarks/load_test.py --levels 1 8 32 --duration 15 --save before.json
+    python benchmarks/load_test.py --levels 1 8 32 --duration 15 --save after.json --compare before.json
+    python benchmarks/load_test.py --compare before.json --against after.json
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+
+import httpx
+
+# Share of each call in the mix, following how the dashboard uses api.js
+CALL_MIX = {
+    "current": 30,
+    "forecast": 12,
+    "historical": 10,
+    "indian-cities": 15,
+    "login": 3,
+    "users/me": 10,
+    "notifications": 20,
+}
+AUTH_ROUTES = ("login", "users/me", "notifications")
+
+class LoopLagSampler:
+    """Sleep for a fixed interval in a loop and record how late each wake-up is"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def report(self, reset: bool = False) -> dict:
+        samples, count = sorted(self.samples), len(self.samples)
+        if reset:
+            self.samples = []
+        if not count:
+            return {"samples": 0}
+        return {
+            "samples": count,
+            "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+            "p50_ms": round(percentile(samples, 50) * 1000, 3),
+            "p99_ms": round(percentile(samples, 99) * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+def serve(port: int):
+    """Server side of the test: the app plus a loop-lag sampler and a route to read it"""
+    import uvicorn
+    from app.main import app
+
+    sampler = LoopLagSampler()
+
+    @app.get("/_loop_lag", include_in_schema=False)
+    def loop_lag(reset: bool = False):
+        return sampler.report(reset)
+
+    async def main():
+        sampler.start()
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        await server.serve()
+
+    asyncio.run(main())
+
+def spawn_app(port: int, openaq_url: str, workdir: str, args):
+    env = dict(
+        os.environ,
+        USE_LOCAL_DB="true",
+        INGEST_ENABLED="false" if not args.ingest else "true",
+        OPENAQ_BASE_URL=openaq_url,
+        PYTHONPATH=BACKEND_DIR,
+    )
+    if not args.real_quota:
+        # The load test measures the API, not the OpenAQ budget
+        env.update(OPENAQ_RATE_PER_MINUTE="1000000", OPENAQ_BURST="100000")
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", "--port", str(port)], cwd=workdir, env=env)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(150):
+        if process.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            urllib.request.urlopen(f"{url}/health", timeout=1)
+            return process, url
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("app did not start")
+
+class Session:
+    """What the simulated users need: city coordinates and an auth token"""
+
+    def __init__(self, cities, token=None, skipped=None):
+        self.cities = cities
+        self.token = token
+        self.skipped = skipped
+
+async def prepare(client: httpx.AsyncClient) -> Session:
+    resp = await client.get("/air-quality/indian-cities")
+    resp.raise_for_status()
+    cities = [(city["lat"], city["lng"]) for city in resp.json()["cities"]]
+    email = f"load-{uuid.uuid4().hex[:10]}@example.com"
+    password = "load-test-password"
+    try:
+        resp = await client.post("/users/register", json={"email": email, "username": email.split("@")[0], "password": password})
+        if resp.status_code != 200:
+            raise RuntimeError(f"register returned {resp.status_code}")
+        token = resp.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(20):
+            await client.post("/notifications/", headers=headers, json={
+                "title": f"AQI alert {i}", "message": "Air quality is unhealthy", "notification_type": "aqi_alert",
+            })
+    except (httpx.HTTPError, RuntimeError, KeyError, ValueError) as e:
+        print(f"⚠️ Could not set up a test user ({e}); skipping {', '.join(AUTH_ROUTES)}")
+        return Session(cities, skipped=str(e))
+    session = Session(cities, token)
+    session.email, session.password = email, password
+    return session
+
+def request_for(route: str, session: Session, rng: random.Random):
+    """(method, path, kwargs) of one call, with the arguments the frontend would send"""
+    lat, lng = rng.choice(session.cities)
+    auth = {"headers": {"Authorization": f"Bearer {session.token}"}}
+    if route == "current":
+        return "GET", "/air-quality/current", {"params": {"lat": lat, "lng": lng}}
+    if route == "forecast":
+        return "GET", "/air-quality/forecast", {"params": {"lat": lat, "lng": lng}}
+    if route == "historical":
+        return "GET", "/air-quality/historical", {"params": {"lat": lat, "lng": lng, "days": 7}}
+    if route == "indian-cities":
+        return "GET", "/air-quality/indian-cities", {}
+    if route == "login":
+        return "POST", "/users/login", {"json": {"email": session.email, "password": session.password}}
+    if route == "users/me":
+        return "GET", "/users/me", auth
+    return "GET", "/notifications/", {**auth, "params": {"limit": 50}}
+
+async def run_level(url, session, routes, concurrency, duration, warmup, seed):
+    weights = [CALL_MIX[route] for route in routes]
+    latencies = {route: [] for route in routes}
+    statuses = {route: {} for route in routes}
+    errors = {route: 0 for route in routes}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    # Loop lag is read on its own connection so it never queues behind the load
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client, \
+            httpx.AsyncClient(base_url=url, timeout=30) as control:
+        measuring = False
+        deadline = time.perf_counter() + warmup + duration
+
+        async def user(index):
+            rng = random.Random(seed * 1000 + index)
+            while time.perf_counter() < deadline:
+                route = rng.choices(routes, weights)[0]
+                method, path, kwargs = request_for(route, session, rng)
+                start = time.perf_counter()
+                try:
+                    resp = await client.request(method, path, **kwargs)
+                    status = resp.status_code
+                except httpx.HTTPError:
+                    status = "error"
+                elapsed = time.perf_counter() - start
+                if measuring:
+                    statuses[route][status] = statuses[route].get(status, 0) + 1
+                    if status == 200:
+                        latencies[route].append(elapsed)
+                    else:
+                        errors[route] += 1
+
+        users = [asyncio.create_task(user(i)) for i in range(concurrency)]
+        await asyncio.sleep(warmup)
+        await control.get("/_loop_lag", params={"reset": "true"})
+        measuring = True
+        started = time.perf_counter()
+        await asyncio.gather(*users)
+        elapsed = time.perf_counter() - started
+        lag = (await control.get("/_loop_lag", params={"reset": "true"})).json()
+
+    result = {"concurrency": concurrency, "seconds": round(elapsed, 2), "loop_lag": lag, "routes": {}}
+    total = 0
+    for route in routes:
+        values = sorted(latencies[route])
+        count = len(values) + errors[route]
+        total += count
+        result["routes"][route] = {
+            "requests": count,
+            "rps": round(count / elapsed, 1),
+            "errors": errors[route],
+            "statuses": {str(status): n for status, n in statuses[route].items()},
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    result["rps"] = round(total / elapsed, 1)
+    return result
+
+def print_level(label, result):
+    lag = result["loop_lag"]
+    print(f"{label} concurrency={result['concurrency']}: {result['rps']:.0f} req/s, loop lag "
+          f"p50={lag.get('p50_ms', 0):.2f} p99={lag.get('p99_ms', 0):.2f} max={lag.get('max_ms', 0):.2f} ms")
+    for route, stats in result["routes"].items():
+        print(f"  {route:14} {stats['rps']:8.1f} req/s  p50 {stats['p50_ms']:8.2f}  p95 {stats['p95_ms']:8.2f}  "
+              f"p99 {stats['p99_ms']:8.2f} ms  errors {stats['errors']}")
+
+async def run(args, url):
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        session = await prepare(client)
+    routes = [route for route in CALL_MIX if session.token or route not in AUTH_ROUTES]
+    scenarios = [("mix", routes)] + ([(route, [route]) for route in routes] if args.isolate else [])
+    results = {"mix": [], **({route: [] for route in routes} if args.isolate else {})}
+    for concurrency in args.levels:
+        for name, scenario_routes in scenarios:
+            result = await run_level(url, session, scenario_routes, concurrency, args.duration, args.warmup, args.seed)
+            results[name].append(result)
+            print_level(name, result)
+    return {"skipped": session.skipped, "scenarios": results}
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict, threshold: float) -> int:
+    """Print per-route changes between two saved runs; returns the number of regressions"""
+    regressions = 0
+    print(f"comparing {current.get('revision')} against {baseline.get('revision')} (threshold {threshold:.0%})")
+    for scenario, levels in current["scenarios"].items():
+        before_levels = {level["concurrency"]: level for level in baseline["scenarios"].get(scenario, [])}
+        for level in levels:
+            before = before_levels.get(level["concurrency"])
+            if before is None:
+                continue
+            print(f"{scenario} concurrency={level['concurrency']}: {before['rps']:.0f} -> {level['rps']:.0f} req/s")
+            for route, stats in level["routes"].items():
+                old = before["routes"].get(route)
+                if old is None or not old["requests"]:
+                    continue
+                changes = []
+                worse = False
+                for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                    change = (stats[metric] - old[metric]) / old[metric] if old[metric] else 0.0
+                    changes.append(f"{metric[:-3]} {old[metric]:.1f}->{stats[metric]:.1f} ({change:+.0%})")
+                    worse |= metric != "p50_ms" and change > threshold
+                rps_change = (stats["rps"] - old["rps"]) / old["rps"] if old["rps"] else 0.0
+                worse |= rps_change < -threshold
+                regressions += worse
+                print(f"  {'❌' if worse else '  '} {route:14} rps {rps_change:+.0%}  " + "  ".join(changes))
+    print(f"{regressions} regression(s)")
+    return regressions
+
+def main(args):
+    if args.against:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        with open(args.against) as f:
+            current = json.load(f)
+        return 1 if compare(baseline, current, args.threshold) else 0
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import fake_openaq
+
+    processes = []
+    fake_server = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            url = args.url
+            if url is None:
+                openaq_url = args.openaq_url
+                if openaq_url is None:
+                    fake = fake_openaq.FakeOpenAQ(fake_openaq.faults_from_args(args), seed=args.seed)
+                    fake_server = fake_openaq.start_in_thread(fake_openaq.build_app(fake), args.openaq_port)
+                    openaq_url = f"http://127.0.0.1:{args.openaq_port}"
+                process, url = spawn_app(args.port, openaq_url, workdir, args)
+                processes.append(process)
+            scenarios = asyncio.run(run(args, url))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.wait()
+            if fake_server is not None:
+                fake_server.should_exit = True
+
+    result = {
+        "revision": git_revision(),
+        "started_at": datetime.datetime.utcnow().isoformat(timespec="seconds"),
+        "args": {key: value for key, value in vars(args).items() if key not in ("serve", "compare", "against", "save")},
+        **scenarios,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"💾 Saved results to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            return 1 if compare(json.load(f), result, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 8, 32, 64], help="concurrent clients per level")
+    parser.add_argument("--duration", type=float, default=15, help="measured seconds per level")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before each level")
+    parser.add_argument("--isolate", action="store_true", help="also run every route on its own")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--url", help="running API to test instead of spawning one")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--openaq-url", help="OpenAQ stand-in to use instead of starting one")
+    parser.add_argument("--openaq-port", type=int, default=8767)
+    parser.add_argument("--ingest", action="store_true", help="keep background ingestion on in the spawned app")
+    parser.add_argument("--real-quota", action="store_true", help="keep the default OpenAQ rate limit in the spawned app")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="earlier results JSON to compare with")
+    parser.add_argument("--against", help="compare --compare with this saved JSON instead of running")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fake_openaq import add_fault_arguments
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.port)
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Run against the local stores with no background work or shared state files
+os.environ.setdefault("USE_LOCAL_DB", "true")
+os.environ.setdefault("INGEST_ENABLED", "false")
+os.environ.setdefault("HISTORY_ENABLED", "false")
+os.environ.setdefault("QUOTA_STATE_PATH", "")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+import asyncio
+import datetime
+
+import numpy as np
+
+from app.services import forecasting
+from app.services.forecasting import ForecastEngine
+from app.services.history import location_key
+from app.services.synthetic import synthetic_hourly_aqi
+
+def fake_history(monkeypatch):
+    async def hourly_history(keys, hours):
+        end = np.datetime64(datetime.datetime.utcnow(), "h")
+        labels = [str(end - np.timedelta64(h, "h")) for h in range(hours - 1, -1, -1)]
+        return {key: (labels, synthetic_hourly_aqi(10.0 + i, 70.0, hours).tolist()) for i, key in enumerate(keys)}
+    monkeypatch.setattr(forecasting, "hourly_history", hourly_history)
+
+def test_no_confidence_before_any_fit():
+    assert ForecastEngine().confidence(28.6, 77.2, 24) is None
+
+def test_upstream_confidence_uses_the_location_band(monkeypatch):
+    fake_history(monkeypatch)
+    engine = ForecastEngine()
+    keys = [location_key(28.6, 77.2), location_key(19.07, 72.87)]
+    asyncio.run(engine._load_and_fit(keys))
+
+    own = engine.confidence(28.6, 77.2, 24)
+    assert own == engine.get(28.6, 77.2)["confidence"]
+    # Widens with the horizon, like the model's own forecasts
+    assert own[-1] > own[0] > 0
+
+def test_upstream_confidence_falls_back_to_the_typical_band(monkeypatch):
+    fake_history(monkeypatch)
+    engine = ForecastEngine()
+    asyncio.run(engine._load_and_fit([location_key(28.6, 77.2), location_key(19.07, 72.87)]))
+
+    band = engine.confidence(12.97, 77.59, 30)
+    assert len(band) == 30
+    assert band[24:] == [band[23]] * 6
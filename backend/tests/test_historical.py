@@ -0,0 +1,31 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import air_quality
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_history(lat, lng, days):
+        return []
+
+    monkeypatch.setattr(air_quality, "daily_history", no_history)
+    app = FastAPI()
+    app.include_router(air_quality.router)
+    return TestClient(app)
+
+def test_long_ranges_are_clamped_not_rejected(client):
+    response = client.get("/air-quality/historical", params={"lat": 28.6, "lng": 77.2, "days": 1000})
+    assert response.status_code == 200
+    assert response.headers["X-History-Days"] == str(air_quality.HISTORY_MAX_DAYS)
+    assert len(response.json()["data"]) == air_quality.HISTORY_MAX_DAYS
+
+def test_ranges_within_the_limit_are_untouched(client):
+    response = client.get("/air-quality/historical", params={"lat": 28.6, "lng": 77.2, "days": 30})
+    assert "X-History-Days" not in response.headers
+    assert len(response.json()["data"]) == 30
+
+def test_empty_ranges_return_no_data(client):
+    response = client.get("/air-quality/historical", params={"lat": 28.6, "lng": 77.2, "days": 0})
+    assert response.status_code == 200
+    assert response.json() == {"data": []}
@@ -0,0 +1,105 @@
+import asyncio
+import datetime
+import os
+import random
+
+import numpy as np
+import pytest
+
+from app import database
+from app.services.history import POLLUTANT_FIELDS, SQLiteHistoryBackend
+from app.services.history_segments import TAIL_LOG, ColumnarHistoryBackend
+
+START = datetime.datetime(2024, 1, 1)
+RANGE = ("2024-01-01T00:00:00", "2024-03-01T00:00:00")
+
+def hourly_rows(key: str, hours: int, offset: int = 0) -> list:
+    return [
+        {
+            "location_key": key,
+            "location_name": key,
+            "latitude": 0.0,
+            "longitude": 0.0,
+            "timestamp": (START + datetime.timedelta(hours=offset + i)).isoformat(),
+            **{field: float(offset + i) for field in POLLUTANT_FIELDS},
+        }
+        for i in range(hours)
+    ]
+
+def write_shuffled(backend, rows: list, batch: int = 17, seed: int = 7):
+    rows = list(rows)
+    random.Random(seed).shuffle(rows)
+    for i in range(0, len(rows), batch):
+        asyncio.run(backend.append_many(rows[i:i + batch]))
+
+@pytest.fixture
+def sqlite_backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "LOCAL_DB_PATH", str(tmp_path / "history.db"))
+    database.init_local_database()
+    return SQLiteHistoryBackend()
+
+@pytest.mark.parametrize("segment_rows", [4096, 10])
+def test_shuffled_batches_keep_every_reading(tmp_path, segment_rows):
+    backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=segment_rows)
+    write_shuffled(backend, hourly_rows("k", 95))
+
+    ts, columns = backend.scan("k", *RANGE)
+    assert len(ts) == 95
+    assert np.all(np.diff(ts) == 3600)
+    assert columns["aqi"].tolist() == [float(i) for i in range(95)]
+
+def test_only_repeated_timestamps_are_dropped(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=10)
+    asyncio.run(backend.append_many(hourly_rows("k", 30)))
+    repeats = hourly_rows("k", 30)
+    for row in repeats:
+        row["aqi"] = -1.0
+    write_shuffled(backend, repeats)
+
+    ts, columns = backend.scan("k", *RANGE)
+    assert len(ts) == 30
+    # The first reading stored for a timestamp wins, like INSERT OR IGNORE
+    assert (columns["aqi"] >= 0).all()
+
+def test_tail_survives_a_crash(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=10)
+    write_shuffled(backend, hourly_rows("k", 25))
+    assert TAIL_LOG in os.listdir(backend._dir("k"))
+
+    # No close(): the tail only exists in the log
+    reopened = ColumnarHistoryBackend(str(tmp_path), segment_rows=10)
+    ts, columns = reopened.scan("k", *RANGE)
+    assert len(ts) == 25
+    assert columns["pm25"].tolist() == [float(i) for i in range(25)]
+
+def test_short_segments_are_compacted_on_open(tmp_path):
+    for restart in range(3):
+        backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=10)
+        asyncio.run(backend.append_many(hourly_rows("k", 3, offset=3 * restart)))
+        backend.seal_all()
+        backend.close()
+
+    backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=10)
+    ts, _ = backend.scan("k", *RANGE)
+    assert len(ts) == 9
+    assert len(backend._load_segments("k")) == 1
+    assert len([name for name in os.listdir(backend._dir("k")) if name.endswith(".seg")]) == 1
+
+def test_open_locations_are_bounded(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path), segment_rows=4, open_locations=2)
+    for key in "abcd":
+        asyncio.run(backend.append_many(hourly_rows(key, 6)))
+    assert len(backend._segments) == 2
+    assert len(backend.scan("a", *RANGE)[0]) == 6
+
+def test_daily_summary_matches_sqlite(tmp_path, sqlite_backend):
+    columnar = ColumnarHistoryBackend(str(tmp_path / "segments"), segment_rows=16)
+    rows = hourly_rows("k", 24 * 5)
+    write_shuffled(columnar, rows)
+    write_shuffled(sqlite_backend, rows)
+
+    expected = asyncio.run(sqlite_backend.daily_summary("k", *RANGE))
+    actual = asyncio.run(columnar.daily_summary("k", *RANGE))
+    assert [day["day"] for day in actual] == [day["day"] for day in expected]
+    assert [day["samples"] for day in actual] == [day["samples"] for day in expected]
+    assert [day["aqi"] for day in actual] == pytest.approx([day["aqi"] for day in expected])
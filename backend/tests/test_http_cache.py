@@ -0,0 +1,93 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.responses import Response, StreamingResponse
+
+from app.api import air_quality
+from app.core.http_cache import NO_STORE, CachePolicy, HTTPCacheMiddleware
+from app.services.forecasting import ForecastEngine
+
+def cached_client(app: FastAPI, policies: dict) -> TestClient:
+    return TestClient(HTTPCacheMiddleware(app, policies))
+
+def test_content_etag_and_304():
+    app = FastAPI()
+    calls = []
+
+    @app.get("/data")
+    def data():
+        calls.append(1)
+        return {"value": 1}
+
+    client = cached_client(app, {"/data": CachePolicy(60)})
+    first = client.get("/data")
+    assert first.status_code == 200
+    assert first.headers["cache-control"] == "public, max-age=60"
+    etag = first.headers["etag"]
+
+    again = client.get("/data", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["etag"] == etag
+    assert client.get("/data", headers={"If-None-Match": '"other"'}).status_code == 200
+    assert len(calls) == 3
+
+def test_versioned_304_skips_the_route():
+    app = FastAPI()
+    calls = []
+    version = {"value": 1}
+
+    @app.get("/tiles/{z}")
+    def tile(z: int):
+        calls.append(z)
+        return {"z": z}
+
+    client = cached_client(app, {"/tiles/": CachePolicy(300, version=lambda: version["value"])})
+    etag = client.get("/tiles/3").headers["etag"]
+    assert client.get("/tiles/3", headers={"If-None-Match": etag}).status_code == 304
+    assert calls == [3]
+
+    version["value"] = 2
+    assert client.get("/tiles/3", headers={"If-None-Match": etag}).status_code == 200
+    assert calls == [3, 3]
+
+def test_no_store_errors_and_streams_are_not_validated():
+    app = FastAPI()
+
+    @app.get("/private")
+    def private():
+        return {"secret": True}
+
+    @app.get("/missing")
+    def missing():
+        return Response(status_code=404, content=b"{}")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b"]), media_type="text/plain")
+
+    client = cached_client(app, {"/private": NO_STORE, "/missing": CachePolicy(60), "/stream": CachePolicy(60)})
+    private_response = client.get("/private")
+    assert private_response.headers["cache-control"] == "no-store"
+    assert "etag" not in private_response.headers
+    assert "etag" not in client.get("/missing").headers
+    streamed = client.get("/stream")
+    assert streamed.content == b"ab"
+    assert "etag" not in streamed.headers
+
+def test_mock_forecast_revalidates(monkeypatch):
+    async def no_upstream(lat, lng, client=None):
+        return None
+
+    monkeypatch.setattr(air_quality, "get_real_forecast_data", no_upstream)
+    monkeypatch.setattr(air_quality, "forecast_engine", ForecastEngine())
+    app = FastAPI()
+    app.include_router(air_quality.router)
+    client = cached_client(app, air_quality.CACHE_POLICIES)
+
+    first = client.get("/air-quality/forecast", params={"lat": 12.34, "lng": 77.1})
+    assert first.status_code == 200
+    assert first.json()["timestamp"].endswith(":00:00")
+    # Another worker has its own engine; it must produce the same body for the same hour
+    monkeypatch.setattr(air_quality, "forecast_engine", ForecastEngine())
+    again = client.get("/air-quality/forecast", params={"lat": 12.34, "lng": 77.1}, headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api import air_quality
+from app.core.metrics import FALLBACK_RESPONSES
+
+@pytest.fixture
+def client(monkeypatch):
+    async def no_upstream(lat, lng, client=None):
+        return None
+
+    monkeypatch.setattr(air_quality, "get_real_air_quality_data", no_upstream)
+    app = FastAPI()
+    app.include_router(air_quality.router)
+    return TestClient(app)
+
+def test_live_refresh_never_publishes_mock_data(client):
+    mock = FALLBACK_RESPONSES.labels("current", "mock").value
+    # Far from every city: no live reading and nothing to interpolate from
+    assert asyncio.run(air_quality.LIVE_HUB.fetch(-60.0, -100.0)) is None
+    assert FALLBACK_RESPONSES.labels("current", "mock").value == mock
+
+def test_socket_reports_invalid_messages(client):
+    with client.websocket_connect("/air-quality/ws") as socket:
+        socket.send_text("[]")
+        assert socket.receive_json() == {"type": "error", "detail": "Invalid message: Expected a JSON object"}
+        socket.send_json({"locations": ["not a point"]})
+        assert socket.receive_json()["type"] == "error"
+        socket.send_json({"cities": [air_quality.INDIAN_CITIES[0]["name"]]})
+        socket.send_json({"locations": ["91,0"]})
+        assert socket.receive_json()["type"] == "error"
+        assert air_quality.LIVE_HUB.stats()["subscriptions"] == 1
+    assert air_quality.LIVE_HUB.stats()["subscriptions"] == 0
+
+def test_socket_closes_when_sending_fails(client, monkeypatch):
+    async def failing_send(self, data):
+        raise RuntimeError("send failed")
+
+    # The first heartbeat is sent straight away and fails
+    monkeypatch.setattr(air_quality, "LIVE_HEARTBEAT_INTERVAL", 0)
+    monkeypatch.setattr(air_quality.WebSocket, "send_text", failing_send)
+    with client.websocket_connect("/air-quality/ws") as socket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            socket.receive_text()
+    assert closed.value.code == 1011
+    assert air_quality.LIVE_HUB.stats()["subscriptions"] == 0
@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services import quota
+from app.services.quota import BACKFILL, BACKGROUND, INTERACTIVE, QuotaExceededError, QuotaScheduler
+
+# Slow enough that nothing refills during a test
+RATE_PER_MINUTE = 0.6
+
+def scheduler(path=None, **kwargs):
+    return QuotaScheduler(rate_per_minute=RATE_PER_MINUTE, burst=10, path=path, **kwargs)
+
+def test_reserves_leave_headroom_for_higher_priorities():
+    budget = scheduler()
+    # Backfill must leave 60% of the burst, background 30%, interactive nothing
+    assert sum(budget.try_acquire(BACKFILL) for _ in range(10)) == 4
+    assert sum(budget.try_acquire(BACKGROUND) for _ in range(10)) == 3
+    assert sum(budget.try_acquire(INTERACTIVE) for _ in range(10)) == 3
+    assert budget.stats()["granted"] == {INTERACTIVE: 3, BACKGROUND: 3, BACKFILL: 4}
+    assert budget.stats()["tokens"] == 0
+
+def test_acquire_gives_up_past_the_priority_maximum():
+    budget = scheduler(max_waits={INTERACTIVE: 1.0, BACKGROUND: 1.0, BACKFILL: 1.0})
+    for _ in range(10):
+        asyncio.run(budget.acquire(INTERACTIVE))
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(budget.acquire(INTERACTIVE))
+    assert budget.stats()["rejected"][INTERACTIVE] == 1
+    assert budget.stats()["granted"][INTERACTIVE] == 10
+
+def test_penalize_blocks_every_priority(monkeypatch):
+    monkeypatch.setattr(quota, "QUOTA_DEFAULT_BACKOFF", 60)
+    budget = scheduler()
+    asyncio.run(budget.penalize(None))
+    assert not budget.try_acquire(INTERACTIVE)
+    with pytest.raises(QuotaExceededError):
+        asyncio.run(budget.acquire(INTERACTIVE))
+    stats = budget.stats()
+    assert stats["throttled"] == 1
+    assert 59 <= stats["blocked_for_seconds"] <= 60
+
+def test_seconds_for_counts_only_the_usable_burst():
+    budget = scheduler()
+    # Background may use 7 of the 10 tokens; the rest come at 0.01 per second
+    assert budget.seconds_for(7, BACKGROUND) == 0
+    assert budget.seconds_for(17, BACKGROUND) == pytest.approx(1000)
+
+@pytest.mark.skipif(quota.fcntl is None, reason="shared state needs fcntl")
+def test_workers_share_one_budget_through_the_state_file(tmp_path):
+    path = str(tmp_path / "quota.json")
+    first, second = scheduler(path), scheduler(path)
+    assert sum(first.try_acquire(INTERACTIVE) for _ in range(6)) == 6
+    assert sum(second.try_acquire(INTERACTIVE) for _ in range(6)) == 4
+    asyncio.run(second.penalize(30))
+    assert first.stats()["blocked_for_seconds"] > 0
+
+@pytest.mark.skipif(quota.fcntl is None, reason="shared state needs fcntl")
+def test_a_held_file_lock_does_not_stall_the_event_loop(tmp_path):
+    path = str(tmp_path / "quota.json")
+    budget = scheduler(path)
+    # Another worker holds the lock for a while
+    other = open(path, "a+")
+    quota.fcntl.flock(other, quota.fcntl.LOCK_EX)
+    release = threading.Timer(0.3, lambda: quota.fcntl.flock(other, quota.fcntl.LOCK_UN))
+    release.start()
+
+    async def main():
+        start = time.monotonic()
+        assert not budget.try_acquire(INTERACTIVE)
+        assert time.monotonic() - start < 0.1
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        ticker = asyncio.create_task(tick())
+        await budget.acquire(INTERACTIVE)
+        ticker.cancel()
+        return ticks
+
+    try:
+        assert asyncio.run(main()) >= 10
+    finally:
+        release.join()
+        other.close()
+    assert budget.stats()["granted"][INTERACTIVE] == 1
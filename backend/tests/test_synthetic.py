@@ -0,0 +1,61 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.api.air_quality import INDIAN_CITIES
+from app.services.synthetic import synthetic_reading, synthetic_readings
+
+HOURS = np.arange(480000, 480200)
+# CPCB AQI categories: good, satisfactory, moderate, poor, very poor, severe
+CATEGORY_EDGES = [50, 100, 200, 300, 400]
+
+def legacy_pm_aqi(value: float, breakpoints) -> int:
+    for bp_low, bp_high, i_low, i_high in breakpoints:
+        if value <= bp_high:
+            value = max(value, bp_low)
+            return round(((i_high - i_low) / (bp_high - bp_low)) * (value - bp_low) + i_low)
+    return 500
+
+PM25_BANDS = [(0, 30, 0, 50), (31, 60, 51, 100), (61, 90, 101, 200), (91, 120, 201, 300), (121, 250, 301, 400), (251, 500, 401, 500)]
+PM10_BANDS = [(0, 50, 0, 50), (51, 100, 51, 100), (101, 250, 101, 200), (251, 350, 201, 300), (351, 430, 301, 400), (431, 600, 401, 500)]
+
+def legacy_reading(lat: float, lng: float, hour: int) -> dict:
+    """The original per-request mock generator, with its seeded global RNG"""
+    rng = random.Random(int(lat * 1000) + int(lng * 1000) + hour)
+    pm25 = max(5, 15 + (lat * 10) % 30 + rng.uniform(-10, 20))
+    pm10 = max(10, 25 + (lng * 8) % 40 + rng.uniform(-15, 25))
+    return {"aqi": max(legacy_pm_aqi(pm25, PM25_BANDS), legacy_pm_aqi(pm10, PM10_BANDS)), "pm25": pm25, "pm10": pm10}
+
+@pytest.fixture(scope="module")
+def distributions():
+    lats = np.array([city["lat"] for city in INDIAN_CITIES])
+    lngs = np.array([city["lng"] for city in INDIAN_CITIES])
+    synthetic = synthetic_readings(lats[:, None], lngs[:, None], HOURS[None, :])
+    legacy = [legacy_reading(lat, lng, int(hour)) for lat, lng in zip(lats, lngs) for hour in HOURS]
+    return synthetic, {name: np.array([reading[name] for reading in legacy]) for name in ("aqi", "pm25", "pm10")}
+
+def test_aqi_distribution_matches_the_original_generator(distributions):
+    synthetic, legacy = distributions
+    aqi = synthetic["aqi"].ravel()
+    assert aqi.mean() == pytest.approx(legacy["aqi"].mean(), abs=1.0)
+    assert aqi.std() == pytest.approx(legacy["aqi"].std(), abs=1.0)
+    shares = np.bincount(np.searchsorted(CATEGORY_EDGES, aqi), minlength=6) / aqi.size
+    legacy_shares = np.bincount(np.searchsorted(CATEGORY_EDGES, legacy["aqi"]), minlength=6) / legacy["aqi"].size
+    assert shares == pytest.approx(legacy_shares, abs=0.01)
+
+def test_pm_distribution_matches_the_original_generator(distributions):
+    synthetic, legacy = distributions
+    for name in ("pm25", "pm10"):
+        assert synthetic[name].mean() == pytest.approx(legacy[name].mean(), abs=0.5)
+
+def test_gases_never_drive_the_mock_aqi(distributions):
+    synthetic, _ = distributions
+    assert set(np.unique(synthetic["dominant_pollutant"]).tolist()) <= {"pm25", "pm10"}
+
+def test_same_reading_alone_or_in_a_batch():
+    city = INDIAN_CITIES[0]
+    batch = synthetic_readings([city["lat"], 0.0], [city["lng"], 0.0], int(HOURS[0]))
+    reading = synthetic_reading(city["lat"], city["lng"], int(HOURS[0]))
+    assert reading["aqi"] == batch["aqi"][0]
+    assert reading["pm25"] == batch["pm25"][0]
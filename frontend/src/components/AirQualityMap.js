@@ -2,6 +2,7 @@ import React, { useEffect, useRef } from 'react';
 import { MapContainer, TileLayer, Marker, Popup, Circle } from 'react-leaflet';
 import L from 'leaflet';
 import { Box, Typography, Chip } from '@mui/material';
+import { AQI_TILE_URL } from '../services/api';
 
 // Fix for default markers in React Leaflet
 delete L.Icon.Default.prototype._getIconUrl;
@@ -50,6 +51,8 @@ const AirQualityMap = ({ center, airQualityData }) => {
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
           attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
         />
+        {/* AQI heatmap interpolated from the latest city readings */}
+        <TileLayer url={AQI_TILE_URL} maxNativeZoom={12} opacity={0.6} />
         
         {airQualityData && (
           <Marker position={center}>
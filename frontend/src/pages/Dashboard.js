@@ -1,4 +1,4 @@
-import React, { useState, useMemo, useCallback } from 'react';
+import React, { useState, useMemo, useCallback, useEffect } from 'react';
 import {
   Container,
   Grid,
@@ -9,7 +9,7 @@ import {
   Tab,
   Box,
 } from '@mui/material';
-import { useQuery } from '@tanstack/react-query';
+import { useQuery, useQueryClient } from '@tanstack/react-query';
 
 import AirQualityCard from '../components/AirQualityCard';
 import AirQualityMap from '../components/AirQualityMap';
@@ -17,7 +17,7 @@ import ForecastChart from '../components/ForecastChart';
 import HistoricalChart from '../components/HistoricalChart';
 import LocationSearch from '../components/LocationSearch';
 import IndianCitiesBrowser from '../components/IndianCitiesBrowser';
-import { fetchAirQualityData, fetchForecastData } from '../services/api';
+import { fetchAirQualityData, fetchForecastData, subscribeAirQuality } from '../services/api';
 
 // Tab Panel component
 function TabPanel({ children, value, index, ...other }) {
@@ -42,13 +42,21 @@ const Dashboard = () => {
   });
   
   const [activeTab, setActiveTab] = useState(0);
+  const queryClient = useQueryClient();
 
   const { data: airQualityData, isLoading: aqiLoading, error: aqiError } = useQuery({
     queryKey: ['airQuality', selectedLocation.lat, selectedLocation.lng],
     queryFn: () => fetchAirQualityData(selectedLocation.lat, selectedLocation.lng),
-    refetchInterval: 300000, // Refetch every 5 minutes
   });
 
+  // Later readings are pushed by the server instead of polled
+  useEffect(() => {
+    const { lat, lng } = selectedLocation;
+    return subscribeAirQuality(lat, lng, (reading) => {
+      queryClient.setQueryData(['airQuality', lat, lng], reading);
+    });
+  }, [selectedLocation, queryClient]);
+
   const { data: forecastData, isLoading: forecastLoading } = useQuery({
     queryKey: ['forecast', selectedLocation.lat, selectedLocation.lng],
     queryFn: () => fetchForecastData(selectedLocation.lat, selectedLocation.lng),
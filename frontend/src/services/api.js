@@ -3,6 +3,9 @@ import axios from 'axios';
 // Use environment variable for API URL, fallback to localhost for development
 const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
 
+// Leaflet URL template for the AQI heatmap overlay
+export const AQI_TILE_URL = `${API_BASE_URL}/air-quality/tiles/{z}/{x}/{y}`;
+
 const api = axios.create({
   baseURL: API_BASE_URL,
   timeout: 10000,
@@ -45,6 +48,27 @@ export const fetchAirQualityData = async (lat, lng) => {
   }
 };
 
+// Readings pushed by the server whenever they change; returns a function that closes the stream
+export const subscribeAirQuality = (lat, lng, onReading) => {
+  const source = new EventSource(`${API_BASE_URL}/air-quality/live?locations=${lat},${lng}`);
+  source.addEventListener('reading', (event) => {
+    onReading(JSON.parse(event.data).reading);
+  });
+  // EventSource reconnects on its own after a dropped connection
+  source.onerror = () => console.warn('Live air quality stream interrupted, reconnecting');
+  return () => source.close();
+};
+
+export const fetchBatchAirQualityData = async (locations = [], cities = []) => {
+  try {
+    const response = await api.post('/air-quality/current/batch', { locations, cities });
+    return response.data;
+  } catch (error) {
+    console.error('Error fetching batch air quality data:', error);
+    throw error;
+  }
+};
+
 export const fetchForecastData = async (lat, lng) => {
   try {
     const response = await api.get(`/air-quality/forecast?lat=${lat}&lng=${lng}`);